@@ -21,6 +21,13 @@ setup(
     
     install_requires = ['setuptools', 'simplejson', 'elementtree'],
 
+    entry_points = {
+        'console_scripts': [
+            'basecamp-dashboard = basecampreporting.dashboard:main',
+            'basecamp-refresher = basecampreporting.refresher:main',
+        ],
+    },
+
     classifiers = [
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -0,0 +1,236 @@
+"""Append-only archive of the raw responses fetched from Basecamp, for
+auditing and for running reports again over old data without the network.
+
+    archive = PayloadArchive('/var/lib/basecamp/archive')
+    bc = Basecamp(url, username, password, archive=archive)
+    ...
+    # A week later: the project as it was fetched last Monday.
+    replay = ArchivedBasecamp(archive, at=datetime.datetime(2009, 3, 2))
+    p = Project(url, project_id, None, None, basecamp=replay)
+
+Payloads are appended to one data file and read back through a read-only
+memory map, so the archive costs page cache rather than Python strings.
+Each payload has a line in the index file giving its request, fetch time,
+position in the data file and the byte spans of its records (the children
+of the root element, as in Basecamp's array responses). The spans are found
+with expat when the payload is archived, without building a tree, and let
+one record be parsed from a buffer over its bytes alone:
+
+    response = archive.latest('/projects/2849305/milestones/list')
+    milestone = response.record(3)         # parses only that record
+    for node in response.records(): ...    # one record at a time
+
+Buffers are Python 2's zero-copy slices; the ElementTree parsers read them
+directly.
+"""
+
+import bisect
+import mmap
+import os
+import threading
+import time
+import urllib2
+import xml.parsers.expat
+
+from basecampreporting.etree import ET
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.serialization import json
+
+
+def record_spans(payload):
+    '''(start, end) byte offsets of each child of the root element.'''
+    spans = []
+    parser = xml.parsers.expat.ParserCreate()
+    state = {'depth': 0, 'start': None}
+    def start_element(name, attributes):
+        state['depth'] += 1
+        if state['depth'] == 2: state['start'] = parser.CurrentByteIndex
+    def end_element(name):
+        if state['depth'] == 2:
+            start = state['start']
+            end = payload.index('>', start) + 1
+            if payload[end - 2] != '/':
+                # Not an empty element: the index is that of its end tag.
+                end = payload.index('>', parser.CurrentByteIndex) + 1
+            spans.append((start, end))
+        state['depth'] -= 1
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.Parse(payload, True)
+    return spans
+
+
+class ArchivedResponse(object):
+    '''One archived payload. Its bytes stay in the archive's mapping.'''
+    __slots__ = ('archive', 'path', 'data', 'fetched_at', 'offset', 'length',
+                 'spans')
+
+    def __init__(self, archive, path, data, fetched_at, offset, length, spans):
+        self.archive = archive
+        self.path = path
+        self.data = data
+        self.fetched_at = fetched_at
+        self.offset = offset
+        self.length = length
+        self.spans = spans
+
+    def payload(self):
+        '''A buffer over the whole response.'''
+        return self.archive.buffer(self.offset, self.length)
+
+    def __str__(self):
+        return str(self.payload())
+
+    def __len__(self):
+        return len(self.spans)
+
+    def record_payload(self, index):
+        start, end = self.spans[index]
+        return self.archive.buffer(self.offset + start, end - start)
+
+    def record(self, index):
+        '''The element of record number index, parsed on its own.'''
+        return ET.fromstring(self.record_payload(index))
+
+    def records(self):
+        for index in xrange(len(self.spans)):
+            yield self.record(index)
+
+    def to_dict(self):
+        return dict(path=self.path, data=self.data, fetched_at=self.fetched_at,
+                    offset=self.offset, length=self.length, spans=self.spans)
+
+    def __repr__(self):
+        return '<ArchivedResponse %s at %s>' % (self.path, self.fetched_at)
+
+
+class PayloadArchive(object):
+    '''The archive in directory, created if need be. Appending is safe from
+       several threads of one process; other processes may read it.'''
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.data_path = os.path.join(directory, 'payloads')
+        self.index_path = os.path.join(directory, 'index')
+        self.lock = threading.Lock()
+        self.responses = {}    # (path, data) -> [ArchivedResponse], oldest first
+        self.count = 0
+        self.data_file = open(self.data_path, 'ab')
+        self.index_file = open(self.index_path, 'ab')
+        self.mapping = None
+        self.mapped = 0
+        self.load_index()
+
+    def load_index(self):
+        if not os.path.exists(self.index_path): return
+        for line in open(self.index_path, 'rb'):
+            if not line.endswith('\n'): break    # cut short by a crash
+            fields = json.loads(line)
+            self._add(ArchivedResponse(self, fields['path'], fields['data'],
+                                       fields['fetched_at'], fields['offset'],
+                                       fields['length'],
+                                       [tuple(span) for span in fields['spans']]))
+
+    def _add(self, response):
+        key = (response.path, response.data)
+        responses = self.responses.setdefault(key, [])
+        if responses and responses[-1].fetched_at > response.fetched_at:
+            times = [r.fetched_at for r in responses]
+            responses.insert(bisect.bisect_right(times, response.fetched_at), response)
+        else:
+            responses.append(response)
+        self.count += 1
+
+    def append(self, path, data, payload, fetched_at=None):
+        '''Archives payload as the response to path (and request body data)
+           fetched at fetched_at, by default now. Returns the
+           ArchivedResponse.'''
+        if isinstance(payload, unicode): payload = payload.encode('utf-8')
+        if fetched_at is None: fetched_at = time.time()
+        try:
+            spans = record_spans(payload)
+        except xml.parsers.expat.ExpatError:
+            spans = []
+        self.lock.acquire()
+        try:
+            self.data_file.seek(0, os.SEEK_END)
+            offset = self.data_file.tell()
+            self.data_file.write(payload)
+            self.data_file.flush()
+            response = ArchivedResponse(self, path, data, fetched_at, offset,
+                                        len(payload), spans)
+            self.index_file.write(json.dumps(response.to_dict()) + '\n')
+            self.index_file.flush()
+            self._add(response)
+        finally:
+            self.lock.release()
+        return response
+
+    def buffer(self, offset, length):
+        '''A read-only buffer over length bytes of the data file.'''
+        if not length: return buffer('')
+        if offset + length > self.mapped:
+            self.lock.acquire()
+            try:
+                if offset + length > self.mapped: self._remap()
+            finally:
+                self.lock.release()
+        return buffer(self.mapping, offset, length)
+
+    def _remap(self):
+        # Buffers handed out earlier keep the old mapping alive.
+        f = open(self.data_path, 'rb')
+        try:
+            size = os.fstat(f.fileno()).st_size
+            self.mapping = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self.mapped = size
+        finally:
+            f.close()
+
+    def history(self, path, data=None):
+        '''Every archived response to the request, oldest first.'''
+        return list(self.responses.get((path, data), ()))
+
+    def latest(self, path, data=None, at=None):
+        '''The newest response to the request fetched at or before at (a
+           datetime or a timestamp; by default now), or None.'''
+        responses = self.responses.get((path, data))
+        if not responses: return None
+        if at is None: return responses[-1]
+        if hasattr(at, 'timetuple'):
+            at = time.mktime(at.timetuple()) + getattr(at, 'microsecond', 0) / 1e6
+        times = [r.fetched_at for r in responses]
+        index = bisect.bisect_right(times, at)
+        if index == 0: return None
+        return responses[index - 1]
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+        self.mapping = None
+        self.mapped = 0
+
+
+class ArchivedBasecamp(Basecamp):
+    '''Answers reads from a PayloadArchive with the responses as they were
+       at `at` (by default the newest), never touching the network. Requests
+       that were never archived fail with a 404 HTTPError, as Basecamp's
+       missing records do. Responses are returned as buffers over the
+       archive, which the parsers read without copying.'''
+    def __init__(self, archive, at=None, baseURL='http://archive.invalid'):
+        Basecamp.__init__(self, baseURL, None, None)
+        self.source = archive
+        self.at = at
+
+    def _request(self, path, data=None):
+        if hasattr(data, 'findall'):
+            data = ET.tostring(data)
+        response = self.source.latest(path, data, self.at)
+        if response is None:
+            raise urllib2.HTTPError(self.baseURL + path, 404,
+                                    "Not in the archive", None, None)
+        return response.payload()
@@ -0,0 +1,653 @@
+"""Non-blocking Basecamp client for reading many resources at once from a
+single thread.
+
+Basecamp, even with a ConnectionPool and worker threads, ties up a thread
+for every request in flight. AsyncBasecamp instead drives its sockets from
+an asyncore event loop, so one thread can keep thousands of reads in flight.
+Its read methods mirror Basecamp's but return Futures:
+
+    client = AsyncBasecamp(url, username, password, max_connections=200)
+    projects = [AsyncProject(client, project_id) for project_id in ids]
+    loaded = client.run(gather([p.load() for p in projects]))
+    for project in loaded:
+        print project.name, len(project.late_milestones)
+
+AsyncProject.load() fetches a project's collections concurrently and
+resolves to an ordinary, fully cached Project.
+
+The client keeps its own keep-alive connections and caps the number of
+requests in flight at max_connections; further requests queue until a
+connection is free. Identical reads already in flight share one request.
+"""
+
+import asyncore
+import datetime
+import httplib
+import os
+import socket
+import ssl
+import sys
+import time
+import urlparse
+import urllib2
+from collections import deque
+from StringIO import StringIO
+
+from basecampreporting.etree import ET
+from basecampreporting.basecamp import Basecamp, RequestRecorder
+from basecampreporting.project import Project
+from basecampreporting import instrumentation
+from basecampreporting.deadlines import DEFAULT_TIMEOUT
+
+DEFAULT_MAX_CONNECTIONS = 100
+READ_SIZE = 65536
+
+
+class Future(object):
+    '''The eventual result of an asynchronous call. Callbacks run on the
+       event loop as soon as the result (or exception) is set.'''
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        if not self._done:
+            raise RuntimeError("Future is not done yet")
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self):
+        return self._exc_info and self._exc_info[1]
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._finish()
+
+    def _finish(self):
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def then(self, func):
+        '''Returns a Future for func(result). func may itself return a
+           Future, which is then waited for. Exceptions pass straight
+           through to the returned Future.'''
+        chained = Future()
+        def done(future):
+            if future._exc_info is not None:
+                return chained.set_exc_info(future._exc_info)
+            try:
+                value = func(future._result)
+            except Exception:
+                return chained.set_exc_info(sys.exc_info())
+            if isinstance(value, Future):
+                value.add_done_callback(lambda f: _copy(f, chained))
+            else:
+                chained.set_result(value)
+        self.add_done_callback(done)
+        return chained
+
+def _copy(source, target):
+    if source._exc_info is not None:
+        target.set_exc_info(source._exc_info)
+    else:
+        target.set_result(source._result)
+
+def gather(futures):
+    '''Returns a Future for the list of the futures' results, in order. It
+       fails with the first exception raised by any of them.'''
+    futures = list(futures)
+    combined = Future()
+    results = [None] * len(futures)
+    remaining = [len(futures)]
+    if not futures:
+        combined.set_result(results)
+    def collect(index):
+        def done(future):
+            if combined.done(): return
+            if future._exc_info is not None:
+                return combined.set_exc_info(future._exc_info)
+            results[index] = future._result
+            remaining[0] -= 1
+            if not remaining[0]:
+                combined.set_result(results)
+        return done
+    for index, future in enumerate(futures):
+        future.add_done_callback(collect(index))
+    return combined
+
+
+class _Response(object):
+    '''Incremental HTTP/1.1 response parser. feed() returns True once the
+       response is complete.'''
+    def __init__(self, method):
+        self.method = method
+        self.buffer = ''
+        self.status = None
+        self.reason = None
+        self.msg = None
+        self.body = []
+        self.length = None
+        self.chunked = False
+        self.until_close = False
+        self.keep_alive = False
+        self.complete = False
+
+    def feed(self, data):
+        self.buffer += data
+        if self.status is None and not self._parse_headers():
+            return False
+        if self.chunked:
+            self.complete = self._parse_chunks()
+        elif self.until_close:
+            self.body.append(self.buffer)
+            self.buffer = ''
+        else:
+            take = self.buffer[:self.length]
+            self.body.append(take)
+            self.length -= len(take)
+            self.buffer = self.buffer[len(take):]
+            self.complete = self.length == 0
+        return self.complete
+
+    def _parse_headers(self):
+        end = self.buffer.find('\r\n\r\n')
+        if end < 0: return False
+        head, self.buffer = self.buffer[:end + 2], self.buffer[end + 4:]
+        status_line, headers = head.split('\r\n', 1)
+        parts = status_line.split(' ', 2)
+        version, self.status = parts[0], int(parts[1])
+        self.reason = len(parts) > 2 and parts[2] or ''
+        self.msg = httplib.HTTPMessage(StringIO(headers), 0)
+
+        connection = (self.msg.getheader('connection') or '').lower()
+        if version == 'HTTP/1.1':
+            self.keep_alive = connection != 'close'
+        else:
+            self.keep_alive = connection == 'keep-alive'
+        encoding = (self.msg.getheader('transfer-encoding') or '').lower()
+        if self.method == 'HEAD' or self.status in (204, 304) or 100 <= self.status < 200:
+            self.length = 0
+        elif encoding == 'chunked':
+            self.chunked = True
+        elif self.msg.getheader('content-length') is not None:
+            self.length = int(self.msg.getheader('content-length'))
+        else:
+            self.until_close = True
+            self.keep_alive = False
+        return True
+
+    def _parse_chunks(self):
+        while True:
+            if self.length is None:
+                end = self.buffer.find('\r\n')
+                if end < 0: return False
+                size = int(self.buffer[:end].split(';', 1)[0], 16)
+                self.buffer = self.buffer[end + 2:]
+                if size == 0:
+                    self.length = -1
+                else:
+                    self.length = size
+            if self.length == -1:
+                # Skip any trailers up to the blank line ending the body.
+                end = self.buffer.find('\r\n')
+                while end > 0:
+                    self.buffer = self.buffer[end + 2:]
+                    end = self.buffer.find('\r\n')
+                if end < 0: return False
+                self.buffer = self.buffer[2:]
+                return True
+            if len(self.buffer) < self.length + 2: return False
+            self.body.append(self.buffer[:self.length])
+            self.buffer = self.buffer[self.length + 2:]
+            self.length = None
+
+    def closed(self):
+        '''The server closed the connection; returns True if that completes
+           the response.'''
+        if self.until_close and self.status is not None:
+            self.complete = True
+        return self.complete
+
+
+class _Request(object):
+    def __init__(self, key, url, wire, method, future, event):
+        self.key = key
+        self.url = url
+        self.wire = wire
+        self.method = method
+        self.future = future
+        self.event = event
+        self.attempts = 0
+
+
+class _Connection(asyncore.dispatcher):
+    '''One keep-alive connection, serving one request at a time.'''
+    def __init__(self, client, key):
+        asyncore.dispatcher.__init__(self, map=client.map)
+        self.client = client
+        self.key = key
+        self.request = None
+        self.response = None
+        self.out = ''
+        self.received = False
+        self.reused = False
+        self.handshaking = False
+        self.touch()
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect(key[1:])
+
+    def start(self, request):
+        request.attempts += 1
+        self.request = request
+        self.response = _Response(request.method)
+        self.out = request.wire
+        self.received = False
+        self.touch()
+
+    def touch(self):
+        '''Notes progress: the connection has the client's timeout from now
+           to make more.'''
+        self.expires = self.client.timeout is not None and \
+            time.time() + self.client.timeout
+
+    def check_timeout(self, now):
+        '''Closes the connection, failing its request, if connecting or the
+           request has stalled past the timeout. Idle connections wait.'''
+        if not self.expires or now < self.expires: return
+        if self.connected and self.request is None and not self.handshaking:
+            return
+        try:
+            raise socket.timeout("no progress in %ss" % self.client.timeout)
+        except socket.timeout:
+            self.handle_error()
+
+    def writable(self):
+        return not self.connected or self.handshaking or bool(self.out)
+
+    def readable(self):
+        return True
+
+    def handle_connect(self):
+        if self.key[0] == 'https':
+            # Verify the certificate and name, as urllib2 does, before any
+            # credentials are sent.
+            self.socket = self.client.ssl_context.wrap_socket(
+                self.socket, server_hostname=self.key[1],
+                do_handshake_on_connect=False)
+            self.handshaking = True
+            self._handshake()
+
+    def _handshake(self):
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLError, e:
+            if e.args[0] in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                return
+            raise
+        self.handshaking = False
+
+    def handle_write(self):
+        if self.handshaking:
+            return self._handshake()
+        if not self.out: return
+        sent = self.send(self.out)
+        self.out = self.out[sent:]
+        if sent: self.touch()
+
+    def handle_read(self):
+        if self.handshaking:
+            return self._handshake()
+        while True:
+            try:
+                data = self.recv(READ_SIZE)
+            except ssl.SSLError, e:
+                if e.args[0] == ssl.SSL_ERROR_WANT_READ: return
+                raise
+            if not data or self.request is None:
+                # Closed (recv has already called handle_close), or data
+                # arrived on an idle connection.
+                return
+            self.touch()
+            if not self.received:
+                self.received = True
+                if self.request.event is not None:
+                    self.request.event.ttfb = time.time() - self.request.event.started
+            if self.response.feed(data):
+                return self._finish()
+            if not (isinstance(self.socket, ssl.SSLSocket) and self.socket.pending()):
+                return
+
+    def handle_close(self):
+        request, response = self.request, self.response
+        error = not self.connected and self.socket.getsockopt(
+            socket.SOL_SOCKET, socket.SO_ERROR)
+        self.close()
+        self.client._discard(self)
+        if request is None: return
+        self.request = None
+        if response.closed():
+            self.client._finish(self, request, response, reusable=False)
+        elif not self.received and request.attempts == 1 and self.reused:
+            # The server closed a kept-alive connection while it was idle.
+            self.client._retry(request)
+        else:
+            try:
+                if error:
+                    raise socket.error(error, os.strerror(error))
+                raise httplib.IncompleteRead(''.join(response.body))
+            except (socket.error, httplib.IncompleteRead):
+                self.client._fail(request, sys.exc_info())
+
+    def handle_error(self):
+        exc_info = sys.exc_info()
+        request = self.request
+        self.request = None
+        self.close()
+        self.client._discard(self)
+        if request is not None:
+            self.client._fail(request, exc_info)
+
+    def _finish(self):
+        request, response = self.request, self.response
+        self.request = None
+        self.client._finish(self, request, response, response.keep_alive)
+
+
+class AsyncBasecamp(object):
+    '''Event-loop driven Basecamp reader. Methods return Futures; run() or
+       loop() drive the requests to completion.'''
+    read_methods = ('projects', 'person', 'people_within_project',
+                    'message_archive', 'comments', 'todo_lists', 'todo_list',
+                    'list_milestones', 'list_time_entries')
+
+    def __init__(self, baseURL, username, password,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, max_idle=None,
+                 ssl_context=None, timeout=DEFAULT_TIMEOUT):
+        '''ssl_context, an ssl.SSLContext for https accounts, defaults to
+           one that checks certificates against the system's CAs. A
+           connection that makes no progress connecting, sending or
+           receiving for timeout seconds is closed and its request fails
+           with socket.timeout; None waits for ever.'''
+        if ssl_context is None: ssl_context = ssl.create_default_context()
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.paths = RequestRecorder(baseURL, username, password)
+        self.baseURL = self.paths.baseURL
+        self.username = username
+        self.password = password
+        self.headers = self.paths.headers
+        self.max_connections = max_connections
+        self.max_idle = max_idle or max_connections
+        self.map = {}
+        self.idle = {}
+        self.active = 0
+        self.pending = deque()
+        self.in_flight = {}
+        self.listeners = []
+        self._blocking = None
+
+    @property
+    def blocking(self):
+        '''A regular Basecamp client for the same account, for the odd
+           lookup that isn't worth going asynchronous for.'''
+        if self._blocking is None:
+            self._blocking = Basecamp(self.baseURL, self.username, self.password)
+        return self._blocking
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def _emit(self, event):
+        for listener in self.listeners + instrumentation.listeners:
+            listener(event)
+
+    def _request(self, path, data=None):
+        '''Returns a Future for the response body of path. Error statuses
+           fail the Future with urllib2.HTTPError.'''
+        if hasattr(data, 'findall'):
+            data = ET.tostring(data)
+        key = (path, data)
+        future = self.in_flight.get(key)
+        if future is not None:
+            return future
+        future = self.in_flight[key] = Future()
+        future.add_done_callback(lambda f: self.in_flight.pop(key, None))
+
+        url = self.baseURL + path
+        parts = urlparse.urlsplit(url)
+        port = parts.port or (parts.scheme == 'https' and 443 or 80)
+        target = parts.path or '/'
+        if parts.query: target += '?' + parts.query
+        method = data is not None and 'POST' or 'GET'
+        lines = ['%s %s HTTP/1.1' % (method, target), 'Host: %s' % parts.netloc]
+        lines.extend(['%s: %s' % header for header in self.headers])
+        if data is not None:
+            lines.append('Content-Length: %d' % len(data))
+        wire = '\r\n'.join(lines) + '\r\n\r\n' + (data or '')
+
+        event = None
+        if self.listeners or instrumentation.listeners:
+            event = instrumentation.RequestEvent(path, data, time.time())
+        request = _Request((parts.scheme, parts.hostname, port), url, wire,
+                           method, future, event)
+        self.pending.append(request)
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        while self.pending and self.active < self.max_connections:
+            request = self.pending.popleft()
+            idle = self.idle.get(request.key)
+            if idle:
+                connection = idle.pop()
+                connection.reused = True
+            else:
+                try:
+                    connection = _Connection(self, request.key)
+                except socket.error:
+                    self._fail(request, sys.exc_info())
+                    continue
+            self.active += 1
+            connection.start(request)
+
+    def _discard(self, connection):
+        idle = self.idle.get(connection.key)
+        if idle and connection in idle:
+            idle.remove(connection)
+
+    def _release(self, connection, reusable):
+        self.active -= 1
+        if reusable:
+            idle = self.idle.setdefault(connection.key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+            else:
+                connection.close()
+        else:
+            connection.close()
+        self._dispatch()
+
+    def _retry(self, request):
+        self.active -= 1
+        self.pending.appendleft(request)
+        self._dispatch()
+
+    def _finish(self, connection, request, response, reusable):
+        self._release(connection, reusable)
+        body = ''.join(response.body)
+        event = request.event
+        if event is not None:
+            event.status = response.status
+            event.bytes = len(body)
+            event.latency = time.time() - event.started
+        if response.status >= 400:
+            try:
+                raise urllib2.HTTPError(request.url, response.status, response.reason,
+                                        response.msg, StringIO(body))
+            except urllib2.HTTPError:
+                return self._fail(request, sys.exc_info(), released=True)
+        if event is not None: self._emit(event)
+        request.future.set_result(body)
+
+    def _fail(self, request, exc_info, released=False):
+        if not released:
+            self.active -= 1
+            self._dispatch()
+        event = request.event
+        if event is not None:
+            event.error = exc_info[1]
+            if event.latency is None: event.latency = time.time() - event.started
+            self._emit(event)
+        request.future.set_exc_info(exc_info)
+
+    def loop(self, timeout=0.05):
+        '''Runs one pass of the event loop, then closes the connections
+           that have stalled.'''
+        asyncore.loop(timeout, True, self.map, 1)
+        now = time.time()
+        for connection in self.map.values():
+            connection.check_timeout(now)
+
+    def run(self, future, timeout=None):
+        '''Drives the event loop until future is done and returns its
+           result (or raises its exception).'''
+        deadline = timeout is not None and time.time() + timeout
+        while not future.done():
+            if deadline and time.time() > deadline:
+                raise socket.timeout("timed out after %ss" % timeout)
+            if not self.map:
+                raise RuntimeError("no requests in flight for the pending future")
+            self.loop()
+        return future.result()
+
+    def close(self):
+        for connection in self.map.values():
+            connection.close()
+        self.idle = {}
+
+
+def _read_method(name):
+    method = getattr(Basecamp, name)
+    def read(self, *args, **kwargs):
+        return self._request(*method(self.paths, *args, **kwargs))
+    read.__name__ = name
+    read.__doc__ = method.__doc__
+    return read
+
+for _name in AsyncBasecamp.read_methods:
+    setattr(AsyncBasecamp, _name, _read_method(_name))
+
+
+class AsyncProject(object):
+    '''Loads a Project's collections through an AsyncBasecamp. Each load_*
+       method returns a Future for the collection and fills the underlying
+       Project's cache; load() resolves to the Project itself.'''
+    collections = ('messages', 'comments', 'milestones', 'todo_lists',
+                   'people', 'time_entries')
+
+    def __init__(self, client, id, people_cache=None, interner=None):
+        self.client = client
+        self.id = id
+        self.project = Project(client.baseURL, id, None, None,
+                               basecamp=client.blocking, people_cache=people_cache,
+                               interner=interner)
+        self.loading = {}
+
+    def _load(self, name, start):
+        # One load per collection, however many callers wait for it.
+        cached = self.project.cache.get(name)
+        if cached:
+            future = Future()
+            future.set_result(cached)
+            return future
+        future = self.loading.get(name)
+        if future is None:
+            future = self.loading[name] = start().then(
+                lambda value: self._store(name, value))
+            future.add_done_callback(lambda done: self._finished(name, done))
+        return future
+
+    def _store(self, name, value):
+        self.project.cache[name] = value
+        return value
+
+    def _finished(self, name, future):
+        # Failed loads are forgotten too, so the next call tries again.
+        if self.loading.get(name) is future: del self.loading[name]
+
+    def load_info(self):
+        def parse(xml):
+            self.project._parse_project_info(xml)
+            return self.project
+        return self.client._request("/projects/%s.xml" % self.id).then(parse)
+
+    def load_messages(self):
+        return self._load('messages', lambda: self.client.message_archive(
+            self.id).then(self.project._parse_messages))
+
+    def load_comments(self):
+        def fetch(messages):
+            return gather([self.client.comments(message.id)
+                           for message in messages[0:3]])
+        return self._load('comments', lambda: self.load_messages().then(
+            fetch).then(self.project._parse_comments))
+
+    def load_milestones(self):
+        return self._load('milestones', lambda: self.client.list_milestones(
+            self.id).then(self.project._parse_milestones))
+
+    def load_todo_lists(self):
+        return self._load('todo_lists', lambda: self.client.todo_lists(
+            self.id).then(self.project._parse_todo_lists))
+
+    def load_todo_items(self):
+        def fetch(todo_lists):
+            return gather([self.client.todo_list(tdlist.id)
+                           for tdlist in todo_lists.values()])
+        return self._load('todo_items', lambda: self.load_todo_lists().then(
+            fetch).then(self.project._parse_todo_items))
+
+    def load_people(self):
+        return self._load('people', lambda: self.client.people_within_project(
+            self.id).then(self.project._parse_people))
+
+    def load_time_entries(self, start_date=None, end_date=None):
+        '''All the time entries, kept as the Project's time_entries; given
+           start_date or end_date, only those in that range, which are not
+           kept.'''
+        def start():
+            return self.client.list_time_entries(
+                self.id, start_date or datetime.date(1900, 1, 1),
+                end_date or datetime.date.today()).then(
+                self.project._parse_time_entries)
+        if start_date or end_date: return start()
+        return self._load('time_entries', start)
+
+    def load(self, names=None):
+        '''Loads the project info and the named collections (by default
+           all of them) concurrently; resolves to the cached Project.'''
+        futures = [self.load_info()]
+        for name in names or self.collections:
+            futures.append(getattr(self, 'load_' + name)())
+        return gather(futures).then(lambda results: self.project)
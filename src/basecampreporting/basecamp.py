@@ -54,14 +54,28 @@ __date__ = '2006-05-21'
 
 
 import base64
+import hashlib
+import socket
+import time
 import urllib2
 
 from basecampreporting.etree import ET
+from basecampreporting import instrumentation
+from basecampreporting import deadlines
+from basecampreporting.cache import DEFAULT_TTL, DEFAULT_STALE_TTL
+from basecampreporting.deadlines import DeadlineExceeded, DEFAULT_TIMEOUT
+from basecampreporting.scheduler import RequestScheduler, request_kind, READ
+from basecampreporting.singleflight import SingleFlight
+
+INFINITY = float('inf')
 
 
 class Basecamp(object):
 
-    def __init__(self, baseURL, username, password):
+    def __init__(self, baseURL, username, password, pool=None, scheduler=None,
+                 cache=None, cache_ttl=DEFAULT_TTL, archive=None,
+                 timeout=DEFAULT_TIMEOUT, hedger=None,
+                 stale_ttl=DEFAULT_STALE_TTL):
         self.baseURL = baseURL
         if self.baseURL[-1] == '/':
             self.baseURL = self.baseURL[:-1]
@@ -79,12 +93,213 @@ class Basecamp(object):
             ('Accept', 'application/xml'),
             ('Authorization', 'Basic %s' % self.encoded_auth_string), ]
         self.opener.addheaders = self.headers
+        # An optional connection.ConnectionPool; requests go through urllib2
+        # when there is none.
+        self.pool = pool
+        # Rate limiting, queueing and retries; see scheduler.RequestScheduler.
+        if scheduler is None:
+            scheduler = RequestScheduler()
+        self.scheduler = scheduler
+        # Identical reads in flight at the same time share one request.
+        self.flights = SingleFlight()
+        # An optional backend from basecampreporting.cache holding read
+        # responses for cache_ttl seconds, which may be shared with other
+        # clients and processes.
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        # Reads that run out of time are answered from the last response
+        # kept for stale_ttl seconds in the cache (none when it is 0), or
+        # from the archive.
+        self.stale_ttl = stale_ttl
+        # An optional archive.PayloadArchive keeping every read response
+        # fetched from Basecamp, for auditing and replay.
+        self.archive = archive
+        # Seconds any one wait on the network may take, shortened to the
+        # time left when a deadline is in force (see deadlines).
+        self.timeout = timeout
+        # An optional hedging.Hedger resending slow reads.
+        self.hedger = hedger
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """
+        Registers a callable to receive an instrumentation.RequestEvent for
+        every request made by this instance.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def _emit(self, event):
+        for listener in self.listeners + instrumentation.listeners:
+            listener(event)
+
+    def _send(self, path, data=None, event=None):
+        """
+        Performs the HTTP request and returns the response body, filling in
+        the event's status and time to first byte when one is given.
+        """
+        timeout = self.timeout
+        deadline = deadlines.current()
+        if deadline is not None:
+            deadline.check(path)
+            timeout = deadline.timeout(timeout)
+        try:
+            if self.pool is not None:
+                return self.pool.request(self.baseURL + path, data,
+                                         self.headers, event, timeout)
+            req = urllib2.Request(url=self.baseURL + path, data=data)
+            if timeout is None:
+                response = self.opener.open(req)
+            else:
+                response = self.opener.open(req, timeout=timeout)
+            if event is not None:
+                event.ttfb = time.time() - event.started
+                event.status = response.code
+            return response.read()
+        except urllib2.HTTPError:
+            raise
+        except (socket.error, urllib2.URLError):
+            # The socket timed out because the deadline did.
+            if deadline is not None and deadline.expired():
+                deadline.check(path)
+            raise
+
+    def _perform(self, path, data=None, event=None):
+        kind = request_kind(path)
+        perform = lambda: self.scheduler.call(
+            self.baseURL, kind, lambda: self._send(path, data, event), event)
+        if self.hedger is not None and kind == READ:
+            return self.hedger.call(perform)
+        return perform()
+
+    def _cache_key(self, *parts):
+        """
+        Key for caching something fetched with this account's credentials;
+        what Basecamp returns depends on who asks.
+        """
+        parts = (self.baseURL, self.auth_string) + tuple(parts)
+        return hashlib.md5('\n'.join([str(part) for part in parts])).hexdigest()
+
+    def _fetch(self, path, data=None, cacheable=False, event=None):
+        """
+        Performs the request, or answers a cacheable one from self.cache.
+        Cacheable responses fetched from Basecamp are also archived, and
+        given instead when the deadline runs out.
+        """
+        if not cacheable:
+            return self._perform(path, data, event)
+        entry = None
+        if self.cache is not None:
+            key = self._cache_key('response', path, data or '')
+            entry = self._entry(self.cache.get(key))
+            fresh = entry is not None and time.time() < entry[0]
+            if event is not None:
+                event.cache = fresh and 'hit' or 'miss'
+            if fresh:
+                if event is not None: event.status = 200
+                return entry[2]
+        try:
+            result = self._perform(path, data, event)
+        except DeadlineExceeded:
+            result = self._stale(path, data, entry)
+            if result is None: raise
+            if event is not None: event.cache = 'stale'
+            return result
+        if self.cache is not None:
+            now = time.time()
+            fresh_until = self.cache_ttl is None and INFINITY or now + self.cache_ttl
+            self._store(key, fresh_until, max(fresh_until, now + (self.stale_ttl or 0)), result)
+        if self.archive is not None:
+            self.archive.append(path, data, result)
+        return result
+
+    def _entry(self, value):
+        """
+        (fresh until, stale until, response) of a cached response, or None.
+        """
+        if value is None: return None
+        times, sep, result = value.partition('\n')
+        try:
+            fresh_until, stale_until = [float(t) for t in times.split()]
+        except ValueError:
+            return None
+        return fresh_until, stale_until, result
+
+    def _store(self, key, fresh_until, stale_until, result):
+        """
+        Caches a response in a single entry, which answers reads until
+        fresh_until and, when the deadline runs out, until stale_until.
+        """
+        ttl = stale_until != INFINITY and stale_until - time.time() or None
+        self.cache.set(key, '%r %r\n%s' % (fresh_until, stale_until, result), ttl)
+
+    def forget(self, method, *args):
+        """
+        Drops the cached response of a read, given by the name of the
+        method making it and its arguments:
+
+            bc.forget('todo_lists', project_id, False)
+
+        The response is still given when the deadline runs out.
+        """
+        if self.cache is None: return
+        path, data = getattr(RequestRecorder(self.baseURL), method)(*args)
+        if hasattr(data, 'findall'):
+            data = ET.tostring(data)
+        key = self._cache_key('response', path, data or '')
+        entry = self._entry(self.cache.get(key))
+        if entry is not None and time.time() < entry[1]:
+            self._store(key, 0, entry[1], entry[2])
+        else:
+            self.cache.delete(key)
+
+    def _stale(self, path, data=None, entry=None):
+        """
+        The last response fetched for the request, or None. entry is the
+        request's cache entry, if already read.
+        """
+        if self.cache is not None and self.stale_ttl:
+            if entry is None:
+                entry = self._entry(self.cache.get(
+                    self._cache_key('response', path, data or '')))
+            if entry is not None and time.time() < entry[1]:
+                return entry[2]
+        if self.archive is not None:
+            response = self.archive.latest(path, data)
+            if response is not None: return str(response)
+        return None
 
     def _request(self, path, data=None):
         if hasattr(data, 'findall'):
             data = ET.tostring(data)
-        req = urllib2.Request(url=self.baseURL + path, data=data)
-        return self.opener.open(req).read()
+        if request_kind(path) == READ:
+            return self.flights.do((path, data),
+                                   lambda: self._instrumented(path, data, True))
+        return self._instrumented(path, data)
+
+    def _instrumented(self, path, data=None, cacheable=False):
+        if not (self.listeners or instrumentation.listeners):
+            return self._fetch(path, data, cacheable)
+
+        started = time.time()
+        event = instrumentation.RequestEvent(path, data, started)
+        try:
+            try:
+                result = self._fetch(path, data, cacheable, event)
+                event.bytes = len(result)
+                return result
+            except urllib2.HTTPError, e:
+                event.status = e.code
+                event.error = e
+                raise
+            except Exception, e:
+                event.error = e
+                raise
+        finally:
+            event.latency = time.time() - started
+            self._emit(event)
 
     # ---------------------------------------------------------------- #
     # General
@@ -136,6 +351,14 @@ class Basecamp(object):
         path = '/projects/%u/contacts/people/%u' % (project_id, company_id)
         return self._request(path)
 
+    def people_within_project(self, project_id):
+        """
+        This will return all of the people, across all companies, that can
+        access the given project.
+        """
+        path = '/projects/%u/people.xml' % project_id
+        return self._request(path)
+
     def person(self, person_id):
         """
         This will return information about the referenced person.
@@ -183,6 +406,13 @@ class Basecamp(object):
             ET.SubElement(req, 'category-id').text = str(int(category_id))
         return self._request(path, req)
 
+    def recent_messages(self, project_id):
+        """
+        This will return the 25 most recent messages in the given project.
+        """
+        path = '/projects/%u/posts.xml' % project_id
+        return self._request(path)
+
     def message_archive_per_category(self, project_id, category_id):
         """
         This will return a summary record for each message in a particular
@@ -351,16 +581,16 @@ class Basecamp(object):
         path = '/projects/%u/todos/create_list' % project_id
         req = ET.Element('request')
         if milestone_id is not None:
-            ET.SubElement('milestone-id').text = str(milestone_id)
+            ET.SubElement(req, 'milestone-id').text = str(milestone_id)
         if private is not None:
-            ET.SubElement('private').text = str(bool(private)).lower()
-        ET.SubElement('tracked').text = str(bool(tracked)).lower()
+            ET.SubElement(req, 'private').text = str(bool(private)).lower()
+        ET.SubElement(req, 'tracked').text = str(bool(tracked)).lower()
         if name is not None:
-            ET.SubElement('name').text = str(name)
-            ET.SubElement('description').text = str(description)
+            ET.SubElement(req, 'name').text = str(name)
+            ET.SubElement(req, 'description').text = str(description)
         if template_id is not None:
-            ET.SubElement('use-template').text = 'true'
-            ET.SubElement('template-id').text = str(int(template_id))
+            ET.SubElement(req, 'use-template').text = 'true'
+            ET.SubElement(req, 'template-id').text = str(int(template_id))
         return self._request(path, req)
 
     def update_todo_list(self, list_id, name, description, milestone_id=None,
@@ -370,7 +600,7 @@ class Basecamp(object):
         """
         path = '/todos/update_list/%u' % list_id
         req = ET.Element('request')
-        list_ = ET.SubElement('list')
+        list_ = ET.SubElement(req, 'list')
         ET.SubElement(list_, 'name').text = str(name)
         ET.SubElement(list_, 'description').text = str(description)
         if milestone_id is not None:
@@ -431,10 +661,10 @@ class Basecamp(object):
         """
         path = '/todos/update_item/%u' % item_id
         req = ET.Element('request')
-        item = ET.Element('request')
+        item = ET.SubElement(req, 'item')
         ET.SubElement(item, 'content').text = str(content)
         if party_id is not None:
-            ET.SubElement(req, 'responsible-party').text = str(party_id)
+            ET.SubElement(item, 'responsible-party').text = str(party_id)
             ET.SubElement(req, 'notify').text = str(bool(notify)).lower()
         return self._request(path, req)
 
@@ -560,3 +790,36 @@ class Basecamp(object):
         """
         path = '/milestones/delete/%u' % milestone_id
         return self._request(path)
+
+    # ---------------------------------------------------------------- #
+    # Time Tracking
+
+    def list_time_entries(self, project_id, start_date, end_date):
+        """
+        This will return the time entries logged against the given project
+        between start_date and end_date (inclusive).
+        """
+        path = '/time_entries/report.xml?from=%s&to=%s&filter_project_id=%u' \
+            % (start_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d'),
+               project_id)
+        return self._request(path)
+
+    def time_entries_page(self, project_id, page=1):
+        """
+        This will return one page of up to 50 of the project's time entries,
+        newest first. Pages are numbered from 1.
+        """
+        path = '/projects/%u/time_entries.xml?page=%u' % (project_id, page)
+        return self._request(path)
+
+
+class RequestRecorder(Basecamp):
+    """
+    Basecamp whose methods return the (path, data) they would request,
+    without sending anything. data is the request's XML element, or None.
+    """
+    def __init__(self, baseURL='http://localhost', username='', password=''):
+        super(RequestRecorder, self).__init__(baseURL, username, password)
+
+    def _request(self, path, data=None):
+        return path, data
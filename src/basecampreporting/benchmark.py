@@ -0,0 +1,345 @@
+"""End-to-end benchmarks for the parser, the models and the reports, driven
+through mocks.TestProject over data from generator.AccountGenerator.
+
+    python -m basecampreporting.benchmark --sizes small,medium \\
+        --output results.json --baseline baseline.json --threshold 0.10
+
+Every case is run at every size and reports throughput, latency percentiles
+and peak memory growth. Results are written as JSON; when a baseline file is
+given, any case whose median latency or peak memory grew by more than the
+threshold is reported as a regression and the exit status is 1.
+"""
+
+import datetime
+import os
+import platform
+import sys
+import tempfile
+import time
+import traceback
+from optparse import OptionParser
+
+from basecampreporting import etree
+from basecampreporting.etree import ET
+from basecampreporting.serialization import json
+from basecampreporting.parser import parse_basecamp_xml, Interner
+from basecampreporting.mocks import TestProject
+from basecampreporting.generator import AccountGenerator, PRESETS
+from basecampreporting import sample
+from basecampreporting.columnar import ColumnarWriter, TIME_ENTRIES
+from basecampreporting import tracing
+
+DEFAULT_SIZES = ['small', 'medium']
+DEFAULT_THRESHOLD = 0.10
+RETAINED_COPIES = 4
+
+
+class _NullWriter(object):
+    def write(self, s):
+        pass
+
+
+class BenchmarkContext(object):
+    '''Generated responses for one size, shared by every case at that size.'''
+    def __init__(self, size, seed=0):
+        self.size = size
+        sizes = dict(PRESETS[size])
+        sizes['projects'] = 1
+        self.generator = AccountGenerator(seed=seed, **sizes)
+        self.project_id = self.generator.project_id(0)
+        self.responses = self.generator.responses()
+
+    def project(self):
+        return TestProject("http://FAKE.basecamphq.com/", self.project_id,
+                           "FAKE", "FAKE", self.responses)
+
+    def payload(self, method, *args):
+        path, data = getattr(self.generator.recorder, method)(*args)
+        if data: return self.responses['POST'][path][ET.tostring(data)]
+        return self.responses['GET'][path]
+
+
+# Each case takes a BenchmarkContext and returns a callable that performs one
+# timed iteration and returns the number of records it processed. A callable
+# with a report() attribute adds what it returns to the case's results.
+
+def _parse_payloads(ctx):
+    return [(ctx.payload('message_archive', ctx.project_id), 'post'),
+            (ctx.payload('list_time_entries', ctx.project_id,
+                         datetime.date(1900, 1, 1), ctx.generator.today),
+             'time-entry')]
+
+def bench_parse(ctx, backend=ET):
+    payloads = _parse_payloads(ctx)
+    def run():
+        count = 0
+        for xml, tag in payloads:
+            for node in backend.select(xml, tag):
+                parse_basecamp_xml(node)
+                count += 1
+        return count
+    return run
+
+def bench_backend(name):
+    '''The parse case with the named etree backend rather than the one in
+       use.'''
+    return lambda ctx: bench_parse(ctx, etree.load(name))
+
+def bench_columnar(ctx):
+    '''Time entries written to a columnar file straight from the XML, to
+       set against the parse case.'''
+    xml = ctx.payload('list_time_entries', ctx.project_id,
+                      datetime.date(1900, 1, 1), ctx.generator.today)
+    def run():
+        fd, path = tempfile.mkstemp('.bcc')
+        os.close(fd)
+        try:
+            writer = ColumnarWriter(path, TIME_ENTRIES)
+            writer.add(xml)
+            writer.close()
+        finally:
+            os.remove(path)
+        return writer.rows
+    return run
+
+def bench_models(ctx):
+    p = ctx.project()
+    def run():
+        p.clear_cache()
+        return len(p.messages) + len(p.time_entries) + len(p.milestones) \
+            + len(p.todo_lists)
+    return run
+
+def bench_retained(ctx):
+    '''Holds the models of several copies of the project at once, sharing
+       one Interner as a Portfolio does; peak memory shows what the caches
+       cost and the report how much interning saved.'''
+    interner = Interner()
+    def run():
+        projects = []
+        for i in xrange(RETAINED_COPIES):
+            p = ctx.project()
+            p.interner = interner
+            p.messages, p.comments, p.milestones, p.time_entries
+            projects.append(p)
+        return sum([len(p.messages) + len(p.time_entries) for p in projects])
+    run.report = lambda: dict(interning=interner.stats())
+    return run
+
+def bench_derived(ctx):
+    p = ctx.project()
+    p.milestones, p.todo_lists
+    def run():
+        p.sprints, p.current_sprint, p.late_milestones
+        return 1
+    return run
+
+def bench_summary(ctx):
+    p = ctx.project()
+    p.summary
+    def run():
+        p._summary = None
+        p.summary
+        return 1
+    return run
+
+def bench_to_json(ctx):
+    p = ctx.project()
+    p.to_json()
+    def run():
+        p.to_json()
+        return 1
+    return run
+
+def bench_report(ctx):
+    def run():
+        stdout, sys.stdout = sys.stdout, _NullWriter()
+        try:
+            p = ctx.project()
+            p.name
+            sample.report(p)
+        finally:
+            sys.stdout = stdout
+        return 1
+    return run
+
+CASES = [
+    ('parse', bench_parse),
+    ('columnar', bench_columnar),
+    ('models', bench_models),
+    ('retained', bench_retained),
+    ('derived', bench_derived),
+    ('summary', bench_summary),
+    ('to_json', bench_to_json),
+    ('report', bench_report),
+] + [('xml_' + name, bench_backend(name)) for name in etree.available()]
+
+
+def percentile(ordered, fraction):
+    '''Nearest-rank percentile of an already sorted list.'''
+    index = int(round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+def measure(run, repeat):
+    '''Times repeat iterations of run, after one warm-up call.'''
+    run()
+    latencies = []
+    records = 0
+    for i in xrange(repeat):
+        start = time.time()
+        records += run()
+        latencies.append(time.time() - start)
+    ordered = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'iterations': repeat,
+        'records': records,
+        'throughput': total and records / total or 0.0,
+        'mean': total / repeat,
+        'p50': percentile(ordered, 0.50),
+        'p90': percentile(ordered, 0.90),
+        'p99': percentile(ordered, 0.99),
+        'max': ordered[-1],
+    }
+
+
+def _status_kb(field):
+    try:
+        for line in open('/proc/self/status'):
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+def _reset_peak():
+    '''Resets the kernel's RSS high water mark (Linux 4.0+).'''
+    try:
+        f = open('/proc/self/clear_refs', 'w')
+        f.write('5')
+        f.close()
+        return True
+    except IOError:
+        return False
+
+def run_case(func, ctx, repeat):
+    '''Runs one case in a forked child, so its peak memory is not hidden by
+       what earlier cases left allocated, and returns its measurements.'''
+    if not hasattr(os, 'fork'):
+        run = func(ctx)
+        result = measure(run, repeat)
+        result['peak_kb'] = None
+        if hasattr(run, 'report'): result.update(run.report())
+        return result
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 1
+        try:
+            run = func(ctx)
+            _reset_peak()
+            before = _status_kb('VmRSS')
+            result = measure(run, repeat)
+            peak = _status_kb('VmHWM')
+            result['peak_kb'] = (peak is not None and before is not None) \
+                and max(0, peak - before) or None
+            if hasattr(run, 'report'): result.update(run.report())
+            os.write(write_fd, json.dumps(result))
+            status = 0
+        except Exception:
+            traceback.print_exc()
+        finally:
+            # _exit skips flushing, and the parent's cleanup.
+            sys.stderr.flush()
+            os._exit(status)
+    os.close(write_fd)
+    chunks = []
+    while True:
+        chunk = os.read(read_fd, 65536)
+        if not chunk: break
+        chunks.append(chunk)
+    os.close(read_fd)
+    status = os.waitpid(pid, 0)[1]
+    if status or not chunks:
+        raise RuntimeError("benchmark case %s failed" % func.__name__)
+    return json.loads(''.join(chunks))
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, cases=None, repeat=5, seed=0, log=None):
+    results = {}
+    for size in sizes:
+        ctx = BenchmarkContext(size, seed=seed)
+        for name, func in CASES:
+            if cases and name not in cases: continue
+            result = run_case(func, ctx, repeat)
+            results['%s/%s' % (name, size)] = result
+            if log:
+                log("%-22s %10.1f rec/s  p50 %8.2fms  p99 %8.2fms  peak %s KiB"
+                    % ('%s/%s' % (name, size), result['throughput'],
+                       result['p50'] * 1000, result['p99'] * 1000,
+                       result['peak_kb']))
+                if 'interning' in result:
+                    log("%-22s %10s interned %s duplicates, saving %s KiB"
+                        % ('', '', result['interning']['hits'],
+                           result['interning']['bytes_saved'] // 1024))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    '''Returns (key, metric, old, new) for every measurement in results that
+       is more than threshold worse than the same one in baseline.'''
+    regressions = []
+    for key, new in sorted(results['results'].items()):
+        old = baseline['results'].get(key)
+        if not old: continue
+        for metric in ('p50', 'peak_kb'):
+            if not old.get(metric) or new.get(metric) is None: continue
+            if new[metric] > old[metric] * (1 + threshold):
+                regressions.append((key, metric, old[metric], new[metric]))
+    return regressions
+
+
+def main(argv=None):
+    tracing.enable_from_environment()
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--sizes", default=','.join(DEFAULT_SIZES),
+                      help="comma separated generator presets (%s)" % ', '.join(sorted(PRESETS)))
+    parser.add_option("--cases", default='',
+                      help="comma separated cases to run (%s)" % ', '.join([c[0] for c in CASES]))
+    parser.add_option("--repeat", type="int", default=5)
+    parser.add_option("--seed", type="int", default=0)
+    parser.add_option("--output", help="write results to this JSON file")
+    parser.add_option("--baseline", help="compare against this results file")
+    parser.add_option("--threshold", type="float", default=DEFAULT_THRESHOLD,
+                      help="allowed fractional slowdown before failing [%default]")
+    options, args = parser.parse_args(argv)
+
+    def log(line):
+        print line
+    results = run_benchmarks(sizes=options.sizes.split(','),
+                             cases=[c for c in options.cases.split(',') if c],
+                             repeat=options.repeat, seed=options.seed, log=log)
+    if options.output:
+        open(options.output, 'w').write(json.dumps(results, indent=2, sort_keys=True))
+
+    if options.baseline:
+        baseline = json.loads(open(options.baseline).read())
+        regressions = compare(results, baseline, options.threshold)
+        for key, metric, old, new in regressions:
+            print "REGRESSION %s %s: %s -> %s" % (key, metric, old, new)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
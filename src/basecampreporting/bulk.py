@@ -0,0 +1,278 @@
+"""Many Basecamp writes at once, such as setting up a sprint.
+
+    bulk = p.bulk()                     # or BulkWriter(bc, projects=[p])
+    for title, deadline in deadlines:
+        bulk.create_milestone(p.id, title, deadline, person_id, False)
+    for content in stories:
+        bulk.create_todo_item(list_id, content)
+    bulk.move_todo_item(urgent_id, 1, list_id=list_id)
+    for result in bulk.run():
+        if not result.ok: print result.method, result.args, result.error
+
+Nothing is sent until run(). Milestones created in the same project go to
+Basecamp batch_size at a time through create_milestones, its one batched
+write; everything else is sent on at most `workers` threads, which with the
+request scheduler's connection reuse turns a 200-item sprint into a few
+seconds of round trips instead of minutes.
+
+Writes that must happen in order are kept in order. Each write belongs to a
+lane, such as a to-do list or an item, and is either ordered or not: an
+ordered write waits for every earlier write in its lane, an unordered one
+only for the last earlier ordered write. So moves within a list happen one
+after the other, after the items created before them; items created with
+ordered=False (the default) go in concurrently and end up in the list in
+the order Basecamp receives them.
+
+run() returns a WriteResult per write, in the order they were queued, and
+clears the collections they affect from the projects given, and their
+responses from the Basecamp response cache, whether the writes succeeded
+or not.
+"""
+
+import sys
+import threading
+
+from basecampreporting.etree import ET
+from basecampreporting.workers import map_unordered
+
+DEFAULT_WORKERS = 8
+DEFAULT_BATCH_SIZE = 50
+
+# The Project collections each kind of write makes stale.
+TODO_CACHES = ('todo_lists', 'todo_items')
+MILESTONE_CACHES = ('milestones',)
+
+
+class WriteResult(object):
+    '''The outcome of one queued write: the response, or the sys.exc_info()
+       of its failure.'''
+    __slots__ = ('method', 'args', 'kwargs', 'result', 'exc_info')
+
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.exc_info = None
+
+    def ok(self):
+        return self.exc_info is None
+    ok = property(ok)
+
+    def error(self):
+        if self.exc_info is None: return None
+        return self.exc_info[1]
+    error = property(error)
+
+    def raise_error(self):
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+    def __repr__(self):
+        return '<WriteResult %s%r %s>' % (self.method, self.args,
+                                          self.ok and 'ok' or repr(self.error))
+
+
+class _Write(object):
+    '''One request to send: call() returns its response, which deliver()
+       hands out to the results it answers.'''
+    def __init__(self, call, results, after):
+        self.call = call
+        self.results = results
+        self.after = after
+        self.done = threading.Event()
+
+    def deliver(self, response):
+        for result in self.results:
+            result.result = response
+
+    def fail(self, exc_info):
+        for result in self.results:
+            result.exc_info = exc_info
+
+class _MilestoneBatch(_Write):
+    def deliver(self, response):
+        # Basecamp answers with the new milestones in the order sent.
+        nodes = ET.fromstring(response).findall('milestone')
+        if len(nodes) != len(self.results):
+            return _Write.deliver(self, response)
+        for result, node in zip(self.results, nodes):
+            result.result = ET.tostring(node)
+
+
+class BulkWriter(object):
+    '''Queues writes to Basecamp bc and sends them together on run().
+       projects are the Project instances whose caches the writes should
+       clear. Set batch_milestones to False for servers that don't accept
+       several milestones in one create request.'''
+    def __init__(self, bc, projects=(), workers=DEFAULT_WORKERS,
+                 batch_size=DEFAULT_BATCH_SIZE, batch_milestones=True):
+        self.bc = bc
+        self.projects = list(projects)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_milestones = batch_milestones
+        self.pending = []
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _queue(self, method, args, kwargs, lane, ordered, caches):
+        result = WriteResult(method, args, kwargs)
+        self.pending.append((result, lane, ordered, caches))
+        return result
+
+    # To-do items
+
+    def create_todo_item(self, list_id, content, party_id=None, notify=False,
+                         ordered=False):
+        '''Adds an item to the bottom of a list; with ordered set, only after
+           the writes queued before it for that list.'''
+        return self._queue('create_todo_item', (list_id, content),
+                           dict(party_id=party_id, notify=notify),
+                           ('list', list_id), ordered, TODO_CACHES)
+
+    def update_todo_item(self, item_id, content, party_id=None, notify=False):
+        return self._queue('update_todo_item', (item_id, content),
+                           dict(party_id=party_id, notify=notify),
+                           ('item', item_id), True, TODO_CACHES)
+
+    def complete_todo_item(self, item_id):
+        return self._queue('complete_todo_item', (item_id,), {},
+                           ('item', item_id), True, TODO_CACHES)
+
+    def uncomplete_todo_item(self, item_id):
+        return self._queue('uncomplete_todo_item', (item_id,), {},
+                           ('item', item_id), True, TODO_CACHES)
+
+    def move_todo_item(self, item_id, to, list_id=None):
+        '''Positions are relative to the rest of the list, so moves are sent
+           one at a time in the order queued: after everything queued
+           earlier for list_id when it is given, otherwise after the other
+           moves.'''
+        lane = list_id is None and ('moves',) or ('list', list_id)
+        return self._queue('move_todo_item', (item_id, to), {}, lane, True,
+                           TODO_CACHES)
+
+    def delete_todo_item(self, item_id):
+        return self._queue('delete_todo_item', (item_id,), {},
+                           ('item', item_id), True, TODO_CACHES)
+
+    # Milestones
+
+    def create_milestone(self, project_id, title, deadline, party_id, notify):
+        return self._queue('create_milestone',
+                           (project_id, title, deadline, party_id, notify), {},
+                           ('milestones', project_id), False, MILESTONE_CACHES)
+
+    def complete_milestone(self, milestone_id):
+        return self._queue('complete_milestone', (milestone_id,), {},
+                           ('milestone', milestone_id), True, MILESTONE_CACHES)
+
+    def uncomplete_milestone(self, milestone_id):
+        return self._queue('uncomplete_milestone', (milestone_id,), {},
+                           ('milestone', milestone_id), True, MILESTONE_CACHES)
+
+    def _call(self, result):
+        method = getattr(self.bc, result.method)
+        return lambda: method(*result.args, **result.kwargs)
+
+    def _batch_call(self, project_id, results):
+        milestones = [result.args[1:] for result in results]
+        return lambda: self.bc.create_milestones(project_id, milestones)
+
+    def _plan(self, pending):
+        '''The requests to send, in the order queued, each knowing the
+           earlier ones it has to wait for.'''
+        grouped = {}   # id(first result of a batch) -> its results
+        batches = {}   # project lane -> the batch being filled
+        entries = []
+        for entry in pending:
+            result, lane, ordered, caches = entry
+            if result.method == 'create_milestone' and self.batch_milestones:
+                batch = batches.get(lane)
+                if batch is None or len(batch) >= self.batch_size:
+                    batch = batches[lane] = [result]
+                    grouped[id(result)] = batch
+                    # Batches follow one another, as the items in them do.
+                    entries.append((result, lane, True, caches))
+                else:
+                    batch.append(result)
+                continue
+            entries.append(entry)
+
+        writes = []
+        lanes = {}     # lane -> (last ordered write, unordered writes since)
+        for result, lane, ordered, caches in entries:
+            last, since = lanes.get(lane, (None, []))
+            after = last is not None and [last] or []
+            batch = grouped.get(id(result))
+            if batch is not None:
+                write = _MilestoneBatch(self._batch_call(lane[1], batch),
+                                        batch, after)
+            else:
+                write = _Write(self._call(result), [result], after)
+            if ordered:
+                write.after.extend(since)
+                lanes[lane] = (write, [])
+            else:
+                since.append(write)
+                lanes[lane] = (last, since)
+            writes.append(write)
+        return writes
+
+    def _send(self, write):
+        # Waiting can't deadlock: the workers take writes in the order
+        # planned, so everything waited on has already been taken.
+        for earlier in write.after:
+            earlier.done.wait()
+        try:
+            try:
+                write.deliver(write.call())
+            except Exception:
+                write.fail(sys.exc_info())
+        finally:
+            write.done.set()
+
+    def run(self):
+        '''Sends the queued writes and returns their WriteResults, in the
+           order they were queued.'''
+        pending, self.pending = self.pending, []
+        if not pending: return []
+        writes = self._plan(pending)
+        for write, response, exc_info in map_unordered(self._send, writes,
+                                                       self.workers):
+            pass
+        self._invalidate(pending)
+        return [entry[0] for entry in pending]
+
+    def _invalidate(self, pending):
+        todos = False
+        list_ids = set()
+        milestones = set()   # project ids, or None for any project
+        for result, lane, ordered, caches in pending:
+            if caches is TODO_CACHES:
+                todos = True
+                if lane[0] == 'list': list_ids.add(lane[1])
+            elif result.method == 'create_milestone':
+                milestones.add(result.args[0])
+            else:
+                # Milestones changed by id may be in any of the projects.
+                milestones.add(None)
+        for p in self.projects:
+            names = []
+            if todos:
+                names.extend(TODO_CACHES)
+                todo_lists = p.cache['todo_lists'] or p.last_loaded.get('todo_lists') or {}
+                list_ids.update([tdlist.id for tdlist in todo_lists.values()])
+                for complete in (None, True, False):
+                    self.bc.forget('todo_lists', p.id, complete)
+            if None in milestones or p.id in milestones:
+                names.extend(MILESTONE_CACHES)
+                for find in (None, 'late', 'upcoming', 'completed'):
+                    self.bc.forget('list_milestones', p.id, find)
+            for name in names:
+                p.clear_cache(name)
+        # Basecamp's response cache would otherwise answer the reads again.
+        for list_id in list_ids:
+            self.bc.forget('todo_list', list_id)
@@ -0,0 +1,259 @@
+"""Sprint burndowns and velocity, kept up to date as items are completed.
+
+    burndown = p.burndown
+    for sprint in burndown.sprints_in_order():
+        chart(sprint.name, sprint.series())
+    print burndown.average_velocity(last=3)
+
+A Burndown tracks every todo list that is_sprint: how many items it holds
+and how many were completed on each day. A sprint's series is the number
+of items remaining at the end of each day of the sprint, and its velocity
+the number of items it completed; velocity() lists the finished sprints'.
+
+Nothing is recomputed from scratch on a refresh. The Burndown remembers the
+list and completion day of each item it has seen, and update() (or apply(),
+fed by a changes.ChangeStream with the 'todo_item' kind) only moves the
+counts of the items that changed. A sprint's series is rebuilt from its
+per-day counts when they change, which costs a step per day of the sprint,
+not per item.
+
+Basecamp does not date todo lists. A sprint whose list is tied to a
+milestone ends on the milestone's deadline; otherwise it starts on the day
+given for its number in `starts`, or else on the day its first item was
+completed. Either way it lasts sprint_length days, or longer if items were
+completed after that.
+"""
+
+import datetime
+
+DEFAULT_SPRINT_LENGTH = 14
+
+
+def _day(value):
+    if isinstance(value, datetime.datetime): return value.date()
+    if isinstance(value, datetime.date): return value
+    return None
+
+def item_state(item):
+    '''(todo list id, completed, day completed) of a todo item. The day is
+       None when Basecamp gave no completion date.'''
+    completed = bool(getattr(item, 'completed', False))
+    day = completed and _day(getattr(item, 'completed_on', None)) or None
+    return (getattr(item, 'todo_list_id', None), completed, day)
+
+def sprint_number(tdlist):
+    '''The sprint number in the name of tdlist, or None if it has none.'''
+    try:
+        return tdlist.sprint_number
+    except AttributeError:
+        return None
+
+
+class SprintBurndown(object):
+    '''The items of one sprint and the days they were completed on.'''
+    def __init__(self, todo_list_id, name, number=None, length=DEFAULT_SPRINT_LENGTH):
+        self.todo_list_id = todo_list_id
+        self.name = name
+        self.number = number
+        self.length = length
+        self.is_complete = False
+        # First and last days set from outside, if known.
+        self.first_day = None
+        self.last_day = None
+        self.scope = 0
+        self.completed = 0
+        self.days = {}          # day -> items completed that day
+        self._series = None
+
+    @property
+    def remaining(self):
+        return self.scope - self.completed
+
+    def count(self, completed, day, n=1):
+        '''Adds n items (or removes them, with a negative n) completed on day,
+           or not completed at all.'''
+        self.scope += n
+        if completed:
+            self.completed += n
+            left = self.days.get(day, 0) + n
+            if left: self.days[day] = left
+            else: del self.days[day]
+        self._series = None
+
+    def window(self):
+        '''(start, end) days of the sprint, or (None, None) before it has a
+           start.'''
+        dated = [day for day in self.days if day is not None]
+        start = self.first_day
+        if start is None and self.last_day is not None:
+            start = self.last_day - datetime.timedelta(days=self.length - 1)
+        if start is None and dated: start = min(dated)
+        if start is None: return None, None
+        end = self.last_day or start + datetime.timedelta(days=self.length - 1)
+        if dated: end = max(end, max(dated))
+        return start, end
+
+    def series(self, today=None):
+        '''[(day, items remaining at the end of it)] from the first day of
+           the sprint to its last, or to today if that comes first.'''
+        today = today or datetime.date.today()
+        if self._series is not None and self._series[0] == today:
+            return self._series[1]
+        start, end = self.window()
+        series = []
+        if start is not None:
+            # Undated completions, and any from before the start, count on
+            # the first day.
+            remaining = self.scope - sum([n for day, n in self.days.items()
+                                          if day is None or day < start])
+            day, last = start, min(end, today)
+            while day <= last:
+                remaining -= self.days.get(day, 0)
+                series.append((day, remaining))
+                day += datetime.timedelta(days=1)
+        self._series = (today, series)
+        return series
+
+    def is_finished(self, today=None):
+        '''Whether the list is complete or the sprint is over.'''
+        if self.is_complete: return True
+        end = self.window()[1]
+        return end is not None and end < (today or datetime.date.today())
+
+    def to_dict(self, today=None):
+        start, end = self.window()
+        return dict(name=self.name, number=self.number, scope=self.scope,
+                    completed=self.completed, remaining=self.remaining,
+                    start=start, end=end, series=self.series(today))
+
+    def __repr__(self):
+        return '<SprintBurndown %r %s/%s>' % (self.name, self.completed, self.scope)
+
+
+class Burndown(object):
+    '''Burndowns of the sprints of one project. starts optionally maps
+       sprint numbers to their first days.'''
+    def __init__(self, sprint_length=DEFAULT_SPRINT_LENGTH, starts=None):
+        self.sprint_length = sprint_length
+        self.starts = starts or {}
+        self.project_id = None
+        self.sprints = {}       # todo list id -> SprintBurndown
+        self.items = {}         # todo item id -> item_state()
+        self._sources = (None, None)
+
+    def update(self, p):
+        '''Brings the burndowns up to date with the todo lists and items of
+           p, a Project. Collections already seen are skipped. Returns the
+           number of items that changed.'''
+        self.project_id = p.id
+        todo_lists = p.todo_lists
+        if todo_lists is not self._sources[0]:
+            sprint_lists = [l for l in todo_lists.values() if l.is_sprint]
+            deadlines = {}
+            if [l for l in sprint_lists if getattr(l, 'milestone_id', None)]:
+                deadlines = dict((m.id, m.deadline) for m in p.milestones)
+            ids = set()
+            for tdlist in sprint_lists:
+                self.set_sprint(tdlist, deadlines.get(getattr(tdlist, 'milestone_id', None)))
+                ids.add(tdlist.id)
+            for todo_list_id in [i for i in self.sprints if i not in ids]:
+                self.remove_sprint(todo_list_id)
+
+        todo_items = p.todo_items
+        changed = 0
+        if todo_items is not self._sources[1]:
+            ids = set()
+            for item in todo_items:
+                ids.add(item.id)
+                if self.set_item(item): changed += 1
+            for item_id in [i for i in self.items if i not in ids]:
+                self.remove_item(item_id)
+                changed += 1
+        self._sources = (todo_lists, todo_items)
+        return changed
+
+    def set_sprint(self, tdlist, deadline=None):
+        '''Tracks tdlist as a sprint, or updates its name and dates.'''
+        sprint = self.sprints.get(tdlist.id)
+        if sprint is None:
+            sprint = self.sprints[tdlist.id] = SprintBurndown(
+                tdlist.id, tdlist.name, length=self.sprint_length)
+            for state in self.items.values():
+                if state[0] == tdlist.id: sprint.count(state[1], state[2])
+        sprint.name = tdlist.name
+        sprint.number = sprint_number(tdlist)
+        sprint.is_complete = tdlist.is_complete
+        sprint.first_day = self.starts.get(sprint.number)
+        sprint.last_day = _day(deadline)
+        sprint._series = None
+        return sprint
+
+    def remove_sprint(self, todo_list_id):
+        self.sprints.pop(todo_list_id, None)
+
+    def set_item(self, item):
+        '''Counts item, moving it if it changed list or was completed or
+           reopened. Returns whether anything changed.'''
+        state = item_state(item)
+        previous = self.items.get(item.id)
+        if state == previous: return False
+        if previous is not None: self._count(previous, -1)
+        self._count(state, 1)
+        self.items[item.id] = state
+        return True
+
+    def remove_item(self, item_id):
+        previous = self.items.pop(item_id, None)
+        if previous is not None: self._count(previous, -1)
+
+    def _count(self, state, n):
+        sprint = self.sprints.get(state[0])
+        if sprint is not None: sprint.count(state[1], state[2], n)
+
+    def apply(self, event):
+        '''Applies a changes.ChangeEvent for a todo item or list of the
+           project (others are ignored).'''
+        if self.project_id is not None and event.project_id != self.project_id:
+            return
+        if event.kind == 'todo_item':
+            if event.new is None: self.remove_item(event.record_id)
+            else: self.set_item(event.new)
+        elif event.kind == 'todo_list':
+            if event.new is None or not event.new.is_sprint:
+                self.remove_sprint(event.record_id)
+            else:
+                previous = self.sprints.get(event.record_id)
+                self.set_sprint(event.new, previous and previous.last_day)
+
+    def listen(self, stream):
+        '''Keeps the burndowns up to date with the changes published on
+           stream, a changes.ChangeStream that tracks todo items.'''
+        stream.subscribe(self.apply, kinds=['todo_list', 'todo_item'])
+
+    def sprints_in_order(self):
+        '''The SprintBurndowns by sprint number; those without one last.'''
+        return sorted(self.sprints.values(),
+                      key=lambda s: (s.number is None, s.number, s.name))
+
+    def sprint(self, name):
+        for sprint in self.sprints.values():
+            if sprint.name == name: return sprint
+        return None
+
+    def velocity(self, today=None):
+        '''[(sprint name, items completed)] of the finished sprints, in
+           order.'''
+        return [(s.name, s.completed) for s in self.sprints_in_order()
+                if s.is_finished(today)]
+
+    def average_velocity(self, last=3, today=None):
+        '''Mean items completed over the last `last` finished sprints, or
+           None before any has finished.'''
+        velocity = self.velocity(today)[-last:]
+        if not velocity: return None
+        return sum([completed for name, completed in velocity]) / float(len(velocity))
+
+    def to_dict(self, today=None):
+        return dict(sprints=[s.to_dict(today) for s in self.sprints_in_order()],
+                    velocity=self.velocity(today),
+                    average_velocity=self.average_velocity(today=today))
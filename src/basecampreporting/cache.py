@@ -0,0 +1,471 @@
+"""Cache backends shared by Basecamp (raw read responses) and Project
+(parsed collections), so that several clients, threads or worker processes
+fetch each piece of Basecamp data once.
+
+    shared = open_cache('memcached://127.0.0.1:11211')
+    bc = Basecamp(url, username, password, cache=shared)
+    p = Project(url, project_id, None, None, basecamp=bc, cache_backend=shared)
+
+Every backend has the same four methods, and nothing else is expected of
+one:
+
+    get(key)                 the stored value, or None on a miss
+    set(key, value, ttl)     ttl in seconds, None to keep it until evicted
+    delete(key)
+    clear()
+
+Values are turned into bytes with a serializer, any object with dumps() and
+loads(). The default, DataSerializer, stores data only: anyone able to
+write to a shared cache could otherwise have code run in every process
+reading it, as unpickling allows. PickleSerializer is faster and may be
+chosen for a MemoryCache or a FileCache no one else writes to; SocketCache
+refuses it. The backends shipped here are:
+
+    MemoryCache   in-process LRU holding at most max_bytes of serialized data
+    FileCache     one file per key in a directory, written atomically, so
+                  processes on one machine can share it
+    SocketCache   client for the memcached text protocol; CacheServer is a
+                  small stand-in for memcached when none is running
+
+A backend that cannot be reached behaves as an empty cache: reports get
+slower, not broken.
+"""
+
+import collections
+import cPickle as pickle
+import datetime
+import hashlib
+import os
+import socket
+import tempfile
+import threading
+import time
+import urlparse
+import zlib
+import SocketServer
+
+from basecampreporting.serialization import json
+
+DEFAULT_TTL = 300
+# How long Basecamp keeps the last response to each read to fall back on.
+DEFAULT_STALE_TTL = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class PickleSerializer(object):
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def dumps(self, value):
+        return pickle.dumps(value, self.protocol)
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+def _record_classes():
+    # Imported here: project itself uses the cache backends.
+    from basecampreporting import project
+    return dict((cls.__name__, cls) for cls in (
+        project.Message, project.Comment, project.Milestone, project.ToDoList,
+        project.ToDoItem, project.TimeEntry, project.Person))
+
+class DataSerializer(object):
+    '''Byte strings, such as Basecamp's XML responses, are stored as they
+       are; other values as JSON, with dates, datetimes and dictionaries
+       with keys other than strings tagged, and Basecamp records stored as
+       their fields and rebuilt through their usual constructors. Loading
+       builds nothing but those, so an entry written by someone else can
+       at worst hold wrong data. Entries in any other form raise
+       ValueError.'''
+    DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+    def dumps(self, value):
+        if isinstance(value, str): return 'b' + value
+        return 'j' + json.dumps(self._encode(value), separators=(',', ':'))
+
+    def loads(self, data):
+        if data[:1] == 'b': return data[1:]
+        if data[:1] != 'j': raise ValueError("not a DataSerializer entry")
+        return json.loads(data[1:], object_hook=self._decode)
+
+    def _encode(self, value):
+        if value is None or isinstance(value, (basestring, bool, int, long, float)):
+            return value
+        if isinstance(value, datetime.datetime):
+            return {'__datetime__': value.strftime(self.DATETIME_FORMAT)}
+        if isinstance(value, datetime.date):
+            return {'__date__': value.isoformat()}
+        if isinstance(value, (list, tuple)):
+            return [self._encode(v) for v in value]
+        if isinstance(value, dict):
+            if all([isinstance(key, basestring) and not key.startswith('__')
+                    for key in value]):
+                return dict((key, self._encode(v)) for key, v in value.iteritems())
+            for key in value:
+                if not (key is None or isinstance(key, (basestring, int, long, float))):
+                    raise TypeError("can't store a dictionary keyed by %r" % (key,))
+            return {'__items__': [[key, self._encode(v)] for key, v in value.iteritems()]}
+        name = type(value).__name__
+        if name in _record_classes() and hasattr(value, '_basecamp_attributes'):
+            fields = dict((key, self._encode(getattr(value, key)))
+                          for key in value._basecamp_attributes)
+            return {'__record__': name, 'fields': fields}
+        raise TypeError("can't store %r" % (value,))
+
+    def _decode(self, obj):
+        if '__date__' in obj:
+            return datetime.datetime.strptime(obj['__date__'], '%Y-%m-%d').date()
+        if '__datetime__' in obj:
+            return datetime.datetime.strptime(obj['__datetime__'], self.DATETIME_FORMAT)
+        if '__items__' in obj:
+            return dict([(key, value) for key, value in obj['__items__']])
+        if '__record__' in obj:
+            cls = _record_classes().get(obj['__record__'])
+            if cls is None: raise ValueError("unknown record %r" % obj['__record__'])
+            return cls(dict((str(key), value) for key, value in obj['fields'].items()))
+        return obj
+
+def _unpickles(serializer):
+    while serializer is not None:
+        if isinstance(serializer, PickleSerializer): return True
+        serializer = getattr(serializer, 'serializer', None)
+    return False
+
+class RawSerializer(object):
+    '''Stores byte strings as they are, such as Basecamp's XML responses.'''
+    def dumps(self, value):
+        return value
+
+    def loads(self, data):
+        return data
+
+class CompressedSerializer(object):
+    '''Compresses what another serializer produces. Basecamp XML shrinks to
+       a fraction of its size, which stretches a byte budget.'''
+    def __init__(self, serializer=None, level=6):
+        self.serializer = serializer or DataSerializer()
+        self.level = level
+
+    def dumps(self, value):
+        return zlib.compress(self.serializer.dumps(value), self.level)
+
+    def loads(self, data):
+        try:
+            data = zlib.decompress(data)
+        except zlib.error, e:
+            raise ValueError(str(e))
+        return self.serializer.loads(data)
+
+
+def _expiry(ttl):
+    if ttl is None: return None
+    return time.time() + ttl
+
+
+class MemoryCache(object):
+    '''Least recently used entries are evicted once the serialized values
+       and their keys take up more than max_bytes.'''
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, serializer=None):
+        self.max_bytes = max_bytes
+        self.serializer = serializer or DataSerializer()
+        self.entries = collections.OrderedDict()   # key -> (data, expires)
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        self.lock.acquire()
+        try:
+            entry = self.entries.pop(key, None)
+            if entry is not None and entry[1] is not None and entry[1] <= time.time():
+                self.size -= len(key) + len(entry[0])
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            self.hits += 1
+            data = entry[0]
+        finally:
+            self.lock.release()
+        return self.serializer.loads(data)
+
+    def set(self, key, value, ttl=None):
+        data = self.serializer.dumps(value)
+        self.lock.acquire()
+        try:
+            self._remove(key)
+            if len(key) + len(data) > self.max_bytes: return
+            self.entries[key] = (data, _expiry(ttl))
+            self.size += len(key) + len(data)
+            while self.size > self.max_bytes:
+                oldest, (old_data, expires) = self.entries.popitem(last=False)
+                self.size -= len(oldest) + len(old_data)
+                self.evictions += 1
+        finally:
+            self.lock.release()
+
+    def delete(self, key):
+        self.lock.acquire()
+        try:
+            self._remove(key)
+        finally:
+            self.lock.release()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None: self.size -= len(key) + len(entry[0])
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.entries.clear()
+            self.size = 0
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FileCache(object):
+    '''Entries are files named after a digest of their key. A file is
+       written under a temporary name and renamed into place, so readers in
+       other processes see either the old entry or the new one, never part
+       of one. Expired files are removed when they are next read.'''
+    suffix = '.cache'
+
+    def __init__(self, directory, serializer=None):
+        self.directory = directory
+        self.serializer = serializer or DataSerializer()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory,
+                            hashlib.md5(key).hexdigest() + self.suffix)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+            try:
+                expires = f.readline().strip()
+                data = f.read()
+            finally:
+                f.close()
+        except IOError:
+            return None
+        if expires != '-' and float(expires) <= time.time():
+            self._unlink(path)
+            return None
+        try:
+            return self.serializer.loads(data)
+        except ValueError:
+            return None
+
+    def set(self, key, value, ttl=None):
+        data = self.serializer.dumps(value)
+        expires = _expiry(ttl)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(expires is None and '-\n' or '%r\n' % expires)
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(temporary, self.path(key))
+        except:
+            self._unlink(temporary)
+            raise
+
+    def delete(self, key):
+        self._unlink(self.path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                self._unlink(os.path.join(self.directory, name))
+
+    def _unlink(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SocketCache(object):
+    '''Client for a memcached server, or a CacheServer. Keys are hashed to
+       fit memcached's key rules. Connection failures count as misses and
+       are tallied in self.errors; the next call reconnects.'''
+    MAX_RELATIVE_TTL = 30 * 24 * 3600
+
+    def __init__(self, host='127.0.0.1', port=11211, serializer=None, timeout=5):
+        self.address = (host, port)
+        if _unpickles(serializer):
+            raise ValueError("entries others can write must not be unpickled")
+        self.serializer = serializer or DataSerializer()
+        self.timeout = timeout
+        self.errors = 0
+        self.sock = self.reader = None
+        self.lock = threading.Lock()
+
+    def _key(self, key):
+        return 'bcr:' + hashlib.md5(key).hexdigest()
+
+    def _connect(self):
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, self.timeout)
+            self.reader = self.sock.makefile('rb')
+
+    def _disconnect(self):
+        if self.sock is not None:
+            try:
+                self.reader.close()
+                self.sock.close()
+            except socket.error:
+                pass
+        self.sock = self.reader = None
+
+    def _call(self, command, body=None, reply=None):
+        '''Sends command (and body) and returns reply(reader), or the first
+           line of the response. None when the server can't be reached.'''
+        self.lock.acquire()
+        try:
+            try:
+                self._connect()
+                message = command + '\r\n'
+                if body is not None: message += body + '\r\n'
+                self.sock.sendall(message)
+                if reply is not None: return reply(self.reader)
+                return self.reader.readline().rstrip('\r\n')
+            except (socket.error, EOFError):
+                self.errors += 1
+                self._disconnect()
+                return None
+        finally:
+            self.lock.release()
+
+    def get(self, key):
+        def read_value(reader):
+            header = reader.readline()
+            if not header: raise EOFError
+            if not header.startswith('VALUE '): return None
+            length = int(header.split()[3])
+            data = reader.read(length + 2)[:-2]
+            reader.readline()   # END
+            return data
+        data = self._call('get %s' % self._key(key), reply=read_value)
+        if data is None: return None
+        try:
+            return self.serializer.loads(data)
+        except ValueError:
+            # Not written by a client like this one.
+            return None
+
+    def set(self, key, value, ttl=None):
+        data = self.serializer.dumps(value)
+        exptime = 0
+        if ttl is not None:
+            # memcached reads longer expiry times as Unix timestamps, 0 as
+            # never and negative ones as already expired.
+            exptime = ttl > 0 and max(int(ttl), 1) or -1
+            if exptime > self.MAX_RELATIVE_TTL: exptime = int(time.time() + ttl)
+        self._call('set %s 0 %d %d' % (self._key(key), exptime, len(data)), data)
+
+    def delete(self, key):
+        self._call('delete %s' % self._key(key))
+
+    def clear(self):
+        self._call('flush_all')
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self._disconnect()
+        finally:
+            self.lock.release()
+
+
+class CacheRequestHandler(SocketServer.StreamRequestHandler):
+    '''The get, set, delete and flush_all commands of memcached's text
+       protocol, answered from the server's MemoryCache.'''
+    def handle(self):
+        store = self.server.store
+        while True:
+            line = self.rfile.readline()
+            if not line: return
+            parts = line.split()
+            if not parts: continue
+            command = parts[0]
+            if command == 'get':
+                for key in parts[1:]:
+                    data = store.get(key)
+                    if data is not None:
+                        self.wfile.write('VALUE %s 0 %d\r\n%s\r\n' % (key, len(data), data))
+                self.wfile.write('END\r\n')
+            elif command == 'set':
+                key, flags, exptime, length = parts[1:5]
+                data = self.rfile.read(int(length) + 2)[:-2]
+                exptime = int(exptime)
+                if exptime > SocketCache.MAX_RELATIVE_TTL: exptime -= time.time()
+                store.set(key, data, exptime or None)
+                self.wfile.write('STORED\r\n')
+            elif command == 'delete':
+                found = store.get(parts[1]) is not None
+                store.delete(parts[1])
+                self.wfile.write(found and 'DELETED\r\n' or 'NOT_FOUND\r\n')
+            elif command == 'flush_all':
+                store.clear()
+                self.wfile.write('OK\r\n')
+            elif command == 'quit':
+                return
+            else:
+                self.wfile.write('ERROR\r\n')
+
+class CacheServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    '''Local stand-in for memcached, for development machines and tests.
+       Pass port=0 to pick a free port.
+
+           server = CacheServer()
+           server.start()
+           shared = SocketCache(*server.server_address)
+       '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, max_bytes=DEFAULT_MAX_BYTES):
+        SocketServer.TCPServer.__init__(self, (host, port), CacheRequestHandler)
+        self.store = MemoryCache(max_bytes, RawSerializer())
+        self.url = 'memcached://%s:%s' % self.server_address
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def open_cache(url, serializer=None):
+    '''Backend described by url:
+
+           memory://?max_bytes=67108864
+           file:///var/cache/basecamp
+           memcached://127.0.0.1:11211
+       '''
+    parts = urlparse.urlsplit(url)
+    if parts.scheme == 'memory':
+        options = dict(urlparse.parse_qsl(parts.query))
+        return MemoryCache(int(options.get('max_bytes', DEFAULT_MAX_BYTES)),
+                           serializer)
+    if parts.scheme == 'file':
+        return FileCache(parts.netloc + parts.path, serializer)
+    if parts.scheme == 'memcached':
+        return SocketCache(parts.hostname or '127.0.0.1', parts.port or 11211,
+                           serializer)
+    raise ValueError("unknown cache backend %r" % url)
@@ -0,0 +1,156 @@
+"""Change detection between two loads of a project.
+
+    stream = ChangeStream()
+    stream.subscribe(notify_chat, types=['created', 'completed'])
+    stream.update(project)          # first load: the baseline
+    ...
+    stream.update(fresh_project)    # calls notify_chat with each ChangeEvent
+
+A ProjectSnapshot keys each collection (messages, comments, milestones,
+todo lists, time entries) by record id and stores a content hash per
+record. Diffing two snapshots is one pass over the ids of each: records
+whose hashes match are skipped without looking at their fields. What is
+left becomes typed events: created, updated, completed (a milestone, todo
+list or todo item that has just been finished) and deleted. Todo items are
+only compared by a ChangeStream given the 'todo_item' kind.
+"""
+
+import hashlib
+import threading
+
+KINDS = ('message', 'comment', 'milestone', 'todo_list', 'time_entry')
+# Todo items cost a request per list, so they are only tracked on request.
+ALL_KINDS = KINDS + ('todo_item',)
+COLLECTIONS = {'message': 'messages', 'comment': 'comments',
+               'milestone': 'milestones', 'todo_list': 'todo_lists',
+               'time_entry': 'time_entries', 'todo_item': 'todo_items'}
+EVENT_TYPES = ('created', 'updated', 'completed', 'deleted')
+
+
+def _canonical(value):
+    if hasattr(value, 'keys'):
+        return '{%s}' % ', '.join(['%r: %s' % (key, _canonical(value[key]))
+                                   for key in sorted(value.keys())])
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join([_canonical(v) for v in value])
+    return repr(value)
+
+def content_hash(record):
+    '''Digest of the fields Basecamp sent for record. Records don't change
+       once parsed, so the digest is kept on the record.'''
+    digest = getattr(record, '_content_hash', None)
+    if digest is None:
+        fields = dict((name, getattr(record, name, None))
+                      for name in getattr(record, '_basecamp_attributes', ()))
+        digest = hashlib.md5(_canonical(fields)).digest()
+        record._content_hash = digest
+    return digest
+
+def is_finished(kind, record):
+    if kind == 'milestone': return bool(getattr(record, 'completed', False))
+    if kind == 'todo_list': return record.is_complete is True
+    if kind == 'todo_item': return bool(getattr(record, 'completed', False))
+    return False
+
+
+class ProjectSnapshot(object):
+    '''Records of one project by kind and id, with their content hashes.'''
+    def __init__(self, project_id, records):
+        self.project_id = project_id
+        self.records = records      # kind -> {id: (hash, record)}
+
+    @classmethod
+    def of(cls, p, kinds=KINDS):
+        records = {}
+        for kind in kinds:
+            collection = getattr(p, COLLECTIONS[kind])
+            if hasattr(collection, 'values'): collection = collection.values()
+            records[kind] = dict((record.id, (content_hash(record), record))
+                                 for record in collection)
+        return cls(p.id, records)
+
+
+class ChangeEvent(object):
+    __slots__ = ('type', 'kind', 'project_id', 'record_id', 'old', 'new')
+
+    def __init__(self, type, kind, project_id, record_id, old, new):
+        self.type = type
+        self.kind = kind
+        self.project_id = project_id
+        self.record_id = record_id
+        self.old = old
+        self.new = new
+
+    def to_dict(self):
+        return dict(type=self.type, kind=self.kind, project_id=self.project_id,
+                    record_id=self.record_id)
+
+    def __repr__(self):
+        return '<ChangeEvent %s %s %s>' % (self.type, self.kind, self.record_id)
+
+
+def diff(old, new):
+    '''Returns the ChangeEvents that turn snapshot old into snapshot new.
+       Kinds missing from either snapshot are not compared.'''
+    events = []
+    for kind in ALL_KINDS:
+        if kind not in old.records or kind not in new.records: continue
+        before, after = old.records[kind], new.records[kind]
+        for record_id, (digest, record) in after.iteritems():
+            previous = before.get(record_id)
+            if previous is None:
+                events.append(ChangeEvent('created', kind, new.project_id,
+                                          record_id, None, record))
+            elif previous[0] != digest:
+                type = 'updated'
+                if is_finished(kind, record) and not is_finished(kind, previous[1]):
+                    type = 'completed'
+                events.append(ChangeEvent(type, kind, new.project_id,
+                                          record_id, previous[1], record))
+        for record_id, (digest, record) in before.iteritems():
+            if record_id not in after:
+                events.append(ChangeEvent('deleted', kind, old.project_id,
+                                          record_id, record, None))
+    return events
+
+
+class ChangeStream(object):
+    '''Keeps the latest snapshot of each project it is given and publishes
+       the differences between successive ones to subscribers.'''
+    def __init__(self, kinds=KINDS):
+        self.kinds = kinds
+        self.snapshots = {}
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback, kinds=None, types=None):
+        '''callback(event) is called for each change of the given kinds and
+           types (by default, all of them).'''
+        self.subscribers.append((callback, kinds and set(kinds), types and set(types)))
+
+    def unsubscribe(self, callback):
+        # Bound methods are made anew on each access, so compare by equality.
+        self.subscribers = [s for s in self.subscribers if s[0] != callback]
+
+    def publish(self, events):
+        for event in events:
+            for callback, kinds, types in self.subscribers:
+                if kinds and event.kind not in kinds: continue
+                if types and event.type not in types: continue
+                callback(event)
+
+    def update(self, p):
+        '''Snapshots p and publishes what changed since the last snapshot of
+           the same project. The first snapshot is only remembered. Returns
+           the events.'''
+        snapshot = ProjectSnapshot.of(p, self.kinds)
+        self.lock.acquire()
+        try:
+            previous = self.snapshots.get(p.id)
+            self.snapshots[p.id] = snapshot
+        finally:
+            self.lock.release()
+        if previous is None: return []
+        events = diff(previous, snapshot)
+        self.publish(events)
+        return events
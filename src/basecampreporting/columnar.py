@@ -0,0 +1,463 @@
+"""Column-oriented export of time entries, to-do items and milestones for
+analysis elsewhere.
+
+    writer = ColumnarWriter('time_entries.bcc', TIME_ENTRIES)
+    export(portfolio.projects, writer, workers=8)
+    writer.close()
+
+    table = ColumnarFile('time_entries.bcc')
+    for chunk in table.chunks():
+        hours = chunk['hours']                  # array('d')
+        people = chunk.values('person_name')    # unicode, None when empty
+
+CsvWriter takes the same records and writes CSV whose header gives each
+column's type ("hours:float"), which read_csv() turns back into values.
+
+Records go straight from Basecamp's XML into one array per column; no
+Project, model object or dictionary per record is built. Every schema has
+a project_id column, filled in by export() where Basecamp leaves it out, so
+one file can hold the records of many projects.
+
+A columnar file is a sequence of chunks of up to chunk_rows records, each
+holding every column's bytes, followed by a JSON footer locating them:
+
+    MAGIC, chunk, chunk, ..., footer, footer length (8 bytes), MAGIC
+
+ColumnarFile maps the file and reads one chunk at a time, so a file with
+millions of records is scanned in little memory. Columns are stored as
+
+    integer    signed machine integers, NULL_INTEGER for none
+    float      doubles, NaN for none
+    boolean    signed bytes, -1 for none
+    date       integer days (date.toordinal())
+    datetime   integer seconds since 1970, in Basecamp's UTC
+    text       UTF-8 bytes and the end offset of each value; empty
+               values read as None, as the parser reads them
+
+in the byte order and integer width of the machine that wrote them, which
+the footer records.
+"""
+
+import array
+import calendar
+import csv
+import datetime
+import mmap
+import struct
+import sys
+from cStringIO import StringIO
+
+from basecampreporting.etree import ET
+from basecampreporting.parser import cast_value
+from basecampreporting.serialization import json
+from basecampreporting.workers import map_unordered
+
+MAGIC = 'BCRCOL1\n'
+DEFAULT_CHUNK_ROWS = 64 * 1024
+BATCH_ROWS = 4096
+INTEGER_CODE = 'l'
+NULL_INTEGER = -2 ** (8 * array.array(INTEGER_CODE).itemsize - 1)
+NAN = float('nan')
+EPOCH = datetime.datetime(1970, 1, 1)
+FIRST_DAY = datetime.date(1900, 1, 1)
+
+
+class Column(object):
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+        self.tag = name.replace('_', '-')
+
+    def __repr__(self):
+        return '<Column %s:%s>' % (self.name, self.type)
+
+class Schema(object):
+    '''The columns taken from each record_tag element of a response.'''
+    def __init__(self, kind, record_tag, columns):
+        self.kind = kind
+        self.record_tag = record_tag
+        self.columns = [Column(name, type) for name, type in columns]
+        self.names = [column.name for column in self.columns]
+
+    def to_dict(self):
+        return dict(kind=self.kind, record_tag=self.record_tag,
+                    columns=[[c.name, c.type] for c in self.columns])
+
+    def from_dict(cls, fields):
+        return cls(fields['kind'], fields['record_tag'],
+                   [tuple(column) for column in fields['columns']])
+    from_dict = classmethod(from_dict)
+
+TIME_ENTRIES = Schema('time_entries', 'time-entry', [
+    ('id', 'integer'), ('project_id', 'integer'), ('person_id', 'integer'),
+    ('person_name', 'text'), ('date', 'date'), ('hours', 'float'),
+    ('todo_item_id', 'integer'), ('description', 'text')])
+
+TODO_ITEMS = Schema('todo_items', 'todo-item', [
+    ('id', 'integer'), ('project_id', 'integer'), ('todo_list_id', 'integer'),
+    ('position', 'integer'), ('content', 'text'), ('completed', 'boolean'),
+    ('completed_on', 'datetime'), ('completer_id', 'integer'),
+    ('created_on', 'datetime'), ('creator_id', 'integer'),
+    ('responsible_party_id', 'integer')])
+
+MILESTONES = Schema('milestones', 'milestone', [
+    ('id', 'integer'), ('project_id', 'integer'), ('title', 'text'),
+    ('deadline', 'date'), ('completed', 'boolean'),
+    ('completed_on', 'datetime'), ('completer_id', 'integer'),
+    ('created_on', 'datetime'), ('creator_id', 'integer'),
+    ('responsible_party_id', 'integer'), ('responsible_party_type', 'text')])
+
+SCHEMAS = dict((schema.kind, schema)
+               for schema in (TIME_ENTRIES, TODO_ITEMS, MILESTONES))
+
+def _documents_time_entries(p):
+    return [p.bc.list_time_entries(p.id, FIRST_DAY, datetime.date.today())]
+
+def _documents_todo_items(p):
+    return [p.bc.todo_list(tdlist.id) for tdlist in p.todo_lists.values()]
+
+def _documents_milestones(p):
+    return [p.bc.list_milestones(p.id)]
+
+# The responses of a Project each kind of record is read from, as the
+# Project's own loaders fetch them.
+SOURCES = {'time_entries': _documents_time_entries,
+           'todo_items': _documents_todo_items,
+           'milestones': _documents_milestones}
+
+
+def iter_records(xml, schema, defaults=None):
+    '''The texts of schema's columns in each record of xml, as lists: None
+       for fields that are missing, nil or empty, unless defaults (values
+       by column name) has one.'''
+    if isinstance(xml, unicode): xml = xml.encode('utf-8')
+    defaults = defaults or {}
+    fill = []
+    for column in schema.columns:
+        value = defaults.get(column.name)
+        if value is not None: value = unicode(value)
+        fill.append((column.tag, value))
+    tag = schema.record_tag
+    for event, node in ET.iterparse(StringIO(str(xml))):
+        if node.tag != tag: continue
+        texts = dict([(child.tag, child.text) for child in node])
+        yield [texts.get(name) or default for name, default in fill]
+        node.clear()
+
+
+# Per type: array typecode, the null value, text -> stored value and
+# stored value -> Python value.
+
+def _encode_boolean(text):
+    return text.strip().lower() in ('1', 'true', 'yes') and 1 or 0
+
+def _encode_date(text):
+    return datetime.date(int(text[0:4]), int(text[5:7]),
+                         int(text[8:10])).toordinal()
+
+def _encode_datetime(text):
+    return calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                            int(text[11:13]), int(text[14:16]),
+                            int(text[17:19])))
+
+def _decode_datetime(value):
+    return EPOCH + datetime.timedelta(seconds=value)
+
+ENCODINGS = {
+    'integer': (INTEGER_CODE, NULL_INTEGER, int, int),
+    'float': ('d', NAN, float, float),
+    'boolean': ('b', -1, _encode_boolean, bool),
+    'date': (INTEGER_CODE, NULL_INTEGER, _encode_date, datetime.date.fromordinal),
+    'datetime': (INTEGER_CODE, NULL_INTEGER, _encode_datetime, _decode_datetime),
+}
+
+def _is_null(value, null):
+    if null != null: return value != value      # NaN
+    return value == null
+
+
+class ColumnBuilder(object):
+    '''Accumulates records as one array (or list of UTF-8 strings, for
+       text) per column. Records are held as texts until batch_rows of
+       them have come in, then encoded a column at a time, which costs far
+       less than a call per field.'''
+    def __init__(self, schema, batch_rows=BATCH_ROWS):
+        self.schema = schema
+        self.batch_rows = batch_rows
+        self.reset()
+
+    def reset(self):
+        self.rows = 0
+        self.pending = []
+        self.columns = []
+        for column in self.schema.columns:
+            if column.type == 'text':
+                self.columns.append([])
+            else:
+                self.columns.append(array.array(ENCODINGS[column.type][0]))
+
+    def append(self, texts):
+        self.pending.append(texts)
+        self.rows += 1
+        if len(self.pending) >= self.batch_rows: self.encode()
+
+    def encode(self):
+        if not self.pending: return
+        batch = zip(*self.pending)
+        self.pending = []
+        for column, values, texts in zip(self.schema.columns, self.columns,
+                                         batch):
+            if column.type == 'text':
+                values.extend([text is not None and text.strip().encode('utf-8')
+                               or '' for text in texts])
+                continue
+            typecode, null, encode, decode = ENCODINGS[column.type]
+            if None in texts:
+                # Every null is true, so and/or picks it.
+                values.extend([text is None and null or encode(text)
+                               for text in texts])
+            else:
+                values.extend(map(encode, texts))
+
+    def blocks(self):
+        '''(name, [bytes, ...]) for each column, as they are stored.'''
+        self.encode()
+        for column, values in zip(self.schema.columns, self.columns):
+            if column.type == 'text':
+                offsets = array.array(INTEGER_CODE)
+                end = 0
+                for value in values:
+                    end += len(value)
+                    offsets.append(end)
+                yield column.name, [offsets.tostring(), ''.join(values)]
+            else:
+                yield column.name, [values.tostring()]
+
+
+class TextColumn(object):
+    '''Text values read from a chunk: end offsets into UTF-8 data.'''
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0: index += len(self.offsets)
+        start = index and self.offsets[index - 1] or 0
+        end = self.offsets[index]
+        if start == end: return None
+        return self.data[start:end].decode('utf-8')
+
+    def __iter__(self):
+        for index in xrange(len(self.offsets)):
+            yield self[index]
+
+
+class Chunk(object):
+    '''Up to chunk_rows records of a ColumnarFile. chunk[name] is the
+       column as stored (an array, or a TextColumn); values(name) the
+       Python values, with None for nulls.'''
+    def __init__(self, schema, rows, columns):
+        self.schema = schema
+        self.rows = rows
+        self.columns = columns
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def values(self, name):
+        column = self.schema.columns[self.schema.names.index(name)]
+        stored = self.columns[name]
+        if column.type == 'text': return list(stored)
+        typecode, null, encode, decode = ENCODINGS[column.type]
+        values = []
+        for value in stored:
+            if _is_null(value, null): values.append(None)
+            else: values.append(decode(value))
+        return values
+
+    def records(self):
+        '''A dictionary per record, as parse_basecamp_xml would give (less
+           the fields outside the schema).'''
+        columns = [self.values(name) for name in self.schema.names]
+        for values in zip(*columns):
+            yield dict(zip(self.schema.names, values))
+
+
+class ColumnarWriter(object):
+    '''Writes records of schema to path in chunks of chunk_rows.'''
+    def __init__(self, path, schema, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.path = path
+        self.schema = schema
+        self.chunk_rows = chunk_rows
+        self.builder = ColumnBuilder(schema)
+        self.chunks = []
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.offset = len(MAGIC)
+
+    def add(self, xml, defaults=None):
+        '''Appends the records in the response xml; defaults gives values
+           by column name for fields the records leave out.'''
+        builder = self.builder
+        for texts in iter_records(xml, self.schema, defaults):
+            builder.append(texts)
+            self.rows += 1
+            if builder.rows >= self.chunk_rows: self.flush()
+
+    def flush(self):
+        '''Writes the records added so far as a chunk.'''
+        if not self.builder.rows: return
+        columns = {}
+        for name, blocks in self.builder.blocks():
+            spans = []
+            for block in blocks:
+                spans.append((self.offset, len(block)))
+                # Keep every block aligned for the arrays read from it.
+                padding = -len(block) % 8
+                self.file.write(block + '\0' * padding)
+                self.offset += len(block) + padding
+            columns[name] = spans
+        self.chunks.append(dict(rows=self.builder.rows, columns=columns))
+        self.builder.reset()
+
+    def close(self):
+        self.flush()
+        footer = json.dumps(dict(
+            schema=self.schema.to_dict(), rows=self.rows, chunks=self.chunks,
+            byteorder=sys.byteorder,
+            integer_size=array.array(INTEGER_CODE).itemsize))
+        self.file.write(footer + struct.pack('<Q', len(footer)) + MAGIC)
+        self.file.close()
+
+
+class ColumnarFile(object):
+    '''A file written by ColumnarWriter, mapped into memory.'''
+    def __init__(self, path):
+        self.path = path
+        f = open(path, 'rb')
+        try:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        size = len(self.mapping)
+        trailer = len(MAGIC) + 8
+        if (self.mapping[:len(MAGIC)] != MAGIC
+            or self.mapping[size - len(MAGIC):] != MAGIC):
+            raise ValueError("%s is not a columnar export" % path)
+        length = struct.unpack('<Q', self.mapping[size - trailer:size - len(MAGIC)])[0]
+        footer = json.loads(self.mapping[size - trailer - length:size - trailer])
+        if footer['integer_size'] != array.array(INTEGER_CODE).itemsize:
+            raise ValueError("%s was written with %s byte integers"
+                             % (path, footer['integer_size']))
+        self.swap = footer['byteorder'] != sys.byteorder
+        self.schema = Schema.from_dict(footer['schema'])
+        self.rows = footer['rows']
+        self.index = footer['chunks']
+
+    def __len__(self):
+        return self.rows
+
+    def _array(self, typecode, span):
+        values = array.array(typecode)
+        offset, length = span
+        values.fromstring(self.mapping[offset:offset + length])
+        if self.swap: values.byteswap()
+        return values
+
+    def chunk(self, number):
+        entry = self.index[number]
+        columns = {}
+        for column in self.schema.columns:
+            spans = entry['columns'][column.name]
+            if column.type == 'text':
+                offset, length = spans[1]
+                columns[column.name] = TextColumn(
+                    self._array(INTEGER_CODE, spans[0]),
+                    buffer(self.mapping, offset, length))
+            else:
+                columns[column.name] = self._array(
+                    ENCODINGS[column.type][0], spans[0])
+        return Chunk(self.schema, entry['rows'], columns)
+
+    def chunks(self):
+        for number in xrange(len(self.index)):
+            yield self.chunk(number)
+
+    def column(self, name):
+        '''The whole of one column, as stored; text columns as a list.'''
+        column = self.schema.columns[self.schema.names.index(name)]
+        if column.type == 'text':
+            values = []
+            for chunk in self.chunks(): values.extend(chunk[name])
+            return values
+        values = array.array(ENCODINGS[column.type][0])
+        for entry in self.index:
+            values.extend(self._array(values.typecode,
+                                      entry['columns'][name][0]))
+        return values
+
+    def records(self):
+        for chunk in self.chunks():
+            for record in chunk.records():
+                yield record
+
+    def close(self):
+        self.mapping.close()
+
+
+class CsvWriter(object):
+    '''Writes records of schema as CSV to a file object. The header names
+       each column as name:type; values are written as Basecamp gives
+       them, and missing ones left empty.'''
+    def __init__(self, out, schema):
+        self.schema = schema
+        self.writer = csv.writer(out)
+        self.writer.writerow(['%s:%s' % (c.name, c.type) for c in schema.columns])
+        self.rows = 0
+
+    def add(self, xml, defaults=None):
+        for texts in iter_records(xml, self.schema, defaults):
+            self.writer.writerow([text is not None
+                                  and text.strip().encode('utf-8') or ''
+                                  for text in texts])
+            self.rows += 1
+
+    def close(self):
+        pass
+
+def read_csv(source):
+    '''Yields a dictionary of typed values per row of a CSV file object
+       written by CsvWriter.'''
+    reader = csv.reader(source)
+    columns = [field.split(':', 1) for field in reader.next()]
+    for row in reader:
+        record = {}
+        for (name, type), text in zip(columns, row):
+            if not text:
+                record[name] = None
+            elif type == 'text':
+                record[name] = text.decode('utf-8')
+            else:
+                record[name] = cast_value(text, type)
+        yield record
+
+
+def export(projects, writer, workers=1):
+    '''Adds the records of writer's kind from each of projects to writer,
+       fetching the responses for up to `workers` projects at once; the
+       projects' records go in as their responses arrive. Returns the
+       number of records written.'''
+    fetch = SOURCES[writer.schema.kind]
+    for p, documents, exc_info in map_unordered(fetch, projects, workers):
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        for xml in documents:
+            writer.add(xml, {'project_id': p.id})
+    return writer.rows
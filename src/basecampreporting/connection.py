@@ -0,0 +1,116 @@
+"""Keep-alive HTTP connection pool shared between Basecamp clients and
+worker threads.
+
+urllib2 opens a new connection (and, for https accounts, a new TLS session)
+for every request. A ConnectionPool keeps finished connections open and
+hands them to the next request for the same host:
+
+    pool = ConnectionPool(maxsize=16)
+    bc = Basecamp(url, username, password, pool=pool)
+"""
+
+import httplib
+import socket
+import threading
+import time
+import urlparse
+import urllib2
+from StringIO import StringIO
+
+from basecampreporting.scheduler import request_kind, READ
+
+
+class ConnectionPool(object):
+    '''Thread-safe pool of persistent httplib connections, keyed by host.
+       At most maxsize idle connections are kept per host; busy connections
+       are not limited here (the callers' worker counts bound them).'''
+    def __init__(self, maxsize=10, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.idle = {}
+
+    def _key(self, url):
+        parts = urlparse.urlsplit(url)
+        port = parts.port or (parts.scheme == 'https' and 443 or 80)
+        return parts.scheme, parts.hostname, port
+
+    def _get(self, key, timeout):
+        self.lock.acquire()
+        try:
+            idle = self.idle.get(key)
+            if idle:
+                return idle.pop(), True
+        finally:
+            self.lock.release()
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = httplib.HTTPSConnection(host, port, timeout=timeout)
+        else:
+            conn = httplib.HTTPConnection(host, port, timeout=timeout)
+        return conn, False
+
+    def _put(self, key, conn):
+        self.lock.acquire()
+        try:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        finally:
+            self.lock.release()
+        conn.close()
+
+    def request(self, url, data=None, headers=(), event=None, timeout=None):
+        '''Performs a request and returns the response body. data, when
+           given, is POSTed. Error statuses raise urllib2.HTTPError, like
+           urllib2 would.'''
+        key = self._key(url)
+        parts = urlparse.urlsplit(url)
+        target = parts.path or '/'
+        if parts.query: target += '?' + parts.query
+        method = data is not None and 'POST' or 'GET'
+        if timeout is None: timeout = self.timeout
+
+        while True:
+            conn, reused = self._get(key, timeout)
+            if timeout is not None and conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            sent = False
+            try:
+                conn.request(method, target, data, dict(headers))
+                sent = True
+                response = conn.getresponse()
+                if event is not None:
+                    event.ttfb = time.time() - event.started
+                    event.status = response.status
+                body = response.read()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                # A kept-alive connection may have been closed by the server
+                # while idle; retry on a fresh one. A write that went out may
+                # have been applied, so it is only retried if it never did.
+                if reused and (not sent or request_kind(parts.path) == READ):
+                    continue
+                raise
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._put(key, conn)
+
+        if response.status >= 400:
+            raise urllib2.HTTPError(url, response.status, response.reason,
+                                    response.msg, StringIO(body))
+        return body
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            for idle in self.idle.values():
+                for conn in idle:
+                    conn.close()
+            self.idle = {}
+        finally:
+            self.lock.release()
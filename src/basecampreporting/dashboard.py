@@ -0,0 +1,141 @@
+"""Status board for many projects at once, built on sample.project_status.
+
+    basecamp-dashboard -u USER -p PASS https://example.basecamphq.com all
+    basecamp-dashboard -u USER -p PASS -f ndjson URL 2849305 2849306
+
+Projects are fetched on a bounded pool of worker threads that share one
+Basecamp client, one keep-alive connection pool and one people cache, so
+the board for hundreds of projects costs roughly
+(requests per project * projects / workers) round trips.
+"""
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+from basecampreporting.etree import ET
+from basecampreporting.serialization import json, BasecampObjectEncoder
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.cache import open_cache, DEFAULT_TTL
+from basecampreporting.connection import ConnectionPool
+from basecampreporting.deadlines import DEFAULT_TIMEOUT
+from basecampreporting.hedging import Hedger
+from basecampreporting.parser import Interner
+from basecampreporting.project import Project
+from basecampreporting.workers import map_unordered
+from basecampreporting.sample import project_status, format_status
+from basecampreporting import tracing
+
+DEFAULT_WORKERS = 16
+FORMATS = ('text', 'json', 'ndjson')
+
+
+def account_project_ids(bc, statuses=None):
+    '''Ids of every project in the account, optionally limited to the given
+       statuses (active, on_hold, archived).'''
+    ids = []
+    for node in ET.fromstring(bc.projects()).findall('project'):
+        if statuses and node.findtext('status') not in statuses: continue
+        ids.append(int(node.findtext('id')))
+    return ids
+
+def collect(url, project_ids, bc, workers=DEFAULT_WORKERS, people_cache=None,
+            deadline=None):
+    '''Yields a result dictionary per project as soon as it is ready, with
+       the project_status under "status" (or the failure under "error") and
+       the seconds it took under "elapsed". deadline bounds each of the
+       projects' collection loads.'''
+    if people_cache is None: people_cache = {}
+    interner = Interner()
+
+    def fetch(project_id):
+        started = time.time()
+        p = Project(url, project_id, None, None, basecamp=bc,
+                    people_cache=people_cache, interner=interner,
+                    deadline=deadline)
+        status = project_status(p)
+        return status, time.time() - started
+
+    for project_id, result, exc_info in map_unordered(fetch, project_ids, workers):
+        if exc_info:
+            yield dict(id=project_id, status=None, elapsed=None,
+                       error="%s: %s" % (exc_info[0].__name__, exc_info[1]))
+        else:
+            status, elapsed = result
+            yield dict(id=project_id, status=status, elapsed=elapsed, error=None)
+
+def render_text(result):
+    if result['error']:
+        return ["Project %s: %s" % (result['id'], result['error']), ""]
+    lines = format_status(result['status'])
+    lines[0] = "%s (%.2fs)" % (lines[0], result['elapsed'])
+    return lines
+
+def dumps(value, **kwargs):
+    return json.dumps(value, cls=BasecampObjectEncoder, **kwargs)
+
+
+def main(argv=None, out=None):
+    out = out or sys.stdout
+    tracing.enable_from_environment()
+    parser = OptionParser(usage="%prog [options] ACCOUNT_URL (all | PROJECT_ID...)")
+    parser.add_option("-u", "--username", default=os.environ.get('BASECAMP_USERNAME'))
+    parser.add_option("-p", "--password", default=os.environ.get('BASECAMP_PASSWORD'))
+    parser.add_option("-w", "--workers", type="int", default=DEFAULT_WORKERS,
+                      help="concurrent projects [%default]")
+    parser.add_option("-f", "--format", choices=FORMATS, default='text',
+                      help="one of %s [%%default]" % ', '.join(FORMATS))
+    parser.add_option("--status", action="append", dest="statuses",
+                      help="with 'all', only include projects with this status (repeatable)")
+    parser.add_option("--cache", metavar="URL",
+                      help="share responses through memory://, file:///DIR or memcached://HOST:PORT")
+    parser.add_option("--cache-ttl", type="float", default=DEFAULT_TTL,
+                      help="seconds a cached response is used for [%default]")
+    parser.add_option("--timeout", type="float", default=DEFAULT_TIMEOUT,
+                      help="seconds to wait on the network at a time [%default]")
+    parser.add_option("--deadline", type="float",
+                      help="seconds each collection may take to load, after which the last cached copy is used")
+    parser.add_option("--hedge", type="float", metavar="PERCENTILE",
+                      help="resend reads slower than this percentile of recent ones, e.g. 0.95")
+    options, args = parser.parse_args(argv)
+    if len(args) < 2:
+        parser.error("an account URL and at least one project id (or 'all') are required")
+
+    url = args[0]
+    pool = ConnectionPool(maxsize=options.workers)
+    cache = options.cache and open_cache(options.cache) or None
+    hedger = options.hedge and Hedger(options.hedge) or None
+    bc = Basecamp(url, options.username, options.password, pool=pool,
+                  cache=cache, cache_ttl=options.cache_ttl,
+                  timeout=options.timeout, hedger=hedger)
+    if args[1:] == ['all']:
+        project_ids = account_project_ids(bc, options.statuses)
+    else:
+        project_ids = [int(i) for i in args[1:]]
+
+    started = time.time()
+    results = collect(url, project_ids, bc, options.workers,
+                      deadline=options.deadline)
+    failed = 0
+    if options.format == 'ndjson':
+        for result in results:
+            if result['error']: failed += 1
+            out.write(dumps(result) + '\n')
+            out.flush()
+    else:
+        order = dict((project_id, i) for i, project_id in enumerate(project_ids))
+        results = sorted(results, key=lambda r: order[r['id']])
+        failed = len([r for r in results if r['error']])
+        if options.format == 'json':
+            out.write(dumps(dict(projects=results, elapsed=time.time() - started),
+                            indent=2) + '\n')
+        else:
+            for result in results:
+                out.write('\n'.join(render_text(result)) + '\n')
+            out.write("%s projects in %.2fs\n" % (len(results), time.time() - started))
+    pool.close()
+    return failed and 1 or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
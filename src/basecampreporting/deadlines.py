@@ -0,0 +1,83 @@
+"""Deadlines for Basecamp calls and the work built on them.
+
+A deadline bounds how long a call may take as a whole, retries and queueing
+included, where a socket timeout only bounds each wait for the network:
+
+    xml = within(2.0, bc.message_archive, project_id)
+
+within() makes the deadline current for the thread while the function
+runs. Every request made meanwhile caps its socket timeout at the time
+remaining, the scheduler won't start a retry it can't finish in time, and
+when the time runs out the call raises DeadlineExceeded. Nested deadlines
+can only shorten the one already in force.
+
+Project(deadline=seconds) runs each collection load under its own
+deadline. A read that runs out of time is answered from the last copy
+Basecamp's response cache or the Project holds, when there is one, so a
+page renders on time from slightly old data rather than not at all. The
+Project doesn't keep that copy, so the next use tries a fresh load.
+"""
+
+import threading
+import time
+
+# Seconds a Basecamp instance waits on the network at a time.
+DEFAULT_TIMEOUT = 60.0
+
+
+class DeadlineExceeded(Exception):
+    '''The deadline ran out before the call finished.'''
+
+
+class Deadline(object):
+    def __init__(self, seconds, now=None):
+        self.seconds = seconds
+        self.expires = (now or time.time()) + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.time())
+
+    def expired(self):
+        return time.time() >= self.expires
+
+    def check(self, what='call'):
+        '''Raises DeadlineExceeded if the deadline has passed.'''
+        if self.expired():
+            raise DeadlineExceeded("%s exceeded its %.3gs deadline"
+                                   % (what, self.seconds))
+
+    def timeout(self, timeout=None):
+        '''The socket timeout to use now: timeout, but no longer than the
+           time remaining.'''
+        remaining = self.remaining()
+        if timeout is None or remaining < timeout: return remaining
+        return timeout
+
+    def __repr__(self):
+        return '<Deadline %.3gs, %.3gs left>' % (self.seconds, self.remaining())
+
+
+_local = threading.local()
+
+def current():
+    '''The deadline in force in this thread, or None.'''
+    return getattr(_local, 'deadline', None)
+
+def call(deadline, func, *args, **kwargs):
+    '''func(*args, **kwargs) with deadline in force in this thread (unless
+       an earlier one already is). deadline may be None.'''
+    previous = current()
+    if deadline is None or (previous is not None
+                            and previous.expires <= deadline.expires):
+        deadline = previous
+    _local.deadline = deadline
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _local.deadline = previous
+
+def within(seconds, func, *args, **kwargs):
+    '''func(*args, **kwargs), failing with DeadlineExceeded after seconds.
+       seconds may be None for no deadline.'''
+    if seconds is None: return call(None, func, *args, **kwargs)
+    return call(Deadline(seconds), func, *args, **kwargs)
@@ -0,0 +1,99 @@
+"""Parsing Basecamp XML on a pool of worker processes.
+
+Turning a response into records (ET.fromstring, then parse_basecamp_xml for
+each element) is pure Python and holds the GIL, so when a Portfolio loads a
+whole account its threads overlap the network waits but all parse on one
+core. A DecodePool hands each large response to one of several processes:
+
+    decoder = DecodePool(processes=4)
+    portfolio = Portfolio(url, username, password, decoder=decoder)
+    portfolio.load()
+    decoder.close()
+
+A worker parses the XML and sends back compact rows: each distinct tuple of
+field names once, then a tuple of values per record, which pickles and
+unpickles much faster than a dictionary per record. The parent zips the rows
+back into dictionaries, interns them with the project's Interner, and builds
+the models from them just as it would from elements.
+
+Responses smaller than min_bytes are parsed in the calling thread, since
+for them the trip to another process costs more than the parse.
+"""
+
+import multiprocessing
+import threading
+
+from basecampreporting.etree import ET
+from basecampreporting.parser import parse_basecamp_xml
+
+DEFAULT_MIN_BYTES = 32 * 1024
+
+
+def decode_records(xml, path):
+    '''Parses the elements at path in xml into (fields, rows): a list of
+       field name tuples and, per record, (index into fields, values).'''
+    fields, positions, rows = [], {}, []
+    for node in ET.select(xml, path):
+        record = parse_basecamp_xml(node)
+        names = tuple(sorted(record))
+        position = positions.get(names)
+        if position is None:
+            position = positions[names] = len(fields)
+            fields.append(names)
+        rows.append((position, tuple([record[name] for name in names])))
+    return fields, rows
+
+def rebuild_records(fields, rows):
+    return [dict(zip(fields[position], values)) for position, values in rows]
+
+
+class DecodePool(object):
+    '''Parses responses into record dictionaries on `processes` worker
+       processes (one per core by default). Safe to share between threads.'''
+    def __init__(self, processes=None, min_bytes=DEFAULT_MIN_BYTES):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.min_bytes = min_bytes
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        '''Starts the worker processes, if they aren't running yet. They are
+           otherwise started by the first large response; starting them
+           before any threads exist is safer, as forking copies whatever
+           locks other threads hold.'''
+        self.lock.acquire()
+        try:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.processes)
+            return self.pool
+        finally:
+            self.lock.release()
+
+    def records(self, xml, path):
+        '''Dictionaries of the fields of the elements at path in xml.'''
+        return self.records_each([xml], path)[0]
+
+    def records_each(self, documents, path):
+        '''records() for several documents, decoded in parallel.'''
+        pending = []
+        for xml in documents:
+            if len(xml) < self.min_bytes:
+                pending.append(decode_records(xml, path))
+            else:
+                # Buffers (from an archive.ArchivedBasecamp) can't be pickled.
+                pending.append(self.start().apply_async(decode_records, (str(xml), path)))
+        results = []
+        for decoded in pending:
+            if not isinstance(decoded, tuple): decoded = decoded.get()
+            results.append(rebuild_records(*decoded))
+        return results
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+        finally:
+            self.lock.release()
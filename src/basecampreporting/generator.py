@@ -0,0 +1,544 @@
+"""Seeded generator of synthetic Basecamp accounts, used to benchmark the
+parser, the models and the serializer at realistic scale.
+
+The generated responses use the same shape as the recorded fixtures that
+TestBasecamp replays ({'GET': {path: xml}, 'POST': {path: {body: xml}}}), so
+they can be handed straight to TestBasecamp.load_test_responses, written to
+disk for TestProject, or served over HTTP by mocks.FixtureServer.
+
+    gen = AccountGenerator(seed=1, projects=3, messages=10000)
+    responses = gen.responses()
+
+Every project and every section of a project is seeded independently, so a
+given (seed, project, section) always produces the same XML regardless of
+the other sizes requested.
+"""
+
+import datetime
+import hashlib
+import random
+import sys
+from optparse import OptionParser
+from xml.sax.saxutils import escape
+
+from basecampreporting.etree import ET
+from basecampreporting.basecamp import RequestRecorder
+from basecampreporting.serialization import json
+from basecampreporting.paging import RECENT_MESSAGES, TIME_ENTRIES_PER_PAGE
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+PROJECT_BASE = 2000000
+COMPANY_BASE = 1000000
+PERSON_BASE = 3000000
+MESSAGE_BASE = 10000000
+COMMENT_BASE = 20000000
+MILESTONE_BASE = 8000000
+TODO_LIST_BASE = 5000000
+TODO_ITEM_BASE = 30000000
+TIME_ENTRY_BASE = 40000000
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'Dave', 'Erin', 'Frank', 'Grace',
+               'Heidi', 'Ivan', 'Judy', 'Mallory', 'Niaj', 'Olivia', 'Peggy',
+               'Rupert', 'Sybil', 'Trent', 'Victor', 'Walter', 'Zelda']
+LAST_NAMES = ['Anderson', 'Brown', 'Clark', 'Davis', 'Evans', 'Foster',
+              'Garcia', 'Harris', 'Irwin', 'Jones', 'King', 'Lopez']
+CATEGORIES = ['Assets', 'Design', 'Development', 'Meetings', 'Releases',
+              'Support']
+WORDS = ['login', 'report', 'sprint', 'dashboard', 'export', 'search',
+         'widget', 'layout', 'api', 'cache', 'deploy', 'review', 'invoice',
+         'mockup', 'copy', 'bug', 'feature', 'page', 'feed', 'import']
+STATUSES = ['active', 'active', 'active', 'on_hold', 'archived']
+
+PRESETS = {
+    'small': dict(projects=1, messages=25, time_entries=100),
+    'medium': dict(projects=1, messages=1000, time_entries=10000),
+    'large': dict(projects=1, messages=10000, time_entries=1000000),
+    'account': dict(projects=3000, messages=10, comments=2, milestones=6,
+                    sprints=3, todo_items=4, time_entries=20),
+}
+
+
+class AccountGenerator(object):
+    '''Generates the XML responses for a synthetic Basecamp account.'''
+    def __init__(self, seed=0, projects=1, people=12, messages=25,
+                 comments=3, milestones=12, sprints=6, backlogs=2,
+                 todo_items=8, time_entries=100, today=None):
+        self.seed = seed
+        self.projects = projects
+        self.people = people
+        self.messages = messages
+        self.comments = comments
+        self.milestones = milestones
+        self.sprints = sprints
+        self.backlogs = backlogs
+        self.todo_items = todo_items
+        self.time_entries = time_entries
+        self.today = today or datetime.date.today()
+        # Generated fixtures are keyed exactly like the ones TestBasecamp
+        # records.
+        self.recorder = RequestRecorder('http://generator')
+
+    # ---------------------------------------------------------------- #
+    # Identifiers
+
+    def project_id(self, index):
+        return PROJECT_BASE + index
+
+    def project_ids(self):
+        return [self.project_id(i) for i in xrange(self.projects)]
+
+    def person_id(self, n):
+        return PERSON_BASE + n
+
+    def message_id(self, index, n):
+        return MESSAGE_BASE + index * self.messages + n
+
+    def comment_id(self, index, message_n, n):
+        return COMMENT_BASE + (index * self.messages + message_n) * self.comments + n
+
+    def category_id(self, index, category):
+        return 28600000 + index * 10 + category
+
+    def milestone_id(self, index, n):
+        return MILESTONE_BASE + index * self.milestones + n
+
+    def todo_list_id(self, index, n):
+        return TODO_LIST_BASE + index * self.todo_list_count + n
+
+    def todo_item_id(self, index, list_n, n):
+        return TODO_ITEM_BASE + (index * self.todo_list_count + list_n) * self.todo_items + n
+
+    def time_entry_id(self, index, n):
+        return TIME_ENTRY_BASE + index * self.time_entries + n
+
+    @property
+    def todo_list_count(self):
+        return self.sprints + self.backlogs
+
+    def _random(self, index, section):
+        digest = hashlib.md5('%s:%s:%s' % (self.seed, index, section)).hexdigest()
+        return random.Random(int(digest[:12], 16))
+
+    # ---------------------------------------------------------------- #
+    # Requests
+
+    def requests(self):
+        '''Yields (path, body, chunks) for every request the account answers.
+           body is None for requests TestBasecamp files under GET, and
+           chunks is a callable returning an iterator of XML fragments.'''
+        rec = self.recorder
+        yield self._keyed(rec.projects(), self.project_list_xml)
+        for n in xrange(self.people):
+            yield self._keyed(rec.person(self.person_id(n)),
+                              self._bind(self.person_xml, n))
+        for index in xrange(self.projects):
+            pid = self.project_id(index)
+            yield self._keyed(('/projects/%s.xml' % pid, None),
+                              self._bind(self.project_xml, index))
+            yield self._keyed(rec.people_within_project(pid),
+                              self._bind(self.people_xml, index))
+            yield self._keyed(rec.message_archive(pid),
+                              self._bind(self.message_archive_xml, index))
+            yield self._keyed(rec.recent_messages(pid),
+                              self._bind(self.message_archive_xml, index, None,
+                                         RECENT_MESSAGES))
+            for category in xrange(len(CATEGORIES)):
+                yield self._keyed(rec.message_archive(pid, self.category_id(index, category)),
+                                  self._bind(self.message_archive_xml, index, category))
+            for n in xrange(self.messages):
+                yield self._keyed(rec.comments(self.message_id(index, n)),
+                                  self._bind(self.comments_xml, index, n))
+            yield self._keyed(rec.list_milestones(pid),
+                              self._bind(self.milestones_xml, index))
+            for find in ('late', 'upcoming', 'completed'):
+                yield self._keyed(rec.list_milestones(pid, find),
+                                  self._bind(self.milestones_xml, index, find))
+            yield self._keyed(rec.todo_lists(pid),
+                              self._bind(self.todo_lists_xml, index))
+            for complete in (True, False):
+                yield self._keyed(rec.todo_lists(pid, complete),
+                                  self._bind(self.todo_lists_xml, index, complete))
+            for n in xrange(self.todo_list_count):
+                yield self._keyed(rec.todo_list(self.todo_list_id(index, n)),
+                                  self._bind(self.todo_list_xml, index, n))
+            yield self._keyed(rec.list_time_entries(pid, datetime.date(1900, 1, 1), self.today),
+                              self._bind(self.time_entries_xml, index))
+            # Each page is generated in turn as its response is asked for,
+            # which responses() and write_json() do in this order.
+            pages = self.time_entry_pages(index)
+            for page in xrange(1, self.time_entries // TIME_ENTRIES_PER_PAGE + 2):
+                yield self._keyed(rec.time_entries_page(pid, page),
+                                  lambda pages=pages: [pages.next()])
+
+    def _keyed(self, request, chunks):
+        path, data = request
+        # TestBasecamp files bodyless requests (including empty <request/>
+        # elements, which are falsy) under GET.
+        if data:
+            data = ET.tostring(data)
+        else:
+            data = None
+        return path, data, chunks
+
+    def _bind(self, method, *args):
+        return lambda: method(*args)
+
+    def responses(self):
+        '''Returns every response as a TestBasecamp fixture dictionary.'''
+        responses = {'GET': {}, 'POST': {}}
+        for path, data, chunks in self.requests():
+            xml = ''.join(chunks())
+            if data is None:
+                responses['GET'][path] = xml
+            else:
+                responses['POST'].setdefault(path, {})[data] = xml
+        return responses
+
+    def write_json(self, fileobj):
+        '''Streams the fixture dictionary to fileobj as JSON without holding
+           any response in memory, so very large accounts can be written.'''
+        gets, posts = [], {}
+        for path, data, chunks in self.requests():
+            if data is None: gets.append((path, chunks))
+            else: posts.setdefault(path, []).append((data, chunks))
+
+        fileobj.write('{\n"GET": {')
+        for i, (path, chunks) in enumerate(gets):
+            if i: fileobj.write(',')
+            fileobj.write('\n%s: ' % json.dumps(path))
+            self._write_string(fileobj, chunks())
+        fileobj.write('\n},\n"POST": {')
+        for i, (path, bodies) in enumerate(posts.items()):
+            if i: fileobj.write(',')
+            fileobj.write('\n%s: {' % json.dumps(path))
+            for j, (data, chunks) in enumerate(bodies):
+                if j: fileobj.write(',')
+                fileobj.write('\n%s: ' % json.dumps(data))
+                self._write_string(fileobj, chunks())
+            fileobj.write('}')
+        fileobj.write('\n}\n}\n')
+
+    def _write_string(self, fileobj, chunks):
+        fileobj.write('"')
+        for chunk in chunks:
+            fileobj.write(json.dumps(chunk)[1:-1])
+        fileobj.write('"')
+
+    # ---------------------------------------------------------------- #
+    # XML
+
+    def project_list_xml(self):
+        yield XML_HEADER + '<projects type="array">\n'
+        for index in xrange(self.projects):
+            yield self._project_node(index, '  ')
+        yield '</projects>\n'
+
+    def project_xml(self, index):
+        yield XML_HEADER + self._project_node(index, '')
+
+    def _project_node(self, index, indent):
+        rand = self._random(index, 'project')
+        created = self.today - datetime.timedelta(days=rand.randint(60, 900))
+        changed = self._datetime(self.today - datetime.timedelta(days=rand.randint(0, 30)), rand)
+        company = rand.randint(0, 9)
+        return ''.join([
+            indent, '<project>\n',
+            indent, '  <created-on type="date">%s</created-on>\n' % created.isoformat(),
+            indent, '  <id type="integer">%s</id>\n' % self.project_id(index),
+            indent, '  <last-changed-on type="datetime">%s</last-changed-on>\n' % changed,
+            indent, '  <name>%s</name>\n' % escape('Project %s %s' % (index, rand.choice(WORDS).title())),
+            indent, '  <status>%s</status>\n' % rand.choice(STATUSES),
+            indent, '  <company>\n',
+            indent, '    <id type="integer">%s</id>\n' % (COMPANY_BASE + company),
+            indent, '    <name>Company %s</name>\n' % company,
+            indent, '  </company>\n',
+            indent, '</project>\n'])
+
+    def person_xml(self, n):
+        yield XML_HEADER + self._person_node(n, '')
+
+    def people_xml(self, index):
+        rand = self._random(index, 'people')
+        members = sorted(rand.sample(xrange(self.people), min(self.people, 8)))
+        yield XML_HEADER + '<people type="array">\n'
+        for n in members:
+            yield self._person_node(n, '  ')
+        yield '</people>\n'
+
+    def _person_node(self, n, indent):
+        first = FIRST_NAMES[n % len(FIRST_NAMES)]
+        last = LAST_NAMES[(n // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        return ''.join([
+            indent, '<person>\n',
+            indent, '  <administrator type="boolean">%s</administrator>\n' % str(n == 0).lower(),
+            indent, '  <client-id type="integer">0</client-id>\n',
+            indent, '  <deleted type="boolean">false</deleted>\n',
+            indent, '  <id type="integer">%s</id>\n' % self.person_id(n),
+            indent, '  <title>Developer</title>\n',
+            indent, '  <first-name>%s</first-name>\n' % first,
+            indent, '  <last-name>%s</last-name>\n' % last,
+            indent, '  <user-name>%s%s</user-name>\n' % (first.lower(), n),
+            indent, '  <email-address>%s%s@example.com</email-address>\n' % (first.lower(), n),
+            indent, '</person>\n'])
+
+    def message_archive_xml(self, index, category_filter=None, limit=None):
+        '''Message summaries, newest first like the Basecamp archive,
+           optionally only those in one category, or only the first limit
+           of them (as the recent messages).'''
+        rand = self._random(index, 'messages')
+        posted = datetime.datetime.combine(self.today, datetime.time(17, 0))
+        yield XML_HEADER + '<posts type="array">\n'
+        for n in xrange(self.messages):
+            posted -= datetime.timedelta(seconds=rand.randint(600, 86400))
+            category = rand.randint(0, len(CATEGORIES) - 1)
+            author = rand.randint(0, self.people - 1)
+            post = ''.join([
+                '  <post>\n',
+                '    <attachments-count type="integer">%s</attachments-count>\n' % rand.choice((0, 0, 0, 1, 2)),
+                '    <author-id type="integer">%s</author-id>\n' % self.person_id(author),
+                '    <author-name>%s</author-name>\n' % FIRST_NAMES[author % len(FIRST_NAMES)],
+                '    <id type="integer">%s</id>\n' % self.message_id(index, n),
+                '    <posted-on type="datetime">%s</posted-on>\n' % posted.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                '    <title>%s</title>\n' % escape(self._sentence(rand, 4)),
+                '    <category>\n',
+                '      <id type="integer">%s</id>\n' % self.category_id(index, category),
+                '      <name>%s</name>\n' % CATEGORIES[category],
+                '      <type>PostCategory</type>\n',
+                '    </category>\n',
+                '  </post>\n'])
+            if limit is not None and n >= limit: break
+            if category_filter is None or category == category_filter:
+                yield post
+        yield '</posts>\n'
+
+    def comments_xml(self, index, message_n):
+        if not self.comments:
+            yield XML_HEADER + '<nil-classes type="array"/>\n'
+            return
+        rand = self._random(index, 'comments:%s' % message_n)
+        posted = datetime.datetime.combine(self.today, datetime.time(0, 0)) \
+            - datetime.timedelta(days=message_n // 4)
+        yield XML_HEADER + '<comments type="array">\n'
+        for n in xrange(self.comments):
+            posted += datetime.timedelta(seconds=rand.randint(60, 3600))
+            yield ''.join([
+                '  <comment>\n',
+                '    <attachments-count type="integer">0</attachments-count>\n',
+                '    <author-id type="integer">%s</author-id>\n' % self.person_id(rand.randint(0, self.people - 1)),
+                '    <body>%s</body>\n' % escape(self._sentence(rand, 12)),
+                '    <emailed-from nil="true"></emailed-from>\n',
+                '    <id type="integer">%s</id>\n' % self.comment_id(index, message_n, n),
+                '    <post-id type="integer">%s</post-id>\n' % self.message_id(index, message_n),
+                '    <posted-on type="datetime">%s</posted-on>\n' % posted.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                '  </comment>\n'])
+        yield '</comments>\n'
+
+    def milestones_xml(self, index, find=None):
+        '''A third of the milestones lie ahead of today; of those behind it
+           most are completed and the rest are late. find limits them to
+           'late', 'upcoming' or 'completed' ones, like Basecamp's filter.'''
+        rand = self._random(index, 'milestones')
+        upcoming = self.milestones // 3
+        yield XML_HEADER + '<milestones type="array">\n'
+        for n in xrange(self.milestones):
+            offset = (n - (self.milestones - upcoming)) * 14 + 7
+            deadline = self.today + datetime.timedelta(days=offset)
+            created = self._datetime(deadline - datetime.timedelta(days=rand.randint(30, 90)), rand)
+            completed = offset < 0 and rand.random() < 0.75
+            party = rand.randint(0, self.people - 1)
+            parts = ['  <milestone>\n',
+                     '    <completed type="boolean">%s</completed>\n' % str(completed).lower()]
+            if completed:
+                parts.extend([
+                    '    <completed-on type="datetime">%s</completed-on>\n' % self._datetime(deadline - datetime.timedelta(days=rand.randint(0, 3)), rand),
+                    '    <completer-id type="integer">%s</completer-id>\n' % self.person_id(party)])
+            parts.extend([
+                '    <created-on type="datetime">%s</created-on>\n' % created,
+                '    <creator-id type="integer">%s</creator-id>\n' % self.person_id(0),
+                '    <deadline type="date">%s</deadline>\n' % deadline.isoformat(),
+                '    <id type="integer">%s</id>\n' % self.milestone_id(index, n),
+                '    <project-id type="integer">%s</project-id>\n' % self.project_id(index),
+                '    <responsible-party-id type="integer">%s</responsible-party-id>\n' % self.person_id(party),
+                '    <responsible-party-type>Person</responsible-party-type>\n',
+                '    <title>Milestone %s: %s</title>\n' % (n + 1, escape(self._sentence(rand, 2))),
+                '    <wants-notification type="boolean">false</wants-notification>\n',
+                '  </milestone>\n'])
+            if find is None or find == 'completed' and completed \
+                    or find == 'late' and offset < 0 and not completed \
+                    or find == 'upcoming' and offset >= 0 and not completed:
+                yield ''.join(parts)
+        yield '</milestones>\n'
+
+    def _todo_list_meta(self, index, n):
+        '''Name and completion state of list n: sprints first (the earlier
+           half completed), then backlogs.'''
+        if n < self.sprints:
+            name = 'Sprint %s' % n
+            done = n < self.sprints // 2
+        else:
+            name = ('Product backlog', 'Defect backlog')[(n - self.sprints) % 2]
+            if n - self.sprints >= 2:
+                name = '%s %s' % (name, (n - self.sprints) // 2 + 1)
+            done = False
+        return name, done
+
+    def _todo_items(self, index, n):
+        '''(item_id, completed_on) for each item of list n.'''
+        done = self._todo_list_meta(index, n)[1]
+        rand = self._random(index, 'todo:%s' % n)
+        sprint_start = self.today - datetime.timedelta(days=(self.sprints // 2 - n) * 14)
+        items = []
+        for i in xrange(self.todo_items):
+            completed_on = None
+            if n < self.sprints and (done or (sprint_start <= self.today and rand.random() < 0.4)):
+                day = sprint_start + datetime.timedelta(days=rand.randint(0, 13))
+                completed_on = self._datetime(min(day, self.today), rand)
+            items.append((self.todo_item_id(index, n, i), completed_on))
+        return items
+
+    def todo_lists_xml(self, index, complete=None):
+        yield XML_HEADER + '<todo-lists type="array">\n'
+        for n in xrange(self.todo_list_count):
+            if complete is not None:
+                items = self._todo_items(index, n)
+                if complete != (len([i for i in items if i[1]]) == len(items)): continue
+            yield self._todo_list_node(index, n, with_items=False)
+        yield '</todo-lists>\n'
+
+    def todo_list_xml(self, index, n):
+        yield XML_HEADER + self._todo_list_node(index, n, with_items=True)
+
+    def _todo_list_node(self, index, n, with_items):
+        name, done = self._todo_list_meta(index, n)
+        items = self._todo_items(index, n)
+        completed = len([i for i in items if i[1]])
+        indent = with_items and '' or '  '
+        parts = [
+            indent, '<todo-list>\n',
+            indent, '  <completed-count type="integer">%s</completed-count>\n' % completed,
+            indent, '  <description>%s</description>\n' % escape(name),
+            indent, '  <id type="integer">%s</id>\n' % self.todo_list_id(index, n),
+            indent, '  <milestone-id type="integer" nil="true"></milestone-id>\n',
+            indent, '  <name>%s</name>\n' % escape(name),
+            indent, '  <position type="integer">%s</position>\n' % (n + 1),
+            indent, '  <private type="boolean">false</private>\n',
+            indent, '  <project-id type="integer">%s</project-id>\n' % self.project_id(index),
+            indent, '  <tracked type="boolean">false</tracked>\n',
+            indent, '  <uncompleted-count type="integer">%s</uncompleted-count>\n' % (len(items) - completed),
+            indent, '  <complete>%s</complete>\n' % str(completed == len(items)).lower()]
+        if with_items:
+            rand = self._random(index, 'items:%s' % n)
+            parts.append('  <todo-items type="array">\n')
+            for position, (item_id, completed_on) in enumerate(items):
+                parts.extend([
+                    '    <todo-item>\n',
+                    '      <completed type="boolean">%s</completed>\n' % str(bool(completed_on)).lower()])
+                if completed_on:
+                    parts.extend([
+                        '      <completed-on type="datetime">%s</completed-on>\n' % completed_on,
+                        '      <completer-id type="integer">%s</completer-id>\n' % self.person_id(rand.randint(0, self.people - 1))])
+                parts.extend([
+                    '      <content>%s</content>\n' % escape(self._sentence(rand, 5)),
+                    '      <created-on type="datetime">%s</created-on>\n' % self._datetime(self.today - datetime.timedelta(days=120), rand),
+                    '      <creator-id type="integer">%s</creator-id>\n' % self.person_id(0),
+                    '      <id type="integer">%s</id>\n' % item_id,
+                    '      <position type="integer">%s</position>\n' % (position + 1),
+                    '      <todo-list-id type="integer">%s</todo-list-id>\n' % self.todo_list_id(index, n),
+                    '    </todo-item>\n'])
+            parts.append('  </todo-items>\n')
+        parts.extend([indent, '</todo-list>\n'])
+        return ''.join(parts)
+
+    def time_entries_xml(self, index):
+        yield XML_HEADER + '<time-entries type="array">\n'
+        for entry in self._time_entries(index):
+            yield entry
+        yield '</time-entries>\n'
+
+    def time_entry_pages(self, index):
+        '''Yields the XML of each page of the project's time entries, in
+           generation order rather than by date, and an empty page after a
+           full last one.'''
+        page = []
+        for entry in self._time_entries(index):
+            page.append(entry)
+            if len(page) == TIME_ENTRIES_PER_PAGE:
+                yield self._time_entry_page(page)
+                page = []
+        yield self._time_entry_page(page)
+
+    def _time_entry_page(self, entries):
+        return ''.join([XML_HEADER, '<time-entries type="array">\n'] + entries
+                       + ['</time-entries>\n'])
+
+    def _time_entries(self, index):
+        rand = self._random(index, 'time')
+        items = self.todo_list_count * self.todo_items
+        for n in xrange(self.time_entries):
+            person = rand.randint(0, self.people - 1)
+            day = self.today - datetime.timedelta(days=rand.randint(0, 365))
+            parts = [
+                '  <time-entry>\n',
+                '    <date type="date">%s</date>\n' % day.isoformat(),
+                '    <description>%s</description>\n' % escape(self._sentence(rand, 3)),
+                '    <hours type="float">%s</hours>\n' % (rand.randint(1, 32) / 4.0),
+                '    <id type="integer">%s</id>\n' % self.time_entry_id(index, n),
+                '    <person-id type="integer">%s</person-id>\n' % self.person_id(person),
+                '    <person-name>%s %s</person-name>\n' % (FIRST_NAMES[person % len(FIRST_NAMES)], LAST_NAMES[(person // len(FIRST_NAMES)) % len(LAST_NAMES)]),
+                '    <project-id type="integer">%s</project-id>\n' % self.project_id(index)]
+            if items and rand.random() < 0.5:
+                item = rand.randint(0, items - 1)
+                parts.append('    <todo-item-id type="integer">%s</todo-item-id>\n'
+                             % self.todo_item_id(index, item // self.todo_items, item % self.todo_items))
+            else:
+                parts.append('    <todo-item-id type="integer" nil="true"></todo-item-id>\n')
+            parts.append('  </time-entry>\n')
+            yield ''.join(parts)
+
+    # ---------------------------------------------------------------- #
+    # Helpers
+
+    def _sentence(self, rand, words):
+        return ' '.join([rand.choice(WORDS) for i in xrange(words)]).capitalize()
+
+    def _datetime(self, day, rand):
+        return '%sT%02d:%02d:%02dZ' % (day.isoformat(), rand.randint(8, 18),
+                                       rand.randint(0, 59), rand.randint(0, 59))
+
+
+def main(argv=None):
+    parser = OptionParser(usage="%prog [options] [OUTPUT.json]",
+        description="Write a synthetic Basecamp account as TestBasecamp "
+                    "fixtures, or serve it over HTTP with --serve.")
+    parser.add_option("--preset", choices=PRESETS.keys(),
+                      help="start from a named size (%s)" % ', '.join(sorted(PRESETS)))
+    parser.add_option("--seed", type="int", default=0)
+    for name in ('projects', 'people', 'messages', 'comments', 'milestones',
+                 'sprints', 'backlogs', 'todo-items', 'time-entries'):
+        parser.add_option("--%s" % name, type="int", dest=name.replace('-', '_'))
+    parser.add_option("--serve", type="int", metavar="PORT",
+                      help="serve the responses on 127.0.0.1:PORT instead of writing them")
+    options, args = parser.parse_args(argv)
+
+    sizes = dict(PRESETS.get(options.preset, {}))
+    for name in ('projects', 'people', 'messages', 'comments', 'milestones',
+                 'sprints', 'backlogs', 'todo_items', 'time_entries'):
+        if getattr(options, name) is not None:
+            sizes[name] = getattr(options, name)
+    gen = AccountGenerator(seed=options.seed, **sizes)
+
+    if options.serve is not None:
+        from basecampreporting.mocks import FixtureServer
+        server = FixtureServer(gen.responses(), port=options.serve)
+        print "Serving %s projects at %s" % (gen.projects, server.url)
+        server.serve_forever()
+    elif args:
+        out = open(args[0], 'w')
+        gen.write_json(out)
+        out.close()
+    else:
+        gen.write_json(sys.stdout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Hedged reads: a second copy of a slow read, the first answer winning.
+
+Most Basecamp reads come back quickly, but now and then one lands on a slow
+server or a congested connection and takes many times longer, and a page
+waiting for it is as slow as that one read. A Hedger watches read
+latencies and, when a read is still unanswered after the given percentile
+of recent ones, sends the same request again and takes whichever answer
+comes first:
+
+    bc = Basecamp(url, username, password, hedger=Hedger(percentile=0.95))
+
+Only reads are hedged, since they are safe to repeat, and only once the
+Hedger has seen min_samples of them. At the 95th percentile about one read
+in twenty is sent twice. The copy that loses is left to finish in the
+background and its answer dropped. Each attempt goes through the request
+scheduler, so hedges count against its rate limits like any other request,
+and both attempts work to the deadline of the caller (see deadlines).
+"""
+
+import collections
+import sys
+import threading
+import time
+
+from basecampreporting import deadlines
+from basecampreporting.deadlines import DeadlineExceeded
+
+DEFAULT_PERCENTILE = 0.95
+
+
+class _Race(object):
+    '''Attempts at the same call, running on their own threads.'''
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.running = 0
+        self.won = False
+        self.winner = None
+        self.result = None
+        self.failures = []
+
+    def start(self, func, deadline):
+        self.condition.acquire()
+        attempt = self.running + len(self.failures) + int(self.won)
+        self.running += 1
+        self.condition.release()
+        thread = threading.Thread(target=self.run,
+                                  args=(func, deadline, attempt))
+        thread.setDaemon(True)
+        thread.start()
+
+    def run(self, func, deadline, attempt):
+        try:
+            result, exc_info = deadlines.call(deadline, func), None
+        except Exception:
+            result, exc_info = None, sys.exc_info()
+        self.condition.acquire()
+        try:
+            self.running -= 1
+            if exc_info is not None:
+                self.failures.append(exc_info)
+            elif not self.won:
+                self.won = True
+                self.winner = attempt
+                self.result = result
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def wait(self, timeout=None):
+        '''Waits up to timeout seconds for an answer, or for every attempt
+           to have failed. Returns whether either happened.'''
+        self.condition.acquire()
+        try:
+            if timeout is not None: ends = time.time() + timeout
+            while not self.won and self.running:
+                if timeout is None:
+                    self.condition.wait()
+                    continue
+                remaining = ends - time.time()
+                if remaining <= 0: return False
+                self.condition.wait(remaining)
+            return True
+        finally:
+            self.condition.release()
+
+    def outcome(self):
+        if self.won: return self.result
+        exc_info = self.failures[0]
+        raise exc_info[0], exc_info[1], exc_info[2]
+
+
+class Hedger(object):
+    '''Hedges calls that outlast percentile of the last `window` calls,
+       waiting at least min_delay seconds before doing so.'''
+    def __init__(self, percentile=DEFAULT_PERCENTILE, min_samples=20,
+                 min_delay=0.01, window=200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=window)
+        self.calls = 0
+        self.hedged = 0
+        self.hedges_won = 0
+
+    def observe(self, latency):
+        self.lock.acquire()
+        try:
+            self.latencies.append(latency)
+        finally:
+            self.lock.release()
+
+    def delay(self):
+        '''Seconds to wait before hedging, or None while too few latencies
+           have been seen.'''
+        self.lock.acquire()
+        try:
+            if len(self.latencies) < self.min_samples: return None
+            latencies = sorted(self.latencies)
+        finally:
+            self.lock.release()
+        index = min(len(latencies) - 1, int(self.percentile * len(latencies)))
+        return max(self.min_delay, latencies[index])
+
+    def call(self, func):
+        '''func(), sent a second time if the first is slow to answer.'''
+        self.calls += 1
+        delay = self.delay()
+        started = time.time()
+        if delay is None:
+            result = func()
+            self.observe(time.time() - started)
+            return result
+
+        deadline = deadlines.current()
+        race = _Race()
+        race.start(func, deadline)
+        if deadline is not None: delay = min(delay, deadline.remaining())
+        if not race.wait(delay):
+            self.hedged += 1
+            race.start(func, deadline)
+            if not race.wait(deadline and deadline.remaining()):
+                raise DeadlineExceeded("hedged read exceeded its %.3gs deadline"
+                                       % deadline.seconds)
+        result = race.outcome()
+        if race.winner: self.hedges_won += 1
+        self.observe(time.time() - started)
+        return result
@@ -0,0 +1,191 @@
+"""Per-request instrumentation for Basecamp.
+
+Every request made through Basecamp._request is described by a RequestEvent
+and handed to the listeners registered on that Basecamp instance and to the
+module-wide listeners below. With no listeners registered nothing is timed or
+allocated, so instrumentation costs a single check when switched off.
+
+    stats = RequestStats()
+    project.bc.add_listener(stats)
+    project.messages
+    print stats.latency.percentile(0.99)
+
+A listener is any callable taking a RequestEvent; RequestStats keeps counters
+and histograms in memory, and anything else (a statsd or Prometheus
+exporter, a log line per request) can be plugged in the same way.
+"""
+
+import re
+import threading
+
+# Listeners notified of requests from every Basecamp instance.
+listeners = []
+
+def add_listener(listener):
+    listeners.append(listener)
+
+def remove_listener(listener):
+    listeners.remove(listener)
+
+
+id_pattern = re.compile(r'\d+')
+def request_shape(path):
+    '''Collapses the ids in a request path so calls to the same endpoint can
+       be grouped: /msg/comments/19364228 -> /msg/comments/:id'''
+    return id_pattern.sub(':id', path.split('?', 1)[0])
+
+
+class RequestEvent(object):
+    '''Describes a single call to Basecamp._request. Times are in seconds.'''
+    __slots__ = ('path', 'method', 'request_bytes', 'status', 'bytes', 'ttfb',
+                 'latency', 'cache', 'retries', 'error', 'started')
+
+    def __init__(self, path, data=None, started=None):
+        self.path = path
+        self.method = data and 'POST' or 'GET'
+        self.request_bytes = data and len(data) or 0
+        self.status = None
+        self.bytes = 0
+        self.ttfb = None
+        self.latency = None
+        self.cache = None    # 'hit', 'miss' or None when no cache applies
+        self.retries = 0
+        self.error = None
+        self.started = started
+
+    @property
+    def shape(self):
+        return request_shape(self.path)
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__
+                    if name != 'error')
+
+    def __repr__(self):
+        return '<RequestEvent %s %s %s %sB %.3fs>' % (self.method, self.path,
+            self.status, self.bytes, self.latency or 0.0)
+
+
+class Histogram(object):
+    '''Fixed-bucket histogram; percentiles are reported as bucket bounds.'''
+    DEFAULT_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                      0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        index = 0
+        for bound in self.bounds:
+            if value <= bound: break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min: self.min = value
+        if self.max is None or value > self.max: self.max = value
+
+    @property
+    def mean(self):
+        if not self.count: return None
+        return self.total / self.count
+
+    def percentile(self, fraction):
+        '''Upper bound of the bucket holding the given fraction of samples.'''
+        if not self.count: return None
+        wanted = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted and count:
+                if index < len(self.bounds): return min(self.bounds[index], self.max)
+                return self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count, 'total': self.total, 'mean': self.mean,
+            'min': self.min, 'max': self.max,
+            'p50': self.percentile(0.5), 'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': zip(list(self.bounds) + [None], self.counts),
+        }
+
+
+class EndpointStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.latency = Histogram()
+
+    def to_dict(self):
+        return {'requests': self.requests, 'bytes': self.bytes,
+                'latency': self.latency.to_dict()}
+
+
+class RequestStats(object):
+    '''Listener that aggregates request events into counters and histograms.'''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.retries = 0
+        self.statuses = {}
+        self.latency = Histogram()
+        self.ttfb = Histogram()
+        self.endpoints = {}
+
+    def __call__(self, event):
+        self.lock.acquire()
+        try:
+            self.requests += 1
+            if event.error is not None: self.errors += 1
+            self.bytes_received += event.bytes
+            self.bytes_sent += event.request_bytes
+            if event.cache == 'hit': self.cache_hits += 1
+            elif event.cache == 'miss': self.cache_misses += 1
+            self.retries += event.retries
+            self.statuses[event.status] = self.statuses.get(event.status, 0) + 1
+            if event.latency is not None: self.latency.add(event.latency)
+            if event.ttfb is not None: self.ttfb.add(event.ttfb)
+
+            key = (event.method, event.shape)
+            endpoint = self.endpoints.get(key)
+            if endpoint is None:
+                endpoint = self.endpoints[key] = EndpointStats()
+            endpoint.requests += 1
+            endpoint.bytes += event.bytes
+            if event.latency is not None: endpoint.latency.add(event.latency)
+        finally:
+            self.lock.release()
+
+    def slowest_endpoints(self, n=10):
+        '''(method, shape, EndpointStats) ordered by total time spent.'''
+        endpoints = [(stats.latency.total, key, stats)
+                     for key, stats in self.endpoints.items()]
+        endpoints.sort(reverse=True)
+        return [(key[0], key[1], stats) for total, key, stats in endpoints[:n]]
+
+    def to_dict(self):
+        return {
+            'requests': self.requests, 'errors': self.errors,
+            'bytes_received': self.bytes_received,
+            'bytes_sent': self.bytes_sent,
+            'cache_hits': self.cache_hits, 'cache_misses': self.cache_misses,
+            'retries': self.retries, 'statuses': self.statuses,
+            'latency': self.latency.to_dict(), 'ttfb': self.ttfb.to_dict(),
+            'endpoints': dict(('%s %s' % key, stats.to_dict())
+                              for key, stats in self.endpoints.items()),
+        }
@@ -1,10 +1,17 @@
 import simplejson
 import pprint
+import socket
+import sys
+import threading
+import time
+import BaseHTTPServer
+import SocketServer
 
 
 from basecampreporting.etree import ET
 from basecampreporting.basecamp import Basecamp
 from basecampreporting.project import Project
+from basecampreporting import instrumentation
 
 class TestBasecamp(Basecamp):
     """Subclass of Basecamp which records network transactions.
@@ -17,11 +24,20 @@ class TestBasecamp(Basecamp):
         super(TestBasecamp, self).__init__(baseURL, username, password)
     
     def _request(self, path, data=None):
+        started = time.time()
         try:
             result = self.__test_request_local(path, data)
         except KeyError:
             result = super(TestBasecamp, self)._request(path, data)
             self.__cache_result(path, data, result)
+            return result
+        if self.listeners or instrumentation.listeners:
+            event = instrumentation.RequestEvent(path, data is not None and ET.tostring(data) or None, started)
+            event.status = 200
+            event.bytes = len(result)
+            event.cache = 'hit'
+            event.latency = event.ttfb = time.time() - started
+            self._emit(event)
         return result
 
     def __cache_result(self, path, data, result):
@@ -58,13 +74,125 @@ class TestBasecamp(Basecamp):
             print "Warning fixture file %s not found. No fixtures loaded." % (path)
             return False
 
+    def load_test_responses(self, responses):
+        """Replays an in-memory fixture dictionary, such as the one built by
+           generator.AccountGenerator.responses()."""
+        self.__test_responses = responses
+        return self.__test_responses
+
     def save_test_fixtures(self, path):
         contents = simplejson.dumps(self.__test_responses, indent=4)
         file(path, 'w').write(contents)
         return contents
 
 class TestProject(Project):
-    """Mock of Project that reads data from fixtures."""
+    """Mock of Project that reads data from fixtures. path_to_fixtures may
+       also be an in-memory fixture dictionary."""
     def __init__(self, url, id, username, password, path_to_fixtures):
         super(TestProject, self).__init__(url, id, username, password, basecamp=TestBasecamp)
-        self.bc.load_test_fixtures(path_to_fixtures)
+        if hasattr(path_to_fixtures, 'keys'):
+            self.bc.load_test_responses(path_to_fixtures)
+        else:
+            self.bc.load_test_fixtures(path_to_fixtures)
+
+class FixtureRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers Basecamp API requests from the server's fixture dictionary."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.fault(): return
+        self.respond(self.server.responses['GET'].get(self.path))
+
+    def do_POST(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        body = self.rfile.read(length)
+        if self.fault(): return
+        result = self.server.responses['POST'].get(self.path, {}).get(body)
+        if result is None:
+            # Bodyless requests such as <request /> are recorded under GET.
+            result = self.server.responses['GET'].get(self.path)
+        self.respond(result)
+
+    def fault(self):
+        """Applies the next injected fault, if any. Returns True when the
+           fault replaced the response."""
+        fault = self.server.next_fault()
+        if fault is None: return False
+        status, headers, delay = fault
+        if delay: time.sleep(delay)
+        if status is None: return False
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+    def respond(self, result):
+        if result is None:
+            self.send_error(404)
+            return
+        if isinstance(result, unicode): result = result.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def log_message(self, format, *args):
+        pass
+
+class FixtureServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Local stand-in for a Basecamp account, serving recorded or generated
+       fixtures over HTTP so the real Basecamp class can be exercised without
+       network access. Pass port=0 to pick a free port.
+
+           server = FixtureServer(AccountGenerator().responses())
+           server.start()
+           bc = Basecamp(server.url, 'user', 'pass')
+       """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, responses, host='127.0.0.1', port=0):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), FixtureRequestHandler)
+        self.responses = responses
+        self.url = 'http://%s:%s' % self.server_address
+        self.faults = []
+        self.fault_lock = threading.Lock()
+        self.requests = 0
+
+    def inject(self, status=None, headers=(), delay=0, count=1):
+        """Makes the next count requests wait delay seconds and then, if
+           status is given, answer with that status and headers instead of
+           the fixture."""
+        self.fault_lock.acquire()
+        try:
+            self.faults.extend([(status, list(headers), delay)] * count)
+        finally:
+            self.fault_lock.release()
+
+    def next_fault(self):
+        self.fault_lock.acquire()
+        try:
+            self.requests += 1
+            if self.faults: return self.faults.pop(0)
+            return None
+        finally:
+            self.fault_lock.release()
+
+    def handle_error(self, request, client_address):
+        # Clients that stop waiting (timeouts, deadlines, hedged reads) close
+        # the connection before a delayed response is written.
+        if isinstance(sys.exc_info()[1], socket.error): return
+        BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,78 @@
+"""Lazy, page at a time iteration over Basecamp collections.
+
+    for message in p.iter_messages():
+        if seen_enough(message): break      # no further pages are fetched
+
+iter_pages(fetch) calls fetch(1), fetch(2) and so on, yielding the records
+of each page in turn. fetch returns (records, more), more being false on the
+last page. While the caller works through one page the next is already
+being fetched on a background thread, so a full walk costs little more than
+the slowest page, and stopping early wastes at most the one page that was
+being fetched ahead (closing the iterator waits for that fetch to end).
+Where that page is expensive, lookahead delays its fetch until only that
+many records of the current page are left.
+"""
+
+import sys
+import threading
+
+# Basecamp's page sizes.
+RECENT_MESSAGES = 25
+TIME_ENTRIES_PER_PAGE = 50
+
+
+class _Prefetch(threading.Thread):
+    '''fetch(page) running in the background.'''
+    def __init__(self, fetch, page):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.fetch = fetch
+        self.page = page
+        self.result = self.exc_info = None
+        self.start()
+
+    def run(self):
+        try:
+            self.result = self.fetch(self.page)
+        except Exception:
+            self.exc_info = sys.exc_info()
+
+    def get(self):
+        self.join()
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
+
+
+def iter_pages(fetch, prefetch=True, lookahead=None):
+    '''Yields the records of fetch(1), fetch(2), ... until a page says there
+       are no more, fetching each page while the previous one is consumed
+       (from its start, or once lookahead records of it remain) unless
+       prefetch is false.'''
+    page = 1
+    records, more = fetch(page)
+    upcoming = None
+    try:
+        while True:
+            start = 0
+            if lookahead is not None: start = max(0, len(records) - lookahead)
+            for position, record in enumerate(records):
+                if position == start and more and prefetch:
+                    upcoming = _Prefetch(fetch, page + 1)
+                yield record
+            if not more: return
+            page += 1
+            if upcoming is not None:
+                records, more = upcoming.get()
+                upcoming = None
+            else:
+                records, more = fetch(page)
+    finally:
+        # Left early: let the page being fetched ahead finish rather than
+        # leave its request running past the iteration.
+        if upcoming is not None: upcoming.join()
+
+def full_page(records, size):
+    '''(records, more) for an endpoint that returns size records a page:
+       only a full page may have another after it.'''
+    return records, len(records) >= size
@@ -1,27 +1,100 @@
 import datetime
+import sys
 
 from basecampreporting.etree import ET
 
-def parse_basecamp_xml(xml_object):
+# Text fields whose values repeat across many records. Fields ending in
+# _name are interned as well.
+INTERNED_FIELDS = frozenset([u'name', u'status', u'type', u'author_name',
+                             u'person_name', u'first_name', u'last_name',
+                             u'time_zone_name', u'complete'])
+
+# Values an Interner holds at most twice over, in its current table and the
+# one before it.
+DEFAULT_MAX_VALUES = 100000
+
+class Interner(object):
+    '''Table of canonical values, so that equal strings and dates parsed
+       from different records share one object. Only low-cardinality text
+       fields and plain dates are interned; datetimes are nearly all
+       distinct. Share an Interner between the projects of an account to
+       deduplicate across all of them.
+
+       The table is bounded for long-running processes: once it holds
+       max_values values it is set aside for a new one, and values looked
+       up again are moved over. Those no longer in use go with the old
+       table when the new one fills in turn.'''
+    def __init__(self, fields=INTERNED_FIELDS, max_values=DEFAULT_MAX_VALUES):
+        self.fields = fields
+        self.max_values = max_values
+        self.table = {}
+        self.previous = {}
+        self.lookups = 0
+        self.hits = 0
+        self.bytes_saved = 0
+
+    def wants(self, field, value):
+        if isinstance(value, basestring):
+            return field in self.fields or field.endswith(u'_name')
+        return type(value) is datetime.date
+
+    def __call__(self, value):
+        # Keyed by type as well, so u'1' and '1' never stand in for one
+        # another.
+        key = (type(value), value)
+        canonical = self.table.get(key)
+        if canonical is None:
+            canonical = self.previous.get(key, value)
+            if len(self.table) >= self.max_values:
+                self.previous, self.table = self.table, {}
+            self.table[key] = canonical
+        self.lookups += 1
+        if canonical is not value:
+            self.hits += 1
+            self.bytes_saved += sys.getsizeof(value)
+        return canonical
+
+    def stats(self):
+        '''Counters for memory reports. bytes_saved is the size of the
+           duplicates that were dropped in favour of a shared value.'''
+        return dict(values=len(self.table) + len(self.previous),
+                    lookups=self.lookups, hits=self.hits,
+                    bytes_saved=self.bytes_saved)
+
+def parse_basecamp_xml(xml_object, interner=None):
     if hasattr(xml_object, 'getchildren'):
         nodes = xml_object.getchildren()
     else:
         nodes = ET.fromstring(xml_object).getchildren()
         
-    parsed = parse_tree(nodes)
+    parsed = parse_tree(nodes, interner)
     return parsed
 
-def parse_tree(nodes):
+def parse_tree(nodes, interner=None):
     parsed = {}
     for node in nodes:
         tag_name = normalize_tag_name(node.tag)
         if not node.getchildren():
             #It's a single, non-nested item
-            parsed[tag_name] = parse_single_node(node)
+            value = parse_single_node(node)
+            if interner is not None and value is not None and interner.wants(tag_name, value):
+                value = interner(value)
+            parsed[tag_name] = value
         else:
-            parsed[tag_name] = parse_tree(node.getchildren())
+            parsed[tag_name] = parse_tree(node.getchildren(), interner)
     return parsed
 
+def intern_record(record, interner=None):
+    '''Interns the values of a record parsed without an interner (in
+       another process, say) as parse_tree would have.'''
+    if interner is None: return record
+    for key, value in record.items():
+        if isinstance(value, dict):
+            intern_record(value, interner)
+        elif value is not None and interner.wants(key, value):
+            record[key] = interner(value)
+    return record
+
 def parse_single_node(node):
     if 'type' in node.keys():
         return cast_value(node.text, node.get('type'))
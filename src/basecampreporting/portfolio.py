@@ -0,0 +1,147 @@
+"""Account-wide reporting over many projects at once.
+
+    portfolio = Portfolio(url, username, password, statuses=['active'])
+    portfolio.load(['milestones', 'todo_lists'])
+    for project, milestone in portfolio.late_milestones:
+        print project.name, milestone.title
+
+A Portfolio lists the account's projects with a single Basecamp.projects()
+call and keeps one Project per id, all sharing one Basecamp client (and so
+one connection pool, scheduler and set of in-flight reads) and one people
+cache. Collections are loaded for every project in parallel on a bounded
+pool of worker threads, so a report over the whole account costs about
+(projects * requests per project / workers) round trips rather than
+projects * requests per project. The aggregates then work over the loaded
+collections in memory.
+"""
+
+from basecampreporting.etree import ET
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.parser import Interner
+from basecampreporting.project import Project
+from basecampreporting.workers import map_unordered
+
+DEFAULT_WORKERS = 8
+
+
+class Portfolio(object):
+    '''The projects of one Basecamp account.'''
+    def __init__(self, url, username, password, basecamp=Basecamp,
+                 statuses=None, workers=DEFAULT_WORKERS, cache_backend=None,
+                 decoder=None, deadline=None):
+        '''basecamp may be a Basecamp class or an existing instance; statuses
+           optionally limits the portfolio to projects with those statuses
+           (active, on_hold, archived). The projects share a people cache,
+           a parser.Interner and, when given, cache_backend and decoder (a
+           decoding.DecodePool for parsing on several processes). deadline
+           is passed on to each Project.'''
+        if isinstance(basecamp, Basecamp):
+            self.bc = basecamp
+        else:
+            self.bc = basecamp(url, username, password)
+        self.url = url
+        self.statuses = statuses
+        self.workers = workers
+        self.people_cache = {}
+        self.interner = Interner()
+        self.cache_backend = cache_backend
+        self.decoder = decoder
+        self.deadline = deadline
+        self.errors = {}
+        self.fetched = set()
+        self._projects = None
+
+    @property
+    def projects(self):
+        '''Projects in the order Basecamp lists them.'''
+        if self._projects is None:
+            projects = []
+            for node in ET.fromstring(self.bc.projects()).findall('project'):
+                status = node.findtext('status')
+                if self.statuses and status not in self.statuses: continue
+                p = Project(self.url, int(node.findtext('id')), None, None,
+                            basecamp=self.bc, people_cache=self.people_cache,
+                            interner=self.interner,
+                            cache_backend=self.cache_backend,
+                            decoder=self.decoder, deadline=self.deadline)
+                # The listing already carries what project info would fetch.
+                p._name = node.findtext('name')
+                p._status = status
+                p._last_changed_on = node.findtext('last-changed-on')
+                projects.append(p)
+            self._projects = projects
+        return self._projects
+
+    def project(self, project_id):
+        for p in self.projects:
+            if p.id == project_id: return p
+        raise KeyError(project_id)
+
+    def each(self, func, workers=None):
+        '''Calls func(project) for every project on the worker threads,
+           yielding (project, result, exc_info) as each finishes.'''
+        return map_unordered(func, self.projects, workers or self.workers)
+
+    def load(self, names=('messages', 'comments', 'milestones', 'todo_lists'),
+             workers=None):
+        '''Loads the named collections for every project in parallel.
+           Collections that fail are recorded in self.errors under
+           (project id, name), and their projects left out of the aggregates
+           over that collection, rather than raising. Returns the number of
+           projects with a failure among names.'''
+        names = list(names)
+        # Fork the decoding processes before the worker threads start.
+        if self.decoder is not None: self.decoder.start()
+        def fetch(p):
+            failures = {}
+            for name in names:
+                try:
+                    getattr(p, name)
+                except Exception, e:
+                    failures[name] = e
+            return failures
+        failed = set()
+        for p, failures, exc_info in self.each(fetch, workers):
+            if exc_info: failures = dict((name, exc_info[1]) for name in names)
+            for name in names:
+                if name in failures:
+                    self.errors[(p.id, name)] = failures[name]
+                    failed.add(p.id)
+                else:
+                    self.errors.pop((p.id, name), None)
+        self.fetched.update(names)
+        return len(failed)
+
+    def loaded(self, name):
+        '''Projects whose collection called name has loaded, loading it for
+           the whole portfolio first if that hasn't happened yet.'''
+        if name not in self.fetched: self.load([name])
+        return [p for p in self.projects if (p.id, name) not in self.errors]
+
+    @property
+    def late_milestones(self):
+        '''(project, milestone) pairs for every late milestone in the
+           account, most overdue first.'''
+        late = [(m.deadline, p, m) for p in self.loaded('milestones')
+                for m in p.late_milestones]
+        late.sort(key=lambda row: row[0])
+        return [(p, m) for deadline, p, m in late]
+
+    @property
+    def backlog_totals(self):
+        '''Uncompleted backlog items by project id, plus the account total
+           under None.'''
+        totals = {}
+        for p in self.loaded('todo_lists'):
+            totals[p.id] = p.backlogged_count
+        totals[None] = sum(totals.values())
+        return totals
+
+    @property
+    def time_by_person(self):
+        '''Hours logged by person id across every project.'''
+        hours = {}
+        for p in self.loaded('time_entries'):
+            for entry in p.time_entries:
+                hours[entry.person_id] = hours.get(entry.person_id, 0.0) + entry.hours
+        return hours
@@ -4,7 +4,17 @@ import re
 from basecampreporting.etree import ET
 from basecampreporting.serialization import json, BasecampObjectEncoder
 from basecampreporting.basecamp import Basecamp
-from basecampreporting.parser import parse_basecamp_xml, cast_to_boolean
+from basecampreporting.cache import DEFAULT_TTL
+from basecampreporting.parser import parse_basecamp_xml, intern_record, cast_to_boolean, Interner
+from basecampreporting.instrumentation import RequestStats
+from basecampreporting.singleflight import SingleFlight
+from basecampreporting.query import Query, RecordIndex
+from basecampreporting.summary import ProjectSummary
+from basecampreporting.bulk import BulkWriter
+from basecampreporting.burndown import Burndown
+from basecampreporting.deadlines import DeadlineExceeded, within
+from basecampreporting.paging import iter_pages, full_page, RECENT_MESSAGES, \
+     TIME_ENTRIES_PER_PAGE
 from urllib2 import HTTPError
 
 class BasecampObject(object):
@@ -12,11 +22,16 @@ class BasecampObject(object):
     def __init__(self):
         super(self, BasecampObject).__init__()
 
-    def parse(self, node):
-        return parse_basecamp_xml(node)
+    def parse(self, node, interner=None):
+        return parse_basecamp_xml(node, interner)
 
-    def set_initial_values(self, xml_element):
-        data = self.parse(xml_element)
+    def set_initial_values(self, xml_element, interner=None):
+        '''xml_element may also be a dictionary of fields already parsed,
+           such as a decoding.DecodePool returns.'''
+        if isinstance(xml_element, dict):
+            data = intern_record(xml_element, interner)
+        else:
+            data = self.parse(xml_element, interner)
         if not hasattr(self, '_basecamp_attributes'): self._basecamp_attributes = []
         for key, value in data.items():
             try:
@@ -62,27 +77,184 @@ class BasecampObject(object):
 
 class Project(BasecampObject):
     '''Represents a project in Basecamp.'''
-    def __init__(self, url, id, username, password, basecamp=Basecamp):
-        self.bc = basecamp(url, username, password)
+    def __init__(self, url, id, username, password, basecamp=Basecamp,
+                 people_cache=None, interner=None, cache_backend=None,
+                 cache_ttl=DEFAULT_TTL, decoder=None, deadline=None):
+        '''basecamp may be a Basecamp class or an existing instance to share
+           with other projects; people_cache is an optional dictionary of
+           Person objects by id to share between projects, and interner an
+           optional parser.Interner to share between them. cache_backend, a
+           backend from basecampreporting.cache, keeps parsed collections
+           for cache_ttl seconds where other projects and processes can
+           find them. decoder, a decoding.DecodePool, parses large
+           responses on other processes. deadline is the number of seconds
+           loading a collection may take; one that runs out of time is
+           answered with the last copy loaded, where there is one.'''
+        if isinstance(basecamp, Basecamp):
+            self.bc = basecamp
+        else:
+            self.bc = basecamp(url, username, password)
         self.id = id
+        self.people_cache = people_cache
+        if interner is None: interner = Interner()
+        self.interner = interner
+        self.cache_backend = cache_backend
+        self.cache_ttl = cache_ttl
+        self.decoder = decoder
+        self.deadline = deadline
+        # The last copy of each collection, kept through clear_cache() to
+        # fall back on, and the names of those currently served from it.
+        self.last_loaded = {}
+        self.stale = set()
         self._name = ''
         self._status = ''
         self._last_changed_on = ''
+        self.flights = SingleFlight()
+        self.indexes = {}
+        self._summary = None
+        self._burndown = None
+        # Timeline events of the sources that need sorting, with the
+        # collection they were sorted from (see timeline).
+        self._timeline_events = {}
         self.__init_cache()
+        self.stats = None
         self._basecamp_attributes = []
         self._extra_attributes = ['name', 'status', 'last_changed_on', 'messages', 'comments', 'milestones', 'late_milestones', 'previous_milestones', 'backlogged_count', 'sprints', 'current_sprint', 'upcoming_sprints', 'todo_lists', 'backlogs']
 
+    def instrument(self):
+        '''Starts collecting request counters and histograms for this
+           project into self.stats, which is returned.'''
+        if self.stats is None:
+            self.stats = RequestStats()
+            self.bc.add_listener(self.stats)
+        return self.stats
+
+    def uninstrument(self):
+        if self.stats is not None:
+            self.bc.remove_listener(self.stats)
+            self.stats = None
+
+    def bulk(self, **options):
+        '''Returns a bulk.BulkWriter sending writes through this project's
+           Basecamp instance and clearing its caches when they are done.'''
+        return BulkWriter(self.bc, [self], **options)
+
+    def query(self, name):
+        '''Returns a query.Query over the named collection, such as
+           'messages' or 'time_entries', loading it if need be.'''
+        collection = getattr(self, name)
+        index = self.indexes.get(name)
+        if index is None or index.source is not collection:
+            index = self.indexes[name] = RecordIndex(collection)
+        return Query(index)
+
+    @property
+    def summary(self):
+        '''The summary.ProjectSummary of the project, computed in one pass
+           and kept until a collection it was built from is replaced.'''
+        if self._summary is not None:
+            sources, summary = self._summary
+            current = self._summary_sources()
+            if len(sources) == len(current) and \
+                    all([a is b for a, b in zip(sources, current)]):
+                return summary
+        summary = ProjectSummary.from_project(self)
+        self._summary = (self._summary_sources(), summary)
+        return summary
+
+    @property
+    def burndown(self):
+        '''The burndown.Burndown of the project's sprints. Each use brings it
+           up to date with the todo items, counting only those that changed.'''
+        if self._burndown is None: self._burndown = Burndown()
+        self._burndown.update(self)
+        return self._burndown
+
+    def _summary_sources(self):
+        return (self.cache['milestones'], self.cache['messages'],
+                self.cache['comments'], self.cache['todo_lists'],
+                self._last_changed_on)
+
+    # Narrower collections answered by Basecamp's server-side filters, by
+    # the full collection that makes them redundant.
+    narrow_caches = {'messages': ['category_messages'],
+                     'milestones': ['late_milestones'],
+                     'todo_lists': ['uncompleted_todo_lists']}
+
     def clear_cache(self, name=None):
-        if name: self.cache[name] = None
-        else: self.__init_cache()
+        if name:
+            names = [name] + self.narrow_caches.get(name, [])
+            for cleared in names:
+                self.cache[cleared] = None
+        else:
+            names = self.cache.keys()
+            self.__init_cache()
+        if self.cache_backend is not None:
+            for cleared in names:
+                self.cache_backend.delete(self._backend_key(cleared))
 
     def __init_cache(self):
+        persons = self.people_cache
+        if persons is None: persons = {}
         self.cache = dict(messages = [], comments = [],
-                          milestones = [], todo_lists = {}, time_entries = [],
-                          people = {}, persons = {} )
+                          milestones = [], todo_lists = {}, todo_items = [],
+                          time_entries = [], late_milestones = [],
+                          uncompleted_todo_lists = {}, category_messages = {},
+                          people = {}, persons = persons )
+
+    def _collection(self, name, loader):
+        '''Returns the cached collection called name, calling loader() to
+           fetch it on a miss. Concurrent misses share a single load.'''
+        cached = self.cache[name]
+        if cached: return cached
+        return self.flights.do(name, lambda: self._fill_cache(name, loader))
+
+    def _fill_cache(self, name, loader):
+        # Another caller may have filled it while this one was waiting.
+        if self.cache[name]: return self.cache[name]
+        try:
+            value = within(self.deadline, self._load_shared, name, loader)
+        except DeadlineExceeded:
+            if name not in self.last_loaded: raise
+            # Served but not cached, so the next use tries a fresh load.
+            self.stale.add(name)
+            return self.last_loaded[name]
+        self.last_loaded[name] = value
+        self.stale.discard(name)
+        self.cache[name] = value
+        return value
+
+    def _backend_key(self, name):
+        return self.bc._cache_key('project', self.id, name)
+
+    def _load_shared(self, name, loader):
+        '''loader(), by way of the cache backend when there is one.'''
+        if self.cache_backend is None: return loader()
+        key = self._backend_key(name)
+        value = self.cache_backend.get(key)
+        if value is None:
+            value = loader()
+            self.cache_backend.set(key, value, self.cache_ttl)
+        return value
+
+    def _records(self, xml, path):
+        '''The elements at path in xml, or dictionaries of their fields when
+           a decoder parses them.'''
+        if self.decoder is None: return ET.select(xml, path)
+        return self.decoder.records(xml, path)
+
+    def _records_each(self, documents, path):
+        if self.decoder is None:
+            return [ET.select(xml, path) for xml in documents]
+        return self.decoder.records_each(documents, path)
 
     def _get_project_info(self):
-        project_xml = self.bc._request("/projects/%s.xml" % self.id)
+        self.flights.do('project_info', self._load_project_info)
+
+    def _load_project_info(self):
+        self._parse_project_info(self.bc._request("/projects/%s.xml" % self.id))
+
+    def _parse_project_info(self, project_xml):
         node = ET.fromstring(project_xml)
         self._name = node.findtext("name")
         self._status = node.findtext("status")
@@ -105,82 +277,169 @@ class Project(BasecampObject):
 
     @property
     def messages(self):
-        if self.cache['messages']: return self.cache['messages']
-        message_xml = self.bc.message_archive(self.id)
+        return self._collection('messages', self._load_messages)
+
+    def _load_messages(self):
+        return self._parse_messages(self.bc.message_archive(self.id))
+
+    def _parse_messages(self, message_xml):
         messages = []
-        for post in ET.fromstring(message_xml).findall("post"):
-            messages.append(Message(post))
-        self.cache['messages'] = messages
-        return self.cache['messages']
+        for post in self._records(message_xml, "post"):
+            messages.append(Message(post, self.interner))
+        return messages
+
+    def iter_messages(self, prefetch=True):
+        '''Messages newest first, fetched only as far as they are read: the
+           25 most recent come first, and the rest of the archive (which
+           then fills the messages cache) is requested once the caller
+           reaches the last of them. Iterates the cached messages when they
+           are loaded.'''
+        if self.cache['messages']: return iter(self.cache['messages'])
+        recent = set()
+        def fetch(page):
+            if page == 1:
+                messages = self._parse_messages(self.bc.recent_messages(self.id))
+                recent.update([m.id for m in messages])
+                return full_page(messages, RECENT_MESSAGES)
+            return [m for m in self.messages if m.id not in recent], False
+        return iter_pages(fetch, prefetch, lookahead=1)
+
+    def messages_in_category(self, category_id):
+        '''Messages in one category. Uses the cached archive when there is
+           one, otherwise asks Basecamp for just that category.'''
+        if self.cache['messages']:
+            return [m for m in self.cache['messages']
+                    if message_category_id(m) == category_id]
+        if self.cache['category_messages'] is None:
+            self.cache['category_messages'] = {}
+        messages = self.cache['category_messages'].get(category_id)
+        if messages is None:
+            messages = self.flights.do(('category_messages', category_id),
+                                       lambda: self._load_category_messages(category_id))
+        return messages
+
+    def _load_category_messages(self, category_id):
+        messages = self._parse_messages(self.bc.message_archive(self.id, category_id))
+        self.cache['category_messages'][category_id] = messages
+        return messages
 
     @property
-    def time_entries(self, start_date=None, end_date=None):
+    def time_entries(self):
         '''Array of all time entries'''
-        if self.cache['time_entries']: return self.cache['time_entries']
+        return self._collection('time_entries', self._load_time_entries)
+
+    def _load_time_entries(self, start_date=None, end_date=None):
         if not start_date:
             start_date = datetime.date(1900, 1, 1)
         if not end_date:
             end_date = datetime.date.today()
-        time_entry_xml = self.bc.list_time_entries(self.id, start_date, end_date)
+        return self._parse_time_entries(
+            self.bc.list_time_entries(self.id, start_date, end_date))
+
+    def _parse_time_entries(self, time_entry_xml):
         time_entries = []
-        for entry in ET.fromstring(time_entry_xml).findall("time-entry"):
-            time_entries.append(TimeEntry(entry))
-        self.cache['time_entries'] = time_entries
-        return self.cache['time_entries']
+        for entry in self._records(time_entry_xml, "time-entry"):
+            time_entries.append(TimeEntry(entry, self.interner))
+        return time_entries
+
+    def iter_time_entries(self, prefetch=True):
+        '''Time entries a page of 50 at a time, newest first, so reading
+           only the latest costs a single request. Iterates the cached time
+           entries when they are loaded, sorted newest first by date to
+           match (the report they are loaded from has its own order).'''
+        if self.cache['time_entries']:
+            return iter(sorted(self.cache['time_entries'],
+                               key=lambda entry: entry.date, reverse=True))
+        def fetch(page):
+            return full_page(self._parse_time_entries(
+                self.bc.time_entries_page(self.id, page)), TIME_ENTRIES_PER_PAGE)
+        return iter_pages(fetch, prefetch)
 
     @property
     def people(self):
         '''Dictionary of people on the project, keyed by id'''
-        if self.cache['people']: return self.cache['people']
-        people_xml = self.bc.people_within_project(self.id)
-        for person_node in ET.fromstring(people_xml).findall('person'):
-            p = Person(person_node)
-            self.cache['people'][p.id] = p
-        return self.cache['people']
+        return self._collection('people', self._load_people)
+
+    def _load_people(self):
+        return self._parse_people(self.bc.people_within_project(self.id))
+
+    def _parse_people(self, people_xml):
+        people = {}
+        for person_node in self._records(people_xml, 'person'):
+            p = Person(person_node, self.interner)
+            people[p.id] = p
+        return people
 
     def person(self, person_id):
         '''Access a Person object by id'''
         if not self.cache['persons'].get(person_id, None):
             try:
-                person_xml = self.bc.person(person_id)
-                p = Person(person_xml)
-                self.cache['persons'][person_id] = p
+                self.flights.do(('person', person_id),
+                                lambda: self._load_person(person_id))
             except HTTPError:
                 return None
         return self.cache['persons'][person_id]
 
+    def _load_person(self, person_id):
+        if not self.cache['persons'].get(person_id, None):
+            person_xml = self.bc.person(person_id)
+            self.cache['persons'][person_id] = Person(person_xml, self.interner)
+
     @property
     def comments(self):
         '''Looks through the last 3 messages and returns those comments.'''
-        if self.cache['comments']: return self.cache['comments']
+        return self._collection('comments', self._load_comments)
+
+    def _load_comments(self):
+        return self._parse_comments([self.bc.comments(message.id)
+                                     for message in self.messages[0:3]])
+
+    def _parse_comments(self, comment_documents):
         comments = []
-        for message in self.messages[0:3]:
-            comment_xml = self.bc.comments(message.id)
-            for comment_node in ET.fromstring(comment_xml).findall("comment"):
-                comments.append(Comment(comment_node))
+        for records in self._records_each(comment_documents, "comment"):
+            for comment_node in records:
+                comments.append(Comment(comment_node, self.interner))
         comments.sort()
         comments.reverse()
-        self.cache['comments'] = comments
-        return self.cache['comments']
+        return comments
+
+    def iter_comments(self, prefetch=True):
+        '''Comments on every message (not just the latest three), a message
+           at a time with the newest messages first.'''
+        messages = self.messages
+        if not messages: return iter([])
+        def fetch(page):
+            comments = self._parse_comments([self.bc.comments(messages[page - 1].id)])
+            return comments, page < len(messages)
+        return iter_pages(fetch, prefetch)
 
     @property
     def milestones(self):
         '''Array of all milestones'''
-        if self.cache['milestones']: return self.cache['milestones']
-        milestone_xml = self.bc.list_milestones(self.id)
+        return self._collection('milestones', self._load_milestones)
+
+    def _load_milestones(self):
+        return self._parse_milestones(self.bc.list_milestones(self.id))
+
+    def _parse_milestones(self, milestone_xml):
         milestones = []
-        for node in ET.fromstring(milestone_xml).findall("milestone"):
-            milestones.append(Milestone(node))
+        for node in self._records(milestone_xml, "milestone"):
+            milestones.append(Milestone(node, self.interner))
 
         milestones.sort()
         milestones.reverse()
-        self.cache['milestones'] = milestones
-        return self.cache['milestones']
+        return milestones
 
     @property
     def late_milestones(self):
-        '''Array of all late milestones'''
-        return [m for m in self.milestones if m.is_late]
+        '''Array of all late milestones. Without the full list of milestones
+           cached, only the late ones are fetched.'''
+        milestones = self.cache['milestones'] or self._collection(
+            'late_milestones', self._load_late_milestones)
+        return [m for m in milestones if m.is_late]
+
+    def _load_late_milestones(self):
+        return self._parse_milestones(self.bc.list_milestones(self.id, find='late'))
 
     @property
     def upcoming_milestones(self):
@@ -194,14 +453,34 @@ class Project(BasecampObject):
 
     @property
     def todo_lists(self):
-        if self.cache['todo_lists']: return self.cache['todo_lists']
-        todo_lists_xml = self.bc.todo_lists(self.id)
+        return self._collection('todo_lists', self._load_todo_lists)
+
+    def _load_todo_lists(self):
+        return self._parse_todo_lists(self.bc.todo_lists(self.id))
+
+    def _parse_todo_lists(self, todo_lists_xml):
         todo_lists = {}
-        for node in ET.fromstring(todo_lists_xml).findall("todo-list"):
-            the_list = ToDoList(node)
+        for node in self._records(todo_lists_xml, "todo-list"):
+            the_list = ToDoList(node, self.interner)
             todo_lists[the_list.name] = the_list
-        self.cache['todo_lists'] = todo_lists
-        return self.cache['todo_lists']
+        return todo_lists
+
+    @property
+    def todo_items(self):
+        '''Array of the items on every todo list. Basecamp only lists items
+           per list, so this costs a request for each list.'''
+        return self._collection('todo_items', self._load_todo_items)
+
+    def _load_todo_items(self):
+        return self._parse_todo_items([self.bc.todo_list(tdlist.id)
+                                       for tdlist in self.todo_lists.values()])
+
+    def _parse_todo_items(self, todo_list_documents):
+        todo_items = []
+        for records in self._records_each(todo_list_documents, "todo-items/todo-item"):
+            for node in records:
+                todo_items.append(ToDoItem(node, self.interner))
+        return todo_items
 
     @property
     def backlogs(self):
@@ -212,10 +491,24 @@ class Project(BasecampObject):
 
         return backlogs
 
+    @property
+    def uncompleted_todo_lists(self):
+        '''Dictionary of the todo lists with items left to do. Without the
+           full set of lists cached, only these are fetched.'''
+        todo_lists = self.cache['todo_lists'] or self._collection(
+            'uncompleted_todo_lists', self._load_uncompleted_todo_lists)
+        return dict((name, tdlist) for name, tdlist in todo_lists.items()
+                    if not tdlist.is_complete)
+
+    def _load_uncompleted_todo_lists(self):
+        return self._parse_todo_lists(self.bc.todo_lists(self.id, complete=False))
+
     @property
     def backlogged_count(self):
+        # Completed backlogs have nothing left in them.
         backlogged = 0
-        for alist in self.backlogs.values(): backlogged += alist.uncompleted_count
+        for alist in self.uncompleted_todo_lists.values():
+            if alist.is_backlog: backlogged += alist.uncompleted_count
         return backlogged
 
     @property
@@ -226,7 +519,7 @@ class Project(BasecampObject):
 
     @property
     def current_sprint(self):
-        unfinished_sprints = [ tdlist for tdlist in self.sprints if not tdlist.is_complete ]
+        unfinished_sprints = [ tdlist for tdlist in self.uncompleted_todo_lists.values() if tdlist.is_sprint ]
         unfinished_sprints.sort()
         try:
             return unfinished_sprints[0]
@@ -235,12 +528,23 @@ class Project(BasecampObject):
 
     @property
     def upcoming_sprints(self):
-        return [ sprint for sprint in self.sprints if not sprint.is_complete and sprint.sprint_number > self.current_sprint.sprint_number ]
+        unfinished_sprints = [ tdlist for tdlist in self.uncompleted_todo_lists.values() if tdlist.is_sprint ]
+        unfinished_sprints.sort()
+        return [ sprint for sprint in unfinished_sprints if sprint.sprint_number > self.current_sprint.sprint_number ]
+
+def message_category_id(message):
+    '''Category id of a message, whether Basecamp gave it as category-id or
+       as a nested category.'''
+    category_id = getattr(message, 'category_id', None)
+    if category_id is None:
+        category = getattr(message, 'category', None)
+        if hasattr(category, 'get'): category_id = category.get('id')
+    return category_id
 
 class ToDoList(BasecampObject):
     '''Represents a ToDo list in Basecamp'''
-    def __init__(self, node):
-        self.set_initial_values(node)
+    def __init__(self, node, interner=None):
+        self.set_initial_values(node, interner)
         self._extra_attributes = ['is_complete', 'is_sprint', 'is_backlog']
 
     @property
@@ -257,7 +561,7 @@ class ToDoList(BasecampObject):
         if 'backlog' in self.name.lower(): return True
         return False
 
-    sprint_number_pattern = re.compile('(Sprint|sprint) (?P<sprint_number>[\d+])')
+    sprint_number_pattern = re.compile('(Sprint|sprint) (?P<sprint_number>\d+)')
     @property
     def sprint_number(self):
         result = self.sprint_number_pattern.search(self.name)
@@ -268,10 +572,15 @@ class ToDoList(BasecampObject):
             return cmp(self.sprint_number, other.sprint_number)
         return cmp(self.name, other.name)
 
+class ToDoItem(BasecampObject):
+    '''Represents an item on a ToDo list in Basecamp'''
+    def __init__(self, node, interner=None):
+        self.set_initial_values(node, interner)
+
 class Milestone(BasecampObject):
     '''Represents a milestone in Basecamp'''
-    def __init__(self, node):
-        self.set_initial_values(node)
+    def __init__(self, node, interner=None):
+        self.set_initial_values(node, interner)
         self._extra_attributes = ['is_previous', 'is_upcoming', 'is_late']
 
     def __cmp__(self, other):
@@ -295,8 +604,8 @@ class Milestone(BasecampObject):
 
 class Comment(BasecampObject):
     '''Represents a comment on a message in Basecamp'''
-    def __init__(self, node):
-        self.set_initial_values(node)
+    def __init__(self, node, interner=None):
+        self.set_initial_values(node, interner)
 
     def __cmp__(self, other):
         value = cmp(self.posted_on, other.posted_on)
@@ -304,19 +613,19 @@ class Comment(BasecampObject):
 
 class Message(BasecampObject):
     '''Represents a Message in Basecamp'''
-    def __init__(self, message_element):
+    def __init__(self, message_element, interner=None):
         super(BasecampObject, self).__init__()
-        self.set_initial_values(message_element)
+        self.set_initial_values(message_element, interner)
 
 class TimeEntry(BasecampObject):
     '''Represents an Time Entry in Basecamp'''
-    def __init__(self, node):
-        self.set_initial_values(node)
+    def __init__(self, node, interner=None):
+        self.set_initial_values(node, interner)
 
 class Person(BasecampObject):
     '''Represents a Person in Basecamp'''
-    def __init__(self, node):
-        self.set_initial_values(node)
+    def __init__(self, node, interner=None):
+        self.set_initial_values(node, interner)
 
 if __name__ == "__main__":
     from basecampreporting.tests import *
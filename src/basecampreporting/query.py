@@ -0,0 +1,210 @@
+"""Indexed queries over a project's parsed records.
+
+    recent = p.query('messages').where({'category.id': 7}, author_id=42) \\
+              .between('posted_on', low=since).order_by('posted_on', descending=True) \\
+              .limit(10).all()
+    logged = p.query('time_entries').where(todo_item_id=123).all()
+
+Indexes are built on first use and kept per collection: a hash index (value
+-> record positions) for each field used in where(), and a sorted index for
+each field used in between() or order_by(). Equality matches intersect the
+smallest hash buckets first, ranges are found by bisection, and an ordered
+query without other filters walks the sorted index and stops at the limit,
+so repeated filtered views of a large project cost little more than the
+size of their result. Dotted field names reach into nested values, such as
+a message's category.
+
+An index belongs to the collection object it was built from. When the
+project's cache is refreshed or cleared the next query sees a different
+object and starts a new index.
+"""
+
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import chain, ifilter, islice
+
+
+def field_value(record, field):
+    '''Value of field on record, following dotted names through nested
+       records and dictionaries; None when any part is missing.'''
+    value = record
+    for name in field.split('.'):
+        if value is None: return None
+        if hasattr(value, 'keys'): value = value.get(name)
+        else: value = getattr(value, name, None)
+    return value
+
+
+class RecordIndex(object):
+    '''Lazily built indexes over the records of one collection, which may
+       be a list or a dictionary of records.'''
+    def __init__(self, collection):
+        self.source = collection
+        if hasattr(collection, 'values'):
+            self.records = collection.values()
+        else:
+            self.records = list(collection)
+        self.hashes = {}
+        self.sorted = {}
+        self.lock = threading.Lock()
+
+    def hash_index(self, field):
+        index = self.hashes.get(field)
+        if index is None:
+            self.lock.acquire()
+            try:
+                index = self.hashes.get(field)
+                if index is None:
+                    index = {}
+                    for position, record in enumerate(self.records):
+                        index.setdefault(field_value(record, field), []).append(position)
+                    self.hashes[field] = index
+            finally:
+                self.lock.release()
+        return index
+
+    def sorted_index(self, field):
+        '''(values, positions, missing): parallel lists sorted by value, and
+           the positions of records without a value.'''
+        index = self.sorted.get(field)
+        if index is None:
+            self.lock.acquire()
+            try:
+                index = self.sorted.get(field)
+                if index is None:
+                    pairs, missing = [], []
+                    for position, record in enumerate(self.records):
+                        value = field_value(record, field)
+                        if value is None: missing.append(position)
+                        else: pairs.append((value, position))
+                    pairs.sort()
+                    index = ([value for value, position in pairs],
+                             [position for value, position in pairs], missing)
+                    self.sorted[field] = index
+            finally:
+                self.lock.release()
+        return index
+
+    def lookup(self, field, value):
+        index = self.hash_index(field)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            positions = []
+            for v in value:
+                positions.extend(index.get(v, ()))
+            return positions
+        return index.get(value, [])
+
+    def range(self, field, low=None, high=None):
+        '''Positions of records with low <= value <= high, in value order.'''
+        values, positions, missing = self.sorted_index(field)
+        start, end = 0, len(values)
+        if low is not None: start = bisect_left(values, low)
+        if high is not None: end = bisect_right(values, high)
+        return positions[start:end]
+
+
+class Query(object):
+    '''An immutable description of a filtered, ordered view; each method
+       returns a new Query.'''
+    def __init__(self, index, equals=(), ranges=(), predicates=(), order=None,
+                 count=None):
+        self.index = index
+        self.equals = tuple(equals)
+        self.ranges = tuple(ranges)
+        self.predicates = tuple(predicates)
+        self.order = order
+        self.count = count
+
+    def _copy(self, **changes):
+        state = dict(equals=self.equals, ranges=self.ranges,
+                     predicates=self.predicates, order=self.order,
+                     count=self.count)
+        state.update(changes)
+        return Query(self.index, **state)
+
+    def where(self, fields=None, **more_fields):
+        '''Records whose fields equal the given values, passed as a
+           dictionary (needed for dotted names) and/or keywords. A list,
+           tuple or set value matches any of its members.'''
+        fields = dict(fields or {}, **more_fields)
+        return self._copy(equals=self.equals + tuple(sorted(fields.items())))
+
+    def between(self, field, low=None, high=None):
+        '''Records with low <= field <= high; either bound may be left out.'''
+        return self._copy(ranges=self.ranges + ((field, low, high),))
+
+    def filter(self, predicate):
+        '''Records for which predicate(record) is true, checked after the
+           indexed conditions.'''
+        return self._copy(predicates=self.predicates + (predicate,))
+
+    def order_by(self, field, descending=False):
+        '''Orders by field; records without a value come last.'''
+        return self._copy(order=(field, descending))
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    def _candidates(self):
+        '''Set of positions matching the indexed conditions, or None for
+           every record.'''
+        matches = [self.index.lookup(field, value) for field, value in self.equals]
+        matches += [self.index.range(*r) for r in self.ranges]
+        if not matches: return None
+        matches.sort(key=len)
+        candidates = set(matches[0])
+        for positions in matches[1:]:
+            if not candidates: break
+            candidates.intersection_update(positions)
+        return candidates
+
+    def _positions(self):
+        candidates = self._candidates()
+        if self.order is None:
+            if candidates is None: return xrange(len(self.index.records))
+            return sorted(candidates)
+
+        field, descending = self.order
+        values, positions, missing = self.index.sorted_index(field)
+        if candidates is None or len(candidates) * 4 > len(positions):
+            # Walk the sorted index, which lets a limit stop early.
+            ordered = descending and reversed(positions) or iter(positions)
+            if candidates is None:
+                return chain(ordered, missing)
+            return (p for p in chain(ordered, missing) if p in candidates)
+
+        records = self.index.records
+        present, absent = [], []
+        for p in candidates:
+            value = field_value(records[p], field)
+            if value is None: absent.append(p)
+            else: present.append((value, p))
+        absent.sort()
+        if self.count is not None and not self.predicates:
+            pick = descending and heapq.nlargest or heapq.nsmallest
+            present = pick(self.count, present)
+        else:
+            present.sort(reverse=descending)
+        return [p for value, p in present] + absent
+
+    def __iter__(self):
+        records = self.index.records
+        matches = (records[p] for p in self._positions())
+        for predicate in self.predicates:
+            matches = ifilter(predicate, matches)
+        if self.count is not None:
+            matches = islice(matches, self.count)
+        return matches
+
+    def all(self):
+        # Not list(self), which would ask __len__ for a size hint.
+        return list(self.__iter__())
+
+    def first(self):
+        for record in self.limit(1):
+            return record
+        return None
+
+    def __len__(self):
+        return len(self.all())
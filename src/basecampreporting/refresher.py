@@ -0,0 +1,324 @@
+"""Keeps a set of projects warm in the background and serves their to_json()
+snapshots over local HTTP, so web requests never wait on Basecamp.
+
+    basecamp-refresher -u USER -p PASS --port 8765 URL all
+
+    GET /projects                 index of snapshots (id, etag, age, errors)
+    GET /projects/<id>.json       the latest Project.to_json() for <id>
+
+Each project is refreshed every `interval` seconds, randomly stretched or
+shortened by up to `jitter` of the interval so the projects drift apart
+instead of all hitting Basecamp at once. Every refresh builds a new Project
+and publishes its JSON as an immutable Snapshot, so readers always get a
+complete document. Snapshots are served stale-while-revalidate: one older
+than max_age is still returned immediately (with a Warning header) while a
+refresh is queued in the background. Until a project's first snapshot exists
+the endpoint answers 503 with Retry-After rather than blocking.
+"""
+
+import hashlib
+import heapq
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+import BaseHTTPServer
+import SocketServer
+from optparse import OptionParser
+
+from basecampreporting.serialization import json
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.connection import ConnectionPool
+from basecampreporting.parser import Interner
+from basecampreporting.project import Project
+from basecampreporting import tracing
+
+DEFAULT_INTERVAL = 300
+DEFAULT_JITTER = 0.2
+DEFAULT_WORKERS = 4
+MAX_RETRY_DELAY = 300
+
+
+class Snapshot(object):
+    '''An immutable, fully rendered copy of one project's to_json().'''
+    __slots__ = ('project_id', 'json', 'etag', 'fetched_at', 'duration')
+
+    def __init__(self, project_id, json, fetched_at, duration):
+        object.__setattr__(self, 'project_id', project_id)
+        object.__setattr__(self, 'json', json)
+        object.__setattr__(self, 'etag', '"%s"' % hashlib.md5(json).hexdigest())
+        object.__setattr__(self, 'fetched_at', fetched_at)
+        object.__setattr__(self, 'duration', duration)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is immutable")
+
+    def age(self, now=None):
+        return (now or time.time()) - self.fetched_at
+
+
+class Refresher(object):
+    '''Refreshes projects on a jittered schedule using a few worker threads.
+       project_factory(project_id) must return a new, cold Project.'''
+    def __init__(self, project_ids, project_factory, interval=DEFAULT_INTERVAL,
+                 jitter=DEFAULT_JITTER, workers=DEFAULT_WORKERS, max_age=None,
+                 changes=None):
+        '''changes, a changes.ChangeStream, is updated with every refreshed
+           project so its subscribers hear about what changed.'''
+        self.project_ids = list(project_ids)
+        self.project_factory = project_factory
+        self.interval = interval
+        self.jitter = jitter
+        self.workers = workers
+        self.max_age = max_age or interval
+        self.changes = changes
+        self.random = random.Random()
+
+        self.snapshots = {}
+        self.errors = {}
+        self.failures = {}
+        self.condition = threading.Condition()
+        self.schedule = []      # heap of (due, project_id)
+        self.due = {}           # project_id -> its current schedule entry
+        self.queued = set()     # projects that are due or being refreshed
+        self.ready = []         # due projects waiting for a worker
+        self.threads = []
+        self.running = False
+
+    def get(self, project_id):
+        return self.snapshots.get(project_id)
+
+    def next_delay(self, project_id):
+        failures = self.failures.get(project_id, 0)
+        if failures:
+            return min(MAX_RETRY_DELAY, self.interval, 5 * 2 ** failures)
+        spread = self.interval * self.jitter
+        return self.interval + self.random.uniform(-spread, spread)
+
+    def start(self):
+        now = time.time()
+        self.condition.acquire()
+        try:
+            self.running = True
+            # Spread the first load over the jitter window as well.
+            for project_id in self.project_ids:
+                delay = self.random.uniform(0, self.interval * self.jitter)
+                self._schedule(project_id, now + delay)
+        finally:
+            self.condition.release()
+        for target in [self._schedule_loop] + [self._work_loop] * self.workers:
+            thread = threading.Thread(target=target)
+            thread.setDaemon(True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.condition.acquire()
+        try:
+            self.running = False
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def request_refresh(self, project_id):
+        '''Queues an immediate refresh unless one is already pending.'''
+        self.condition.acquire()
+        try:
+            if project_id in self.queued: return False
+            self.queued.add(project_id)
+            self.ready.append(project_id)
+            self.condition.notifyAll()
+            return True
+        finally:
+            self.condition.release()
+
+    def refresh(self, project_id):
+        '''Fetches one project and publishes its snapshot.'''
+        started = time.time()
+        p = self.project_factory(project_id)
+        snapshot = Snapshot(project_id, p.to_json(), time.time(), time.time() - started)
+        self.snapshots[project_id] = snapshot
+        if self.changes is not None:
+            self.changes.update(p)
+        return snapshot
+
+    def _schedule(self, project_id, due):
+        # Called with the condition held. Entries superseded by a later
+        # _schedule call are skipped when they come due.
+        self.due[project_id] = due
+        heapq.heappush(self.schedule, (due, project_id))
+
+    def _schedule_loop(self):
+        self.condition.acquire()
+        try:
+            while self.running:
+                now = time.time()
+                while self.schedule and self.schedule[0][0] <= now:
+                    due, project_id = heapq.heappop(self.schedule)
+                    if self.due.get(project_id) != due: continue
+                    if project_id not in self.queued:
+                        self.queued.add(project_id)
+                        self.ready.append(project_id)
+                        self.condition.notifyAll()
+                timeout = None
+                if self.schedule: timeout = max(0.0, self.schedule[0][0] - now)
+                self.condition.wait(timeout)
+        finally:
+            self.condition.release()
+
+    def _work_loop(self):
+        while True:
+            self.condition.acquire()
+            try:
+                while self.running and not self.ready:
+                    self.condition.wait()
+                if not self.running: return
+                project_id = self.ready.pop(0)
+            finally:
+                self.condition.release()
+
+            try:
+                self.refresh(project_id)
+                self.failures.pop(project_id, None)
+                self.errors.pop(project_id, None)
+            except Exception:
+                self.failures[project_id] = self.failures.get(project_id, 0) + 1
+                self.errors[project_id] = traceback.format_exc().splitlines()[-1]
+
+            self.condition.acquire()
+            try:
+                self.queued.discard(project_id)
+                self._schedule(project_id, time.time() + self.next_delay(project_id))
+                self.condition.notifyAll()
+            finally:
+                self.condition.release()
+
+
+class SnapshotRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    project_path = re.compile(r'^/projects/(\d+)(\.json)?$')
+
+    def do_GET(self):
+        refresher = self.server.refresher
+        path = self.path.split('?', 1)[0]
+        if path in ('/projects', '/projects/', '/projects.json'):
+            return self.send_index()
+        match = self.project_path.match(path)
+        if not match:
+            return self.send_body(404, '{"error": "not found"}')
+        project_id = int(match.group(1))
+        if project_id not in refresher.project_ids:
+            return self.send_body(404, '{"error": "unknown project"}')
+
+        snapshot = refresher.get(project_id)
+        if snapshot is None:
+            refresher.request_refresh(project_id)
+            return self.send_body(503, '{"error": "not loaded yet"}',
+                                  [('Retry-After', '1')])
+
+        age = snapshot.age()
+        headers = [('ETag', snapshot.etag), ('Age', str(int(age))),
+                   ('Cache-Control', 'max-age=%d, stale-while-revalidate=%d'
+                    % (refresher.max_age, refresher.interval))]
+        if age > refresher.max_age:
+            refresher.request_refresh(project_id)
+            headers.append(('Warning', '110 - "Response is Stale"'))
+        if self.headers.getheader('if-none-match') == snapshot.etag:
+            return self.send_body(304, '', headers)
+        self.send_body(200, snapshot.json, headers)
+
+    def send_index(self):
+        refresher = self.server.refresher
+        now = time.time()
+        index = []
+        for project_id in refresher.project_ids:
+            snapshot = refresher.get(project_id)
+            index.append(dict(id=project_id,
+                              etag=snapshot and snapshot.etag,
+                              age=snapshot and snapshot.age(now),
+                              error=refresher.errors.get(project_id)))
+        self.send_body(200, json.dumps(index))
+
+    def send_body(self, code, body, headers=()):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if code != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class SnapshotServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, refresher, host='127.0.0.1', port=0, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), SnapshotRequestHandler)
+        self.refresher = refresher
+        self.verbose = verbose
+        self.url = 'http://%s:%s' % self.server_address
+
+
+def main(argv=None):
+    from basecampreporting.dashboard import account_project_ids
+
+    tracing.enable_from_environment()
+
+    parser = OptionParser(usage="%prog [options] ACCOUNT_URL (all | PROJECT_ID...)")
+    parser.add_option("-u", "--username", default=os.environ.get('BASECAMP_USERNAME'))
+    parser.add_option("-p", "--password", default=os.environ.get('BASECAMP_PASSWORD'))
+    parser.add_option("--interval", type="float", default=DEFAULT_INTERVAL,
+                      help="seconds between refreshes of a project [%default]")
+    parser.add_option("--jitter", type="float", default=DEFAULT_JITTER,
+                      help="fraction of the interval to randomise by [%default]")
+    parser.add_option("--max-age", type="float",
+                      help="seconds before a snapshot is served as stale [interval]")
+    parser.add_option("-w", "--workers", type="int", default=DEFAULT_WORKERS)
+    parser.add_option("--host", default='127.0.0.1')
+    parser.add_option("--port", type="int", default=8765)
+    parser.add_option("-v", "--verbose", action="store_true", default=False)
+    options, args = parser.parse_args(argv)
+    if len(args) < 2:
+        parser.error("an account URL and at least one project id (or 'all') are required")
+
+    url = args[0]
+    pool = ConnectionPool(maxsize=options.workers)
+    bc = Basecamp(url, options.username, options.password, pool=pool)
+    if args[1:] == ['all']:
+        project_ids = account_project_ids(bc, ['active'])
+    else:
+        project_ids = [int(i) for i in args[1:]]
+    people_cache = {}
+    interner = Interner()
+
+    def project_factory(project_id):
+        return Project(url, project_id, None, None, basecamp=bc,
+                       people_cache=people_cache, interner=interner)
+
+    refresher = Refresher(project_ids, project_factory, options.interval,
+                          options.jitter, options.workers, options.max_age)
+    refresher.start()
+    server = SnapshotServer(refresher, options.host, options.port, options.verbose)
+    print "Serving %s projects at %s" % (len(project_ids), server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    refresher.stop()
+    pool.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,10 @@
 """Silly command line dump of the status of a project, provided as a sample of how you might use the module."""
 
 from project import Project
+from basecampreporting import tracing
 
 def main(url, project_id, username, password):
+    tracing.enable_from_environment()
     p = Project(url, project_id, username, password)
 
     try:
@@ -11,57 +13,47 @@ def main(url, project_id, username, password):
         print "Couldn't access %s/projects/%s/project/log/ -- does the user %s have access?" % (url, project_id, username)
         return None
 
-    try:
-        previous_milestone = p.previous_milestones[0]
-        previous_milestone_completed = "Progress"
-        if previous_milestone.completed: previous_milestone_completed = "Complete"
-    except IndexError:
-        previous_milestone = None
-
-    try:
-        next_milestone = p.upcoming_milestones[0]
-    except IndexError:
-        next_milestone = None
-
-    try:
-        last_message = p.messages[0]
-    except IndexError:
-        last_message = None
+    report(p)
 
-    try:
-        last_comment = p.comments[0]
-        last_communique = last_comment
-        if last_message and last_message.posted_on > last_comment.posted_on:
-            last_communique = last_comment
-    except IndexError:
-        last_comment = None
-        last_communique = None
-
-    backlog_count = len(p.backlogs.keys())
+def report(p):
+    for line in format_status(project_status(p)):
+        print line
 
-    late_milestones = p.late_milestones
+def project_status(p):
+    '''Collects the values the report shows into a plain dictionary, so it
+       can be rendered as text or serialized.'''
+    return p.summary.to_dict()
 
-    if p.current_sprint:
-        print "%s -- %s" % (p.name, p.current_sprint.name)
+def format_status(status):
+    '''Renders a project_status dictionary as the lines of the report.'''
+    lines = []
+    if status['current_sprint']:
+        lines.append("%s -- %s" % (status['name'], status['current_sprint']))
     else:
-        print p.name
+        lines.append(status['name'])
 
+    previous_milestone = status['previous_milestone']
     if previous_milestone:
-        print "Prev milestone: %s (%s)" % (previous_milestone.title, previous_milestone_completed)
+        lines.append("Prev milestone: %s (%s)" % (previous_milestone['title'], previous_milestone['status']))
 
+    next_milestone = status['next_milestone']
     if next_milestone:
-        print "Next milestone: %s on %s" % (next_milestone.title, next_milestone.deadline)
+        lines.append("Next milestone: %s on %s" % (next_milestone['title'], next_milestone['deadline']))
 
     if not next_milestone:
-        print "No new milestones planned"
-
-    if len(late_milestones):
-        print "Late milestones: %s" % (len(late_milestones))
-
-    if last_communique:
-        print "Last message/comment: %s" % (last_communique.posted_on)
-
-    print "%s items in %s backlogs" % (p.backlogged_count, backlog_count)
-    print "%s upcoming sprints planned" % (len(p.upcoming_sprints))
-    print "Last changed at: %s" % (p.last_changed_on)
-    print ""
\ No newline at end of file
+        lines.append("No new milestones planned")
+
+    if status['late_milestones']:
+        lines.append("Late milestones: %s" % (status['late_milestones']))
+
+    if status['last_communique']:
+        if status['last_author']:
+            lines.append("Last message/comment: %s by %s" % (status['last_communique'], status['last_author']))
+        else:
+            lines.append("Last message/comment: %s" % (status['last_communique']))
+
+    lines.append("%s items in %s backlogs" % (status['backlogged_count'], status['backlog_count']))
+    lines.append("%s upcoming sprints planned" % (status['upcoming_sprints']))
+    lines.append("Last changed at: %s" % (status['last_changed_on']))
+    lines.append("")
+    return lines
@@ -0,0 +1,270 @@
+"""Rate-limit-aware request scheduling for Basecamp.
+
+Basecamp throttles clients that send too much too fast, answering 503 with
+a Retry-After header. A RequestScheduler sits between Basecamp._request and
+the network and:
+
+* meters requests through a token bucket per account. The bucket can have a
+  fixed rate, or start unlimited and adapt: it halves the rate it was
+  achieving whenever Basecamp throttles, then creeps back up on success;
+* caps the number of requests in flight per account, with separate FIFO
+  queues for reads and writes that are served in turn, so a burst of report
+  reads can't starve writes (or the other way round);
+* retries failed requests with exponential backoff and full jitter,
+  honouring Retry-After. Reads are retried on throttling, 5xx responses and
+  network errors. Writes are only retried when Basecamp says it did not
+  process them (503 and 429), so they are never applied twice.
+
+    scheduler = RequestScheduler(max_in_flight=8)
+    bc = Basecamp(url, username, password, scheduler=scheduler)
+
+One scheduler may be shared by several Basecamp instances; accounts are told
+apart by their base URL.
+"""
+
+import email.utils
+import httplib
+import random
+import re
+import socket
+import threading
+import time
+import urllib2
+from collections import deque
+
+from basecampreporting import deadlines
+from basecampreporting.deadlines import DeadlineExceeded
+
+READ = 'read'
+WRITE = 'write'
+
+write_pattern = re.compile(r'/(create|update|delete|complete|uncomplete|move)')
+def request_kind(path):
+    '''Basecamp sends most reads as POSTs, so requests are told apart by the
+       action in their path rather than by HTTP method.'''
+    if write_pattern.search(path): return WRITE
+    return READ
+
+
+class TokenBucket(object):
+    '''Token bucket limiter. rate is in requests per second; None means
+       unlimited until the first throttle when adaptive is set.'''
+    def __init__(self, rate=None, burst=None, adaptive=True, min_rate=0.2,
+                 max_rate=None, increase=0.05):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.adaptive = adaptive
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.increase = increase
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.paused_until = 0.0
+        self.recent = deque(maxlen=50)
+        self.lock = threading.Lock()
+
+    def take(self):
+        '''Blocks until a request may be sent.'''
+        while True:
+            self.lock.acquire()
+            try:
+                now = time.time()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate is None:
+                    self.recent.append(now)
+                    return
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.recent.append(now)
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            finally:
+                self.lock.release()
+            time.sleep(wait)
+
+    def measured_rate(self):
+        if len(self.recent) < 2: return None
+        elapsed = self.recent[-1] - self.recent[0]
+        if elapsed <= 0: return None
+        return (len(self.recent) - 1) / elapsed
+
+    def throttled(self, retry_after=None):
+        '''Basecamp pushed back: stop sending until retry_after seconds have
+           passed and, when adaptive, halve the rate.'''
+        self.lock.acquire()
+        try:
+            if retry_after is None: retry_after = 1.0
+            self.paused_until = max(self.paused_until, time.time() + retry_after)
+            current = self.rate or self.measured_rate()
+            # Without a known rate there is nothing to halve yet; the pause
+            # alone applies until enough requests have been measured.
+            if self.adaptive and current is not None:
+                self.rate = max(self.min_rate, current / 2.0)
+                self.burst = max(1.0, min(self.burst, self.rate))
+                self.tokens = 0.0
+                self.updated = self.paused_until
+        finally:
+            self.lock.release()
+
+    def succeeded(self):
+        if not self.adaptive or self.rate is None: return
+        self.lock.acquire()
+        try:
+            self.rate += self.increase
+            if self.max_rate is not None: self.rate = min(self.rate, self.max_rate)
+            self.burst = max(self.burst, self.rate)
+        finally:
+            self.lock.release()
+
+
+class RetryPolicy(object):
+    '''Decides which failures to retry and how long to wait before doing so.'''
+    throttle_statuses = (429, 503)
+    server_error_statuses = (500, 502, 504)
+
+    def __init__(self, max_retries=4, base_delay=0.5, max_delay=30.0, random=random):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random = random
+
+    def is_throttle(self, exc):
+        return isinstance(exc, urllib2.HTTPError) and exc.code in self.throttle_statuses
+
+    def should_retry(self, exc, kind):
+        if isinstance(exc, urllib2.HTTPError):
+            if exc.code in self.throttle_statuses: return True
+            return kind == READ and exc.code in self.server_error_statuses
+        if isinstance(exc, (urllib2.URLError, socket.error, httplib.HTTPException)):
+            return kind == READ
+        return False
+
+    def retry_after(self, exc):
+        '''Seconds to wait according to the response's Retry-After header,
+           which may be a number of seconds or an HTTP date.'''
+        if not isinstance(exc, urllib2.HTTPError) or exc.hdrs is None: return None
+        value = exc.hdrs.get('Retry-After')
+        if not value: return None
+        value = value.strip()
+        if value.isdigit(): return float(value)
+        parsed = email.utils.parsedate_tz(value)
+        if parsed is None: return None
+        return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+    def delay(self, attempt, retry_after=None):
+        '''Exponential backoff with full jitter, but never sooner than the
+           server asked for.'''
+        if retry_after is not None:
+            return retry_after + self.random.uniform(0, self.base_delay)
+        return self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class AccountState(object):
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.queues = {READ: deque(), WRITE: deque()}
+        self.in_flight = {READ: 0, WRITE: 0}
+        self.turn = WRITE
+
+
+class RequestScheduler(object):
+    '''Queues, meters and retries requests for one or more accounts.'''
+    def __init__(self, rate=None, burst=None, adaptive=True, max_in_flight=None,
+                 max_reads_in_flight=None, max_writes_in_flight=None, retry=None):
+        self.rate = rate
+        self.burst = burst
+        self.adaptive = adaptive
+        self.max_in_flight = max_in_flight
+        self.limits = {READ: max_reads_in_flight, WRITE: max_writes_in_flight}
+        self.retry = retry or RetryPolicy()
+        self.condition = threading.Condition()
+        self.accounts = {}
+
+    def account(self, name):
+        self.condition.acquire()
+        try:
+            state = self.accounts.get(name)
+            if state is None:
+                bucket = TokenBucket(self.rate, self.burst, self.adaptive)
+                state = self.accounts[name] = AccountState(bucket)
+            return state
+        finally:
+            self.condition.release()
+
+    def _grantable(self, state, kind, ticket):
+        if state.queues[kind][0] is not ticket: return False
+        total = state.in_flight[READ] + state.in_flight[WRITE]
+        if self.max_in_flight is not None and total >= self.max_in_flight: return False
+        limit = self.limits[kind]
+        if limit is not None and state.in_flight[kind] >= limit: return False
+        # Alternate between the queues while both have requests waiting.
+        other = kind == READ and WRITE or READ
+        if state.queues[other] and state.turn == other:
+            limit = self.limits[other]
+            if limit is None or state.in_flight[other] < limit: return False
+        return True
+
+    def _acquire(self, state, kind, deadline=None):
+        ticket = object()
+        self.condition.acquire()
+        try:
+            state.queues[kind].append(ticket)
+            while not self._grantable(state, kind, ticket):
+                if deadline is None:
+                    self.condition.wait()
+                    continue
+                if deadline.expired():
+                    state.queues[kind].remove(ticket)
+                    self.condition.notifyAll()
+                    deadline.check('waiting for a request slot')
+                self.condition.wait(deadline.remaining())
+            state.queues[kind].popleft()
+            state.in_flight[kind] += 1
+            state.turn = kind == READ and WRITE or READ
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def _release(self, state, kind):
+        self.condition.acquire()
+        try:
+            state.in_flight[kind] -= 1
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def call(self, account, kind, func, event=None):
+        '''Runs func() for the account once a slot and a token are free,
+           retrying according to the retry policy. The number of retries is
+           recorded on the instrumentation event, when there is one. Under a
+           deadline, no retry is started that would begin after it.'''
+        state = self.account(account)
+        deadline = deadlines.current()
+        attempt = 0
+        while True:
+            self._acquire(state, kind, deadline)
+            try:
+                state.bucket.take()
+                try:
+                    result = func()
+                except Exception, e:
+                    retry_after = self.retry.retry_after(e)
+                    if self.retry.is_throttle(e):
+                        state.bucket.throttled(retry_after)
+                    if attempt >= self.retry.max_retries or not self.retry.should_retry(e, kind):
+                        raise
+                    delay = self.retry.delay(attempt, retry_after)
+                    if deadline is not None and delay >= deadline.remaining():
+                        raise DeadlineExceeded("no time left to retry %s" % e)
+                else:
+                    state.bucket.succeeded()
+                    return result
+            finally:
+                self._release(state, kind)
+            attempt += 1
+            if event is not None: event.retries = attempt
+            time.sleep(delay)
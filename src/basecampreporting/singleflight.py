@@ -0,0 +1,65 @@
+"""Coalescing of identical concurrent calls.
+
+When several threads ask for the same thing at once, only the first one
+does the work; the others wait for it and share its result (or exception):
+
+    flights = SingleFlight()
+    xml = flights.do(('/projects/1/msg/archive', body), fetch)
+
+Nothing is cached: once the call finishes the key is forgotten, and the next
+caller starts a new one.
+"""
+
+import sys
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.shared = 0     # calls answered by another caller's work
+
+    def do(self, key, func):
+        '''Returns func(), or the result of the identical call already in
+           flight for key.'''
+        self.lock.acquire()
+        call = self.calls.get(key)
+        if call is not None:
+            call.waiters += 1
+            self.shared += 1
+            self.lock.release()
+            call.done.wait()
+            if call.exc_info is not None:
+                raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+            return call.result
+
+        call = self.calls[key] = _Call()
+        self.lock.release()
+        try:
+            try:
+                call.result = func()
+            except:
+                call.exc_info = sys.exc_info()
+                raise
+            return call.result
+        finally:
+            self.lock.acquire()
+            del self.calls[key]
+            self.lock.release()
+            call.done.set()
+
+    def in_flight(self):
+        self.lock.acquire()
+        try:
+            return len(self.calls)
+        finally:
+            self.lock.release()
@@ -0,0 +1,92 @@
+"""The dozen values a status report shows for a project, computed together.
+
+Project properties such as previous_milestones, upcoming_milestones,
+late_milestones, current_sprint and backlogged_count each filter (and often
+sort) the cached collections again. ProjectSummary walks each collection
+once, using a single notion of today, and keeps the result as a plain
+dictionary ready to render or serialize:
+
+    summary = p.summary
+    print summary.name, summary.late_milestones
+    json.dumps(summary.to_dict(), cls=BasecampObjectEncoder)
+
+Project.summary caches it until one of the collections it was computed from
+is replaced (by a refresh or clear_cache).
+"""
+
+import datetime
+
+FIELDS = ('id', 'name', 'previous_milestone', 'next_milestone',
+          'last_communique', 'last_author', 'current_sprint',
+          'upcoming_sprints', 'late_milestones', 'backlog_count',
+          'backlogged_count', 'last_changed_on')
+
+
+class ProjectSummary(object):
+    '''Summary values of one project; see FIELDS. previous_milestone and
+       next_milestone are dictionaries (or None), the counts are integers.'''
+    __slots__ = FIELDS
+
+    def __init__(self, **values):
+        for field in FIELDS:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def from_project(cls, p, today=None):
+        today = today or datetime.date.today()
+        summary = cls(id=p.id, name=p.name, late_milestones=0,
+                      upcoming_sprints=0, backlog_count=0, backlogged_count=0)
+
+        # Milestones: the latest one behind today, the earliest one ahead,
+        # and how many behind it are unfinished. The first of equal
+        # deadlines wins, as with the properties.
+        previous = upcoming = None
+        for m in p.milestones:
+            if m.deadline < today:
+                if previous is None or m.deadline > previous.deadline: previous = m
+                if not m.completed: summary.late_milestones += 1
+            elif upcoming is None or m.deadline < upcoming.deadline:
+                upcoming = m
+        if previous is not None:
+            summary.previous_milestone = dict(
+                title=previous.title,
+                status=previous.completed and "Complete" or "Progress")
+        if upcoming is not None:
+            summary.next_milestone = dict(title=upcoming.title,
+                                          deadline=upcoming.deadline)
+
+        # Latest message or comment; a message wins a tie.
+        last = None
+        for collection in (p.messages, p.comments):
+            for item in collection:
+                posted_on = getattr(item, 'posted_on', None)
+                if posted_on is not None and (last is None or posted_on > last.posted_on):
+                    last = item
+        if last is not None:
+            summary.last_communique = last.posted_on
+            author_id = getattr(last, 'author_id', None)
+            person = author_id and p.person(author_id)
+            if person:
+                summary.last_author = "%s %s" % (person.first_name, person.last_name)
+
+        # Todo lists: backlogs and their open items, and unfinished sprints.
+        unfinished = []
+        for tdlist in p.todo_lists.values():
+            if tdlist.is_backlog:
+                summary.backlog_count += 1
+                summary.backlogged_count += tdlist.uncompleted_count
+            if tdlist.is_sprint and not tdlist.is_complete:
+                unfinished.append(tdlist)
+        if unfinished:
+            current = min(unfinished)
+            summary.current_sprint = current.name
+            summary.upcoming_sprints = len([s for s in unfinished
+                                            if s.sprint_number > current.sprint_number])
+
+        summary.last_changed_on = p.last_changed_on
+        return summary
+
+    def to_dict(self):
+        '''A new dictionary of the values; the milestone dictionaries are
+           shared with the summary.'''
+        return dict((field, getattr(self, field)) for field in FIELDS)
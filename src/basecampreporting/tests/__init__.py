@@ -3,9 +3,33 @@ import unittest
 from test_project import ProjectTests
 from test_parser import ParserTests
 from test_serialization import SerializationTests
+from test_generator import GeneratorTests
+from test_instrumentation import InstrumentationTests
+from test_tracing import TracingTests
+from test_dashboard import DashboardTests
+from test_refresher import RefresherTests
+from test_scheduler import SchedulerTests
+from test_singleflight import SingleFlightTests
+from test_portfolio import PortfolioTests
+from test_asyncclient import AsyncClientTests
+from test_timeline import TimelineTests
+from test_query import QueryTests
+from test_planner import PlannerTests
+from test_summary import SummaryTests
+from test_changes import ChangesTests
+from test_cache import CacheTests
+from test_decoding import DecodingTests
+from test_etree import EtreeTests
+from test_archive import ArchiveTests
+from test_paging import PagingTests
+from test_bulk import BulkTests
+from test_deadlines import DeadlineTests
+from test_columnar import ColumnarTests
+from test_burndown import BurndownTests
+from test_connection import ConnectionTests
 
 def test_suite():
-    alltests = unittest.TestSuite((ProjectTests, ParserTests, SerializationTests))
+    alltests = unittest.TestSuite((ProjectTests, ParserTests, SerializationTests, GeneratorTests, InstrumentationTests, TracingTests, DashboardTests, RefresherTests, SchedulerTests, SingleFlightTests, PortfolioTests, AsyncClientTests, TimelineTests, QueryTests, PlannerTests, SummaryTests, ChangesTests, CacheTests, DecodingTests, EtreeTests, ArchiveTests, PagingTests, BulkTests, DeadlineTests, ColumnarTests, BurndownTests, ConnectionTests))
 
 if __name__ == "__main__":
     import os
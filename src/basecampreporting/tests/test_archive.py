@@ -0,0 +1,88 @@
+import datetime
+import shutil
+import tempfile
+import time
+import unittest
+from urllib2 import HTTPError
+
+from basecampreporting.etree import ET
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.mocks import FixtureServer
+from basecampreporting.parser import parse_basecamp_xml
+from basecampreporting.project import Project
+from basecampreporting.archive import PayloadArchive, ArchivedBasecamp, record_spans
+
+class ArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = PayloadArchive(self.directory)
+        self.gen = AccountGenerator(seed=4, projects=1, messages=4, comments=1,
+                                    today=datetime.date.today())
+        self.project_id = self.gen.project_id(0)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+    def test_record_spans(self):
+        payload = '<?xml version="1.0"?>\n<posts type="array">\n' \
+                  '  <post><id>1</id></post>\n  <post id="2"/>\n</posts>'
+        spans = record_spans(payload)
+        self.assertEqual(['<post><id>1</id></post>', '<post id="2"/>'],
+                         [payload[start:end] for start, end in spans])
+
+    def test_random_access(self):
+        xml = ''.join(self.gen.milestones_xml(0))
+        response = self.archive.append('/milestones', None, xml)
+        self.assertTrue(isinstance(response.payload(), buffer))
+        expected = [parse_basecamp_xml(node)
+                    for node in ET.fromstring(xml).findall('milestone')]
+        self.assertEqual(len(expected), len(response))
+        self.assertEqual(expected[-1], parse_basecamp_xml(response.record(len(response) - 1)))
+        self.assertEqual(expected, [parse_basecamp_xml(n) for n in response.records()])
+
+    def test_history(self):
+        self.archive.append('/path', '<request/>', '<a>old</a>', fetched_at=100.0)
+        self.archive.append('/path', '<request/>', '<a>new</a>', fetched_at=200.0)
+        self.archive.append('/other', None, '<b/>', fetched_at=150.0)
+        self.assertEqual('<a>new</a>', str(self.archive.latest('/path', '<request/>')))
+        self.assertEqual('<a>old</a>', str(self.archive.latest('/path', '<request/>', at=150)))
+        self.assertEqual(None, self.archive.latest('/path', '<request/>', at=50))
+        self.assertEqual(None, self.archive.latest('/path'))
+
+        reopened = PayloadArchive(self.directory)
+        self.assertEqual(3, len(reopened))
+        self.assertEqual(['<a>old</a>', '<a>new</a>'],
+                         [str(r) for r in reopened.history('/path', '<request/>')])
+        reopened.close()
+
+    def test_replay(self):
+        server = FixtureServer(self.gen.responses())
+        server.start()
+        try:
+            bc = Basecamp(server.url, 'user', 'pass', archive=self.archive)
+            live = Project(server.url, self.project_id, None, None, basecamp=bc)
+            expected = dict(name=live.name,
+                            milestones=[m.to_dict() for m in live.milestones],
+                            messages=[m.to_dict() for m in live.messages],
+                            comments=[c.to_dict() for c in live.comments])
+        finally:
+            server.stop()
+
+        replay = ArchivedBasecamp(self.archive, at=datetime.datetime.now())
+        p = Project(server.url, self.project_id, None, None, basecamp=replay)
+        self.assertEqual(expected, dict(name=p.name,
+                                        milestones=[m.to_dict() for m in p.milestones],
+                                        messages=[m.to_dict() for m in p.messages],
+                                        comments=[c.to_dict() for c in p.comments]))
+        self.assertRaises(HTTPError, replay.todo_lists, self.project_id)
+
+        before = ArchivedBasecamp(self.archive, at=time.time() - 3600)
+        self.assertRaises(HTTPError, before.list_milestones, self.project_id)
+
+def test_suite():
+    return unittest.makeSuite(ArchiveTests)
+
+if __name__ == "__main__":
+    unittest.main()
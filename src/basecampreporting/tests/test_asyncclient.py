@@ -0,0 +1,195 @@
+import datetime
+import os
+import socket
+import ssl
+import time
+import unittest
+import urllib2
+
+from basecampreporting.mocks import FixtureServer
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.project import Project
+from basecampreporting.instrumentation import RequestStats
+from basecampreporting.asyncclient import AsyncBasecamp, AsyncProject, Future, \
+    gather, _Response
+
+class AsyncClientTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=5, projects=3, messages=5, comments=2,
+                                    time_entries=10, today=datetime.date.today())
+        self.server = FixtureServer(self.gen.responses())
+        self.server.start()
+        self.client = AsyncBasecamp(self.server.url, 'user', 'pass', max_connections=4)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_response_parser(self):
+        raw = ('HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+               '5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\nX-Trailer: 1\r\n\r\n')
+        response = _Response('GET')
+        done = [response.feed(c) for c in raw]
+        self.assertEqual([False] * (len(raw) - 1) + [True], done)
+        self.assertEqual('hello world', ''.join(response.body))
+        self.assertTrue(response.keep_alive)
+
+        response = _Response('GET')
+        self.assertFalse(response.feed('HTTP/1.0 200 OK\r\n\r\npartial'))
+        self.assertTrue(response.closed())
+        self.assertEqual('partial', ''.join(response.body))
+        self.assertFalse(response.keep_alive)
+
+    def test_futures(self):
+        a, b = Future(), Future()
+        chained = a.then(lambda value: b.then(lambda other: value + other))
+        both = gather([a, chained])
+        a.set_result(1)
+        self.assertFalse(both.done())
+        b.set_result(2)
+        self.assertEqual([1, 3], both.result())
+
+        failed = Future()
+        later = failed.then(lambda value: value)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            import sys
+            failed.set_exc_info(sys.exc_info())
+        self.assertRaises(ValueError, later.result)
+
+    def test_reads_match_blocking_client(self):
+        bc = Basecamp(self.server.url, 'user', 'pass')
+        project_id = self.gen.project_id(0)
+        futures = [self.client.projects(), self.client.list_milestones(project_id),
+                   self.client.todo_lists(project_id)]
+        results = self.client.run(gather(futures))
+        self.assertEqual([bc.projects(), bc.list_milestones(project_id),
+                          bc.todo_lists(project_id)], results)
+
+    def test_many_concurrent_reads(self):
+        stats = RequestStats()
+        self.client.add_listener(stats)
+        ids = [self.gen.todo_list_id(0, i) for i in range(self.gen.todo_list_count)]
+        futures = [self.client.todo_list(list_id) for list_id in ids * 20]
+        # Identical reads in flight share a request.
+        self.assertTrue(futures[0] is futures[len(ids)])
+        results = self.client.run(gather(futures), timeout=30)
+        self.assertEqual(len(ids) * 20, len(results))
+        self.assertEqual(len(ids), stats.requests)
+        self.assertTrue(len(self.client.map) <= 4)
+
+        # Enough distinct requests to queue behind the connection limit.
+        futures = [self.client.person(self.gen.person_id(i % self.gen.people))
+                   for i in range(self.gen.people)] + \
+                  [self.client.todo_list(self.gen.todo_list_id(p, 0)) for p in range(3)]
+        self.assertEqual(len(futures), len(self.client.run(gather(futures), timeout=30)))
+        self.assertTrue(len(self.client.map) <= 4)
+
+    def test_errors(self):
+        future = self.client._request('/missing.xml')
+        self.assertRaises(urllib2.HTTPError, self.client.run, future)
+        try:
+            future.result()
+        except urllib2.HTTPError, e:
+            self.assertEqual(404, e.code)
+
+        self.server.inject(503, [('Retry-After', '3')])
+        future = self.client.projects()
+        try:
+            self.client.run(future)
+            self.fail("expected an HTTPError")
+        except urllib2.HTTPError, e:
+            self.assertEqual(503, e.code)
+            self.assertEqual('3', e.hdrs.get('Retry-After'))
+
+        # The client carries on after failures.
+        self.assertTrue(self.client.run(self.client.projects()))
+
+    def test_ranged_time_entries_not_cached(self):
+        p = AsyncProject(self.client, self.gen.project_id(0))
+        everything = datetime.date(1900, 1, 1)
+        ranged = self.client.run(p.load_time_entries(start_date=everything))
+        self.assertEqual(10, len(ranged))
+        self.assertFalse(p.project.cache['time_entries'])
+
+        # Another range is asked for, not answered with the first one.
+        recent = p.load_time_entries(start_date=datetime.date.today())
+        self.assertRaises(urllib2.HTTPError, self.client.run, recent)
+
+        self.assertEqual(10, len(self.client.run(p.load_time_entries())))
+        self.assertTrue(p.project.cache['time_entries'])
+
+    def test_stalled_connection_closed(self):
+        client = AsyncBasecamp(self.server.url, 'user', 'pass', timeout=0.3)
+        self.server.inject(delay=2)
+        started = time.time()
+        future = client.projects()
+        # Driven by loop() alone, as another caller would.
+        while not future.done() and time.time() - started < 5:
+            client.loop()
+        self.assertRaises(socket.timeout, future.result)
+        self.assertTrue(time.time() - started < 1.5)
+        self.assertEqual({}, client.map)
+        self.assertEqual(0, client.active)
+        self.assertTrue(client.run(client.projects(), 10))
+        client.close()
+
+    def test_https_certificate_checked(self):
+        certfile = os.path.join(os.path.dirname(__file__), 'fixtures', 'localhost.pem')
+        server = FixtureServer(self.gen.responses())
+        server.socket = ssl.wrap_socket(server.socket, certfile=certfile,
+                                        server_side=True)
+        server.start()
+        url = 'https://localhost:%s' % server.server_address[1]
+        try:
+            # The self-signed certificate isn't trusted by default.
+            client = AsyncBasecamp(url, 'user', 'pass')
+            self.assertRaises(ssl.SSLError, client.run, client.projects(), 10)
+            client.close()
+
+            context = ssl.create_default_context(cafile=certfile)
+            client = AsyncBasecamp(url, 'user', 'pass', ssl_context=context)
+            self.assertTrue(client.run(client.projects(), 10))
+            client.close()
+        finally:
+            server.stop()
+
+    def test_async_project(self):
+        projects = [AsyncProject(self.client, project_id)
+                    for project_id in self.gen.project_ids()]
+        loaded = self.client.run(gather([p.load() for p in projects]), timeout=30)
+        self.assertEqual(3, len(loaded))
+        for p in loaded:
+            bc = Basecamp(self.server.url, 'user', 'pass')
+            expected = Project(self.server.url, p.id, None, None, basecamp=bc)
+            self.assertEqual(expected.name, p.name)
+            self.assertEqual([m.id for m in expected.messages], [m.id for m in p.messages])
+            self.assertEqual([c.id for c in expected.comments], [c.id for c in p.comments])
+            self.assertEqual(sorted(expected.todo_lists.keys()), sorted(p.todo_lists.keys()))
+            self.assertEqual(len(expected.time_entries), len(p.time_entries))
+            self.assertEqual(sorted(expected.people.keys()), sorted(p.people.keys()))
+
+        # Loads already done or in progress are shared.
+        self.assertTrue(projects[0].load_milestones().done())
+        fresh = AsyncProject(self.client, self.gen.project_id(0))
+        self.assertTrue(fresh.load_messages() is fresh.load_messages())
+
+    def test_async_project_retries_failed_load(self):
+        p = AsyncProject(self.client, self.gen.project_id(0))
+        self.server.inject(503)
+        failed = p.load_milestones()
+        self.assertRaises(urllib2.HTTPError, self.client.run, failed)
+        self.assertFalse('milestones' in p.loading)
+
+        retried = p.load_milestones()
+        self.assertFalse(retried is failed)
+        self.assertTrue(self.client.run(retried))
+        self.assertTrue(p.project.cache['milestones'])
+
+def test_suite():
+    return unittest.makeSuite(AsyncClientTests)
+
+if __name__ == "__main__":
+    unittest.main()
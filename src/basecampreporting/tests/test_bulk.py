@@ -0,0 +1,208 @@
+import datetime
+import threading
+import time
+import unittest
+import urllib2
+
+from basecampreporting.etree import ET
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.cache import MemoryCache
+from basecampreporting.mocks import TestBasecamp, FixtureServer
+from basecampreporting.scheduler import request_kind, WRITE
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.project import Project
+from basecampreporting.bulk import BulkWriter
+
+class WriteRecorder(TestBasecamp):
+    """Answers reads from fixtures and writes by echoing them, recording
+       when each write started and finished."""
+    def __init__(self, delay=0.02, failing=()):
+        TestBasecamp.__init__(self, 'http://FAKE', None, None)
+        self.delay = delay
+        self.failing = failing
+        self.lock = threading.Lock()
+        self.writes = []
+        self.in_flight = self.most_in_flight = 0
+
+    def _request(self, path, data=None):
+        if request_kind(path) == WRITE:
+            return Basecamp._request(self, path, data)
+        return TestBasecamp._request(self, path, data)
+
+    def _send(self, path, data=None, event=None):
+        self.lock.acquire()
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        self.lock.release()
+        started = time.time()
+        try:
+            time.sleep(self.delay)
+            if path in self.failing:
+                raise urllib2.HTTPError(self.baseURL + path, 422,
+                                        "Unprocessable Entity", None, None)
+            return self.respond(path, data)
+        finally:
+            self.lock.acquire()
+            self.in_flight -= 1
+            self.writes.append((path, data, started, time.time()))
+            self.lock.release()
+
+    def respond(self, path, data):
+        request = ET.fromstring(data or '<request/>')
+        milestones = request.findall('milestone')
+        if milestones:
+            return '<milestones>%s</milestones>' % ''.join(
+                ['<milestone><id>%s</id><title>%s</title></milestone>'
+                 % (i + 1, m.findtext('title'))
+                 for i, m in enumerate(milestones)])
+        return '<todo-item><content>%s</content></todo-item>' \
+               % (request.findtext('content') or '')
+
+    def sent(self, path):
+        return [write for write in self.writes if write[0] == path]
+
+class BulkTests(unittest.TestCase):
+    def test_milestones_batched(self):
+        bc = WriteRecorder(delay=0)
+        bulk = BulkWriter(bc, batch_size=50)
+        for i in range(120):
+            bulk.create_milestone(7, 'Sprint %s' % i, datetime.date(2009, 3, 2),
+                                  1, False)
+        results = bulk.run()
+        self.assertEqual(0, len(bulk))
+        self.assertEqual(3, len(bc.sent('/projects/7/milestones/create')))
+        self.assertEqual(120, len(results))
+        self.assertTrue(all([result.ok for result in results]))
+        titles = [ET.fromstring(result.result).findtext('title')
+                  for result in results]
+        self.assertEqual(['Sprint %s' % i for i in range(120)], titles)
+
+    def test_unbatched_milestones(self):
+        bc = WriteRecorder(delay=0)
+        bulk = BulkWriter(bc, batch_milestones=False)
+        for i in range(5):
+            bulk.create_milestone(7, 'Sprint %s' % i, datetime.date(2009, 3, 2),
+                                  1, False)
+        bulk.run()
+        self.assertEqual(5, len(bc.sent('/projects/7/milestones/create')))
+
+    def test_items_sent_concurrently(self):
+        bc = WriteRecorder(delay=0.02)
+        bulk = BulkWriter(bc, workers=8)
+        for i in range(200):
+            bulk.create_todo_item(3, 'Story %s' % i)
+        started = time.time()
+        results = bulk.run()
+        self.assertTrue(time.time() - started < 200 * 0.02 / 2)
+        self.assertTrue(bc.most_in_flight > 1)
+        self.assertTrue(bc.most_in_flight <= 8)
+        self.assertEqual(['Story %s' % i for i in range(200)],
+                         [result.args[1] for result in results])
+        self.assertEqual('Story 5',
+                         ET.fromstring(results[5].result).findtext('content'))
+
+    def test_ordered_writes(self):
+        bc = WriteRecorder(delay=0.01)
+        bulk = BulkWriter(bc, workers=8)
+        for i in range(6):
+            bulk.create_todo_item(3, 'Story %s' % i)
+        for item_id, to in [(10, 1), (11, 2), (12, 3)]:
+            bulk.move_todo_item(item_id, to, list_id=3)
+        for i in range(3):
+            bulk.create_todo_item(3, 'Last %s' % i, ordered=True)
+        bulk.run()
+
+        creates = bc.sent('/todos/create_item/3')
+        moves = [bc.sent('/todos/move_item/%s' % item_id)[0]
+                 for item_id in (10, 11, 12)]
+        # Moves start once the earlier creates have finished, one at a time.
+        self.assertTrue(max([w[3] for w in creates[:6]]) <= moves[0][2])
+        for earlier, later in zip(moves, moves[1:]):
+            self.assertTrue(earlier[3] <= later[2])
+        lasts = [w for w in creates if 'Last' in w[1]]
+        self.assertEqual(['Last 0', 'Last 1', 'Last 2'],
+                         [ET.fromstring(w[1]).findtext('content') for w in lasts])
+        self.assertTrue(moves[-1][3] <= lasts[0][2])
+
+    def test_per_item_errors(self):
+        bc = WriteRecorder(delay=0, failing=['/todos/complete_item/2'])
+        bulk = BulkWriter(bc)
+        results = [bulk.complete_todo_item(item_id) for item_id in (1, 2, 3)]
+        self.assertEqual(results, bulk.run())
+        self.assertEqual([True, False, True], [r.ok for r in results])
+        self.assertEqual(422, results[1].error.code)
+        self.assertRaises(urllib2.HTTPError, results[1].raise_error)
+
+    def test_clears_project_caches(self):
+        gen = AccountGenerator(seed=3, projects=2, messages=2, comments=1,
+                               today=datetime.date.today())
+        bc = WriteRecorder(delay=0)
+        bc.load_test_responses(gen.responses())
+        p = Project('http://FAKE', gen.project_id(0), None, None, basecamp=bc)
+        other = Project('http://FAKE', gen.project_id(1), None, None, basecamp=bc)
+        for project in (p, other):
+            self.assertTrue(project.milestones)
+            self.assertTrue(project.todo_lists)
+
+        bulk = BulkWriter(bc, [p, other])
+        bulk.create_milestone(p.id, 'Release', datetime.date(2009, 3, 2), 1, False)
+        bulk.run()
+        self.assertFalse(p.cache['milestones'])
+        self.assertTrue(other.cache['milestones'])
+        self.assertTrue(p.cache['todo_lists'])
+
+        bulk = p.bulk()
+        bulk.complete_todo_item(1)
+        bulk.run()
+        self.assertFalse(p.cache['todo_lists'])
+        self.assertFalse(p.cache['todo_items'])
+        self.assertTrue(other.cache['todo_lists'])
+
+    def test_clears_response_cache(self):
+        gen = AccountGenerator(seed=3, projects=1, messages=2, comments=1,
+                               today=datetime.date.today())
+        responses = gen.responses()
+        item_id = gen.todo_item_id(0, 0, 0)
+        responses['GET']['/todos/complete_item/%s' % item_id] = '<todo-item/>'
+        responses['GET']['/projects/%s/milestones/create' % gen.project_id(0)] = \
+            '<milestones><milestone><id>1</id></milestone></milestones>'
+        server = FixtureServer(responses)
+        server.start()
+        try:
+            bc = Basecamp(server.url, 'user', 'pass', cache=MemoryCache())
+            p = Project(server.url, gen.project_id(0), None, None, basecamp=bc)
+            p.milestones, p.todo_items
+            p.clear_cache()
+            before = server.requests
+            p.milestones, p.todo_items
+            self.assertEqual(before, server.requests)
+
+            bulk = p.bulk()
+            bulk.complete_todo_item(item_id)
+            bulk.create_milestone(p.id, 'Release', datetime.date(2009, 3, 2), 1, False)
+            self.assertTrue(all([result.ok for result in bulk.run()]))
+            before = server.requests
+            p.milestones, p.todo_items
+            # The milestones, the lists and each list's items are read anew.
+            self.assertEqual(before + 2 + len(p.todo_lists), server.requests)
+        finally:
+            server.stop()
+
+    def test_create_todo_list(self):
+        bc = WriteRecorder(delay=0)
+        bc.create_todo_list(4, milestone_id=9, tracked=True, name='Sprint 1',
+                            description='Stories')
+        request = ET.fromstring(bc.sent('/projects/4/todos/create_list')[0][1])
+        self.assertEqual('9', request.findtext('milestone-id'))
+        self.assertEqual('true', request.findtext('tracked'))
+        self.assertEqual('Sprint 1', request.findtext('name'))
+
+        bc.update_todo_list(5, 'Sprint 2', 'More stories')
+        request = ET.fromstring(bc.sent('/todos/update_list/5')[0][1])
+        self.assertEqual('Sprint 2', request.findtext('list/name'))
+
+def test_suite():
+    return unittest.makeSuite(BulkTests)
+
+if __name__ == "__main__":
+    unittest.main()
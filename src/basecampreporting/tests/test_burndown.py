@@ -0,0 +1,146 @@
+import copy
+import datetime
+import unittest
+
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.project import Project
+from basecampreporting.changes import ChangeStream, ALL_KINDS
+from basecampreporting.burndown import Burndown, item_state
+
+class BurndownTests(unittest.TestCase):
+    def setUp(self):
+        self.today = datetime.date.today()
+        self.gen = AccountGenerator(seed=12, projects=1, messages=1, comments=0,
+                                    sprints=12, backlogs=1, todo_items=8,
+                                    time_entries=1, today=self.today)
+        self.responses = self.gen.responses()
+
+    def project(self, responses=None):
+        bc = TestBasecamp('http://FAKE', None, None)
+        bc.load_test_responses(responses or self.responses)
+        return Project('http://FAKE', self.gen.project_id(0), None, None, basecamp=bc)
+
+    def expected_series(self, p, tdlist):
+        '''The series of tdlist worked out from its items alone.'''
+        days = [item_state(i)[2] for i in p.todo_items
+                if i.todo_list_id == tdlist.id and i.completed]
+        if not days: return []
+        start = min(days)
+        end = max(start + datetime.timedelta(days=13), max(days))
+        remaining = len([i for i in p.todo_items if i.todo_list_id == tdlist.id])
+        series, day = [], start
+        while day <= min(end, self.today):
+            remaining -= days.count(day)
+            series.append((day, remaining))
+            day += datetime.timedelta(days=1)
+        return series
+
+    def assertMatches(self, p, burndown):
+        self.assertEqual(12, len(burndown.sprints))
+        for tdlist in p.sprints:
+            sprint = burndown.sprints[tdlist.id]
+            self.assertEqual(self.expected_series(p, tdlist), sprint.series())
+
+    def completed_in(self, list_n, count=1):
+        '''Responses with count more items of sprint list_n completed today.'''
+        responses = copy.deepcopy(self.responses)
+        list_id = self.gen.todo_list_id(0, list_n)
+        for path, xml in responses['GET'].items():
+            if path.endswith('/%s' % list_id) or path.endswith('/%s.xml' % list_id):
+                responses['GET'][path] = xml.replace(
+                    '<completed type="boolean">false</completed>',
+                    '<completed type="boolean">true</completed>\n'
+                    '      <completed-on type="datetime">%sT12:00:00Z</completed-on>'
+                    % self.today.isoformat(), count)
+                return responses
+        self.fail("no response for todo list %s" % list_id)
+
+    def test_sprint_numbers(self):
+        p = self.project()
+        self.assertEqual(['Sprint %s' % n for n in range(12)],
+                         [s.name for s in p.sprints])
+        self.assertEqual(10, p.todo_lists['Sprint 10'].sprint_number)
+        self.assertEqual('Sprint 6', p.current_sprint.name)
+        self.assertEqual(['Sprint %s' % n for n in range(7, 12)],
+                         [s.name for s in p.upcoming_sprints])
+
+    def test_series_and_velocity(self):
+        p = self.project()
+        burndown = p.burndown
+        self.assertMatches(p, burndown)
+        self.assertEqual(['Sprint %s' % n for n in range(12)],
+                         [s.name for s in burndown.sprints_in_order()])
+
+        # The first six sprints are done: all eight items, down to none left.
+        self.assertEqual([('Sprint %s' % n, 8) for n in range(6)], burndown.velocity())
+        self.assertEqual(8.0, burndown.average_velocity())
+        for sprint in burndown.sprints_in_order()[:6]:
+            self.assertEqual(0, sprint.series()[-1][1])
+            self.assertEqual(sprint.window()[0], sprint.series()[0][0])
+        later = burndown.sprint('Sprint 9')
+        self.assertEqual([], later.series())
+        self.assertEqual(8, later.remaining)
+
+        data = burndown.to_dict()
+        self.assertEqual(12, len(data['sprints']))
+        self.assertEqual('Sprint 0', data['sprints'][0]['name'])
+        self.assertEqual(8.0, data['average_velocity'])
+
+    def test_incremental_update(self):
+        p = self.project()
+        burndown = p.burndown
+        self.assertEqual(0, burndown.update(p))
+
+        # Swap in a refreshed project's collections.
+        fresh = self.project(self.completed_in(9, count=2))
+        p.cache['todo_lists'] = fresh.todo_lists
+        p.cache['todo_items'] = fresh.todo_items
+        self.assertEqual(2, burndown.update(p))
+        self.assertTrue(p.burndown is burndown)
+        self.assertMatches(fresh, burndown)
+        self.assertEqual([(self.today, 6)], burndown.sprint('Sprint 9').series())
+        self.assertEqual(2, burndown.sprint('Sprint 9').completed)
+
+    def test_change_stream(self):
+        stream = ChangeStream(kinds=ALL_KINDS)
+        p = self.project()
+        burndown = Burndown()
+        burndown.update(p)
+        burndown.listen(stream)
+        stream.update(p)
+
+        fresh = self.project(self.completed_in(10))
+        events = stream.update(fresh)
+        self.assertEqual(['completed'], [e.type for e in events if e.kind == 'todo_item'])
+        self.assertEqual([(self.today, 7)], burndown.sprint('Sprint 10').series())
+        self.assertMatches(fresh, burndown)
+
+    def test_sprint_dates(self):
+        p = self.project()
+        first = self.today - datetime.timedelta(days=200)
+        burndown = Burndown(sprint_length=7, starts={0: first})
+        burndown.update(p)
+        sprint = burndown.sprint('Sprint 0')
+        start, end = sprint.window()
+        self.assertEqual(first, start)
+        self.assertEqual(max(d for d in sprint.days), end)
+        self.assertEqual(8, sprint.series()[0][1])
+        self.assertEqual(0, sprint.series()[-1][1])
+
+        # Sprints tied to a milestone end on its deadline.
+        p = self.project()
+        tdlist = p.todo_lists['Sprint 8']
+        milestone = p.milestones[0]
+        tdlist.milestone_id = milestone.id
+        burndown = Burndown(sprint_length=7)
+        burndown.update(p)
+        self.assertEqual((milestone.deadline - datetime.timedelta(days=6),
+                          milestone.deadline),
+                         burndown.sprint('Sprint 8').window())
+
+def test_suite():
+    return unittest.makeSuite(BurndownTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+import cPickle as pickle
+import datetime
+import shutil
+import tempfile
+import unittest
+
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.cache import MemoryCache, FileCache, SocketCache, CacheServer, \
+     CompressedSerializer, DataSerializer, PickleSerializer, RawSerializer, open_cache
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.instrumentation import RequestStats
+from basecampreporting.mocks import FixtureServer
+from basecampreporting.project import Project
+
+class CacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_backend(self, cache):
+        self.assertEqual(None, cache.get('missing'))
+        cache.set('record', {'id': 1, 'tags': ['a', 'b']})
+        self.assertEqual({'id': 1, 'tags': ['a', 'b']}, cache.get('record'))
+        cache.set('empty', [])
+        self.assertEqual([], cache.get('empty'))
+        cache.set('expired', 'old', ttl=-1)
+        self.assertEqual(None, cache.get('expired'))
+        cache.delete('record')
+        self.assertEqual(None, cache.get('record'))
+        cache.clear()
+        self.assertEqual(None, cache.get('empty'))
+
+    def test_memory(self):
+        self.check_backend(MemoryCache())
+
+    def test_memory_byte_budget(self):
+        cache = MemoryCache(max_bytes=30, serializer=RawSerializer())
+        for key in 'abc':
+            cache.set(key, 'x' * 9)
+        cache.get('a')
+        cache.set('d', 'x' * 9)
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual('x' * 9, cache.get('a'))
+        self.assertEqual(30, cache.size)
+        self.assertEqual(1, cache.evictions)
+        cache.set('huge', 'x' * 40)
+        self.assertEqual(None, cache.get('huge'))
+        self.assertEqual(3, len(cache))
+
+    def test_file(self):
+        self.check_backend(FileCache(self.directory))
+        writer = FileCache(self.directory, CompressedSerializer())
+        reader = FileCache(self.directory, CompressedSerializer())
+        writer.set('shared', 'value' * 100, ttl=60)
+        self.assertEqual('value' * 100, reader.get('shared'))
+
+    def test_socket(self):
+        server = CacheServer()
+        server.start()
+        try:
+            cache = open_cache(server.url)
+            self.check_backend(cache)
+            other = SocketCache(*server.server_address)
+            cache.set('shared', 'line one\r\nEND\r\n', ttl=60)
+            self.assertEqual('line one\r\nEND\r\n', other.get('shared'))
+            other.close()
+        finally:
+            server.stop()
+        # An unreachable server is an empty cache.
+        unreachable = SocketCache(*server.server_address)
+        self.assertEqual(None, unreachable.get('shared'))
+        unreachable.set('shared', 'value')
+        self.assertEqual(2, unreachable.errors)
+
+    def test_basecamp_responses(self):
+        gen = AccountGenerator(seed=3, projects=1, today=datetime.date.today())
+        server = FixtureServer(gen.responses())
+        server.start()
+        try:
+            shared = MemoryCache()
+            project_id = gen.project_id(0)
+            first = Basecamp(server.url, 'user', 'pass', cache=shared)
+            second = Basecamp(server.url, 'user', 'pass', cache=shared)
+            stats = RequestStats()
+            second.add_listener(stats)
+
+            xml = first.list_milestones(project_id)
+            requests = server.requests
+            self.assertEqual(xml, second.list_milestones(project_id))
+            self.assertEqual(requests, server.requests)
+            self.assertEqual(1, stats.cache_hits)
+
+            stranger = Basecamp(server.url, 'other', 'pass', cache=shared)
+            stranger.list_milestones(project_id)
+            self.assertEqual(requests + 1, server.requests)
+        finally:
+            server.stop()
+
+    def test_project_collections(self):
+        gen = AccountGenerator(seed=3, projects=1, today=datetime.date.today())
+        server = FixtureServer(gen.responses())
+        server.start()
+        try:
+            shared = FileCache(self.directory)
+            bc = Basecamp(server.url, 'user', 'pass')
+            project_id = gen.project_id(0)
+            first = Project(server.url, project_id, None, None, basecamp=bc,
+                            cache_backend=shared)
+            titles = [m.title for m in first.milestones]
+            requests = server.requests
+            second = Project(server.url, project_id, None, None, basecamp=bc,
+                             cache_backend=shared)
+            self.assertEqual(titles, [m.title for m in second.milestones])
+            self.assertEqual(requests, server.requests)
+
+            second.clear_cache('milestones')
+            third = Project(server.url, project_id, None, None, basecamp=bc,
+                            cache_backend=shared)
+            self.assertEqual(titles, [m.title for m in third.milestones])
+            self.assertEqual(requests + 1, server.requests)
+        finally:
+            server.stop()
+
+    def test_data_serializer(self):
+        gen = AccountGenerator(seed=3, projects=1, today=datetime.date.today())
+        server = FixtureServer(gen.responses())
+        server.start()
+        try:
+            bc = Basecamp(server.url, 'user', 'pass')
+            p = Project(server.url, gen.project_id(0), None, None, basecamp=bc)
+            serializer = DataSerializer()
+            for records in (p.milestones, p.messages, p.todo_items, p.time_entries):
+                self.assertTrue(records)
+                copies = serializer.loads(serializer.dumps(records))
+                for record, copy in zip(records, copies):
+                    self.assertEqual(type(record), type(copy))
+                    for name in record._basecamp_attributes:
+                        self.assertEqual(getattr(record, name), getattr(copy, name))
+            lists = serializer.loads(serializer.dumps(p.todo_lists))
+            self.assertEqual(sorted(p.todo_lists.keys()), sorted(lists.keys()))
+        finally:
+            server.stop()
+        value = {1: datetime.date(2009, 5, 1), 'at': datetime.datetime(2009, 5, 1, 12, 30)}
+        self.assertEqual(value, serializer.loads(serializer.dumps(value)))
+        self.assertEqual('<xml/>', serializer.loads(serializer.dumps('<xml/>')))
+        self.assertRaises(TypeError, serializer.dumps, object())
+
+    def test_pickles_refused(self):
+        payload = pickle.dumps({'id': 1}, pickle.HIGHEST_PROTOCOL)
+        self.assertRaises(ValueError, DataSerializer().loads, payload)
+        self.assertRaises(ValueError, DataSerializer().loads,
+                          'j{"__record__": "Basecamp", "fields": {}}')
+        self.assertRaises(ValueError, SocketCache, serializer=PickleSerializer())
+        self.assertRaises(ValueError, SocketCache,
+                          serializer=CompressedSerializer(PickleSerializer()))
+
+        server = CacheServer()
+        server.start()
+        try:
+            writer = SocketCache(*server.server_address, serializer=RawSerializer())
+            writer.set('record', payload, ttl=60)
+            reader = open_cache(server.url)
+            self.assertEqual(None, reader.get('record'))
+            writer.close()
+            reader.close()
+        finally:
+            server.stop()
+        # Pickle stays available where only this process writes.
+        cache = MemoryCache(serializer=PickleSerializer())
+        cache.set('record', {'id': 1})
+        self.assertEqual({'id': 1}, cache.get('record'))
+
+    def test_open_cache(self):
+        self.assertEqual(1024, open_cache('memory://?max_bytes=1024').max_bytes)
+        self.assertEqual(self.directory, open_cache('file://' + self.directory).directory)
+        self.assertEqual(('cache.local', 11211),
+                         open_cache('memcached://cache.local').address)
+        self.assertRaises(ValueError, open_cache, 'redis://localhost')
+
+def test_suite():
+    return unittest.makeSuite(CacheTests)
+
+if __name__ == "__main__":
+    unittest.main()
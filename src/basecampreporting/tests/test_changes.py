@@ -0,0 +1,97 @@
+import copy
+import datetime
+import unittest
+
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.project import Project
+from basecampreporting.refresher import Refresher
+from basecampreporting.changes import ChangeStream, ProjectSnapshot, diff, content_hash
+
+class ChangesTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=8, projects=1, messages=5, comments=1,
+                                    milestones=9, time_entries=10,
+                                    today=datetime.date.today())
+        self.responses = self.gen.responses()
+        self.project_id = self.gen.project_id(0)
+
+    def project(self, responses=None):
+        bc = TestBasecamp('http://FAKE', None, None)
+        bc.load_test_responses(responses or self.responses)
+        return Project('http://FAKE', self.project_id, None, None, basecamp=bc)
+
+    def edited(self):
+        '''Responses with one milestone completed, one message retitled, one
+           message added and one time entry removed.'''
+        responses = copy.deepcopy(self.responses)
+        path = '/projects/%s/milestones/list' % self.project_id
+        xml = responses['GET'][path]
+        responses['GET'][path] = xml.replace('<completed type="boolean">false</completed>',
+                                             '<completed type="boolean">true</completed>', 1)
+        path = '/projects/%s/msg/archive' % self.project_id
+        body = '<request><project-id>%s</project-id></request>' % self.project_id
+        xml = responses['POST'][path][body]
+        first = xml.index('<post>')
+        end = xml.index('</post>') + len('</post>')
+        post = xml[first:end]
+        added = post.replace('<id type="integer">%s</id>' % self.gen.message_id(0, 0),
+                             '<id type="integer">1</id>')
+        xml = xml[:first] + post.replace('<title>', '<title>Re: ') + xml[end:]
+        xml = xml.replace('</posts>', '  %s\n</posts>' % added)
+        responses['POST'][path][body] = xml
+        for path in responses['GET']:
+            if 'time_entries' in path:
+                xml = responses['GET'][path]
+                start = xml.index('<time-entry>')
+                end = xml.index('</time-entry>') + len('</time-entry>')
+                responses['GET'][path] = xml[:start] + xml[end:]
+        return responses
+
+    def test_unchanged(self):
+        old = ProjectSnapshot.of(self.project())
+        new = ProjectSnapshot.of(self.project())
+        self.assertEqual([], diff(old, new))
+        record = self.project().messages[0]
+        self.assertTrue(content_hash(record) is content_hash(record))
+
+    def test_events(self):
+        stream = ChangeStream()
+        received = []
+        completions = []
+        stream.subscribe(received.append)
+        stream.subscribe(completions.append, kinds=['milestone'], types=['completed'])
+        self.assertEqual([], stream.update(self.project()))
+
+        events = stream.update(self.project(self.edited()))
+        found = sorted((e.kind, e.type) for e in events)
+        self.assertEqual([('message', 'created'), ('message', 'updated'),
+                          ('milestone', 'completed'), ('time_entry', 'deleted')], found)
+        self.assertEqual(len(events), len(received))
+        self.assertEqual(1, len(completions))
+        updated = [e for e in events if e.type == 'updated'][0]
+        self.assertTrue(updated.new.title.startswith('Re: '))
+        self.assertFalse(updated.old.title.startswith('Re: '))
+
+        stream.unsubscribe(received.append)
+        count = len(received)
+        self.assertTrue(stream.update(self.project()))
+        self.assertEqual(count, len(received))
+        self.assertEqual(1, len(stream.subscribers))
+
+    def test_refresher_publishes(self):
+        stream = ChangeStream()
+        received = []
+        stream.subscribe(received.append)
+        versions = [self.responses, self.edited()]
+        refresher = Refresher([self.project_id], lambda pid: self.project(versions.pop(0)),
+                              changes=stream)
+        refresher.refresh(self.project_id)
+        refresher.refresh(self.project_id)
+        self.assertEqual(4, len(received))
+
+def test_suite():
+    return unittest.makeSuite(ChangesTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+from basecampreporting.etree import ET
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.parser import parse_basecamp_xml
+from basecampreporting.project import Project
+from basecampreporting.columnar import ColumnarWriter, ColumnarFile, CsvWriter, \
+     read_csv, export, SOURCES, NULL_INTEGER, TIME_ENTRIES, TODO_ITEMS, MILESTONES
+
+class ColumnarTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=11, projects=2, messages=2, comments=1,
+                                    time_entries=40, today=datetime.date.today())
+        bc = TestBasecamp('http://FAKE', None, None)
+        bc.load_test_responses(self.gen.responses())
+        self.projects = [Project('http://FAKE', self.gen.project_id(i), None,
+                                 None, basecamp=bc) for i in range(2)]
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'export.bcc')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def parsed(self, schema):
+        '''The schema's fields of every record, as the parser reads them.'''
+        records = []
+        for p in self.projects:
+            for xml in SOURCES[schema.kind](p):
+                for node in ET.fromstring(xml).getiterator(schema.record_tag):
+                    fields = parse_basecamp_xml(node)
+                    fields.setdefault('project_id', p.id)
+                    records.append(dict([(name, fields.get(name))
+                                         for name in schema.names]))
+        return records
+
+    def export(self, schema, chunk_rows=16):
+        writer = ColumnarWriter(self.path, schema, chunk_rows=chunk_rows)
+        count = export(self.projects, writer)
+        writer.close()
+        self.assertEqual(count, writer.rows)
+        return ColumnarFile(self.path)
+
+    def test_same_as_parser(self):
+        for schema in (TIME_ENTRIES, TODO_ITEMS, MILESTONES):
+            table = self.export(schema)
+            expected = self.parsed(schema)
+            self.assertTrue(expected)
+            self.assertEqual(len(expected), len(table))
+            self.assertEqual(expected, list(table.records()))
+            table.close()
+
+    def test_chunks(self):
+        table = self.export(TIME_ENTRIES, chunk_rows=7)
+        chunks = list(table.chunks())
+        self.assertEqual(80, len(table))
+        self.assertEqual(12, len(chunks))
+        self.assertEqual([7] * 11 + [3], [len(chunk) for chunk in chunks])
+        self.assertEqual('d', chunks[0]['hours'].typecode)
+
+        hours = table.column('hours')
+        self.assertEqual(80, len(hours))
+        self.assertEqual(sum([r['hours'] for r in self.parsed(TIME_ENTRIES)]),
+                         sum(hours))
+        self.assertEqual(set([p.id for p in self.projects]),
+                         set(table.column('project_id')))
+        names = table.column('person_name')
+        self.assertEqual(80, len(names))
+        self.assertTrue(isinstance(names[0], unicode))
+
+    def test_nulls(self):
+        table = self.export(TIME_ENTRIES)
+        todo_item_ids = [r['todo_item_id'] for r in table.records()]
+        self.assertTrue(None in todo_item_ids)
+        self.assertTrue([i for i in todo_item_ids if i is not None])
+
+        # To-do items carry no project id; export() fills it in.
+        table = self.export(TODO_ITEMS)
+        project_ids = table.column('project_id')
+        self.assertFalse(NULL_INTEGER in project_ids)
+        self.assertEqual(set([p.id for p in self.projects]), set(project_ids))
+        completed_on = [r['completed_on'] for r in table.records()]
+        self.assertTrue(None in completed_on)
+
+    def test_csv(self):
+        out = StringIO()
+        writer = CsvWriter(out, MILESTONES)
+        export(self.projects, writer)
+        self.assertEqual('id:integer,project_id:integer,title:text',
+                         out.getvalue().split('\r\n')[0][:40])
+        self.assertEqual(self.parsed(MILESTONES),
+                         list(read_csv(StringIO(out.getvalue()))))
+
+    def test_not_an_export(self):
+        open(self.path, 'wb').write('<milestones/>' * 10)
+        self.assertRaises(ValueError, ColumnarFile, self.path)
+
+def test_suite():
+    return unittest.makeSuite(ColumnarTests)
+
+if __name__ == "__main__":
+    unittest.main()
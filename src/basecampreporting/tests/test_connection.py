@@ -0,0 +1,79 @@
+import httplib
+import socket
+import threading
+import unittest
+
+from basecampreporting.connection import ConnectionPool
+
+class DroppingServer(object):
+    """Answers the first request on each connection and keeps it open, then
+       reads the next request on it and hangs up without answering."""
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.url = 'http://127.0.0.1:%s' % self.sock.getsockname()[1]
+        self.requests = []
+        thread = threading.Thread(target=self.serve)
+        thread.setDaemon(True)
+        thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, address = self.sock.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self.handle, args=(conn,))
+            thread.setDaemon(True)
+            thread.start()
+
+    def handle(self, conn):
+        stream = conn.makefile('rb')
+        try:
+            for answered in (True, False):
+                line = stream.readline()
+                if not line: return
+                length = 0
+                while True:
+                    header = stream.readline()
+                    if header in ('\r\n', '\n', ''): break
+                    if header.lower().startswith('content-length:'):
+                        length = int(header.split(':')[1])
+                stream.read(length)
+                self.requests.append(line.split()[1])
+                if answered:
+                    conn.sendall('HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+        finally:
+            stream.close()
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+class ConnectionTests(unittest.TestCase):
+    def setUp(self):
+        self.server = DroppingServer()
+        self.pool = ConnectionPool(timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.close()
+
+    def test_read_retried_on_dropped_connection(self):
+        self.assertEqual('ok', self.pool.request(self.server.url + '/projects.xml'))
+        self.assertEqual('ok', self.pool.request(self.server.url + '/projects.xml'))
+        self.assertEqual(['/projects.xml'] * 3, self.server.requests)
+
+    def test_write_not_repeated(self):
+        self.assertEqual('ok', self.pool.request(self.server.url + '/projects.xml'))
+        url = self.server.url + '/todos/complete_item/1'
+        self.assertRaises((httplib.HTTPException, socket.error), self.pool.request, url, '')
+        self.assertEqual(['/projects.xml', '/todos/complete_item/1'],
+                         self.server.requests)
+
+def test_suite():
+    return unittest.makeSuite(ConnectionTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from StringIO import StringIO
+
+from basecampreporting.serialization import json
+from basecampreporting.mocks import FixtureServer
+from basecampreporting.generator import AccountGenerator
+from basecampreporting import dashboard
+
+class DashboardTests(unittest.TestCase):
+    def setUp(self):
+        self.generator = AccountGenerator(seed=5, projects=6, messages=4)
+        self.server = FixtureServer(self.generator.responses())
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_dashboard(self, *args):
+        out = StringIO()
+        status = dashboard.main([self.server.url] + list(args), out=out)
+        return status, out.getvalue()
+
+    def test_all_projects_json(self):
+        status, output = self.run_dashboard('all', '-f', 'json', '-w', '3')
+        self.assertEqual(0, status)
+        results = json.loads(output)['projects']
+        self.assertEqual(self.generator.project_ids(), [r['id'] for r in results])
+        self.assertEqual("Sprint 3", results[0]['status']['current_sprint'])
+        self.assertTrue(results[0]['elapsed'] > 0)
+
+    def test_ndjson_with_failure(self):
+        status, output = self.run_dashboard(str(self.generator.project_id(2)), '1', '-f', 'ndjson')
+        self.assertEqual(1, status)
+        results = dict((r['id'], r) for r in map(json.loads, output.splitlines()))
+        self.assertEqual(None, results[self.generator.project_id(2)]['error'])
+        self.assertTrue('404' in results[1]['error'])
+
+    def test_text(self):
+        status, output = self.run_dashboard(str(self.generator.project_id(0)))
+        self.assertTrue(output.startswith("Project 0 "))
+        self.assertTrue("items in 2 backlogs" in output)
+
+def test_suite():
+    return unittest.makeSuite(DashboardTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import datetime
+import socket
+import time
+import unittest
+import urllib2
+
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.cache import MemoryCache
+from basecampreporting.mocks import FixtureServer
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.project import Project
+from basecampreporting.scheduler import RequestScheduler, RetryPolicy
+from basecampreporting.hedging import Hedger
+from basecampreporting import deadlines
+from basecampreporting.deadlines import Deadline, DeadlineExceeded, within
+
+class DeadlineTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=9, projects=1, messages=2, comments=1,
+                                    today=datetime.date.today())
+        self.server = FixtureServer(self.gen.responses())
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def basecamp(self, **options):
+        return Basecamp(self.server.url, 'user', 'pass', **options)
+
+    def test_nesting(self):
+        self.assertEqual(None, deadlines.current())
+        inner = within(5, within, 0.5, deadlines.current)
+        self.assertEqual(0.5, inner.seconds)
+        outer = within(0.5, within, 5, deadlines.current)
+        self.assertEqual(0.5, outer.seconds)
+        self.assertEqual(None, within(None, deadlines.current))
+        self.assertEqual(None, deadlines.current())
+
+        deadline = Deadline(10)
+        self.assertEqual(2, deadline.timeout(2))
+        self.assertTrue(9 < deadline.timeout(None) <= 10)
+        self.assertRaises(DeadlineExceeded, Deadline(-1).check)
+
+    def test_socket_timeout(self):
+        bc = self.basecamp(timeout=0.2,
+                           scheduler=RequestScheduler(retry=RetryPolicy(max_retries=0)))
+        self.server.inject(delay=1)
+        started = time.time()
+        try:
+            bc.projects()
+        except (socket.error, urllib2.URLError):
+            pass
+        else:
+            self.fail("expected a timeout")
+        self.assertTrue(time.time() - started < 0.9)
+
+    def test_deadline(self):
+        bc = self.basecamp()
+        self.server.inject(delay=1)
+        started = time.time()
+        self.assertRaises(DeadlineExceeded, within, 0.2, bc.projects)
+        self.assertTrue(time.time() - started < 0.9)
+
+    def test_no_retry_past_deadline(self):
+        bc = self.basecamp()
+        self.server.inject(status=503, headers=[('Retry-After', '10')])
+        started = time.time()
+        self.assertRaises(DeadlineExceeded, within, 1.0, bc.projects)
+        self.assertTrue(time.time() - started < 0.9)
+
+    def test_stale_response(self):
+        cache = MemoryCache()
+        bc = self.basecamp(cache=cache, cache_ttl=0.01)
+        events = []
+        bc.add_listener(events.append)
+        xml = bc.projects()
+        # The fresh and the stale response are one entry.
+        self.assertEqual(1, len(cache.entries))
+        time.sleep(0.02)
+        self.server.inject(delay=1)
+        self.assertEqual(xml, within(0.2, bc.projects))
+        self.assertEqual('stale', events[-1].cache)
+
+        bc = self.basecamp(cache=cache, cache_ttl=0.01, stale_ttl=0)
+        self.server.inject(delay=1)
+        self.assertRaises(DeadlineExceeded, within, 0.2, bc.projects)
+
+    def test_forgotten_response_kept_stale(self):
+        cache = MemoryCache()
+        bc = self.basecamp(cache=cache)
+        xml = bc.projects()
+        requests = self.server.requests
+        bc.projects()
+        self.assertEqual(requests, self.server.requests)
+
+        bc.forget('projects')
+        bc.projects()
+        self.assertEqual(requests + 1, self.server.requests)
+        bc.forget('projects')
+        self.server.inject(delay=1)
+        self.assertEqual(xml, within(0.2, bc.projects))
+
+    def test_project_falls_back(self):
+        p = Project(self.server.url, self.gen.project_id(0), 'user', 'pass',
+                    deadline=0.2)
+        milestones = p.milestones
+        self.assertTrue(milestones)
+        self.assertEqual(set(), p.stale)
+
+        p.clear_cache()
+        self.server.inject(delay=1)
+        started = time.time()
+        self.assertTrue(p.milestones is milestones)
+        self.assertTrue(time.time() - started < 0.9)
+        self.assertEqual(set(['milestones']), p.stale)
+
+        # The stale copy isn't kept: the next use loads afresh.
+        self.assertFalse(p.cache['milestones'])
+        requests = self.server.requests
+        self.assertTrue(p.milestones)
+        self.assertEqual(requests + 1, self.server.requests)
+        self.assertEqual(set(), p.stale)
+        self.assertTrue(p.cache['milestones'])
+
+        # Nothing to fall back on.
+        self.server.inject(delay=1)
+        self.assertRaises(DeadlineExceeded, lambda: p.todo_lists)
+
+    def test_hedged_read(self):
+        hedger = Hedger(min_samples=3)
+        for i in range(3):
+            hedger.observe(0.01)
+        bc = self.basecamp(hedger=hedger)
+        self.server.inject(delay=1)
+        started = time.time()
+        self.assertTrue(bc.projects())
+        self.assertTrue(time.time() - started < 0.9)
+        self.assertEqual(1, hedger.hedged)
+        self.assertEqual(1, hedger.hedges_won)
+        self.assertEqual(2, self.server.requests)
+
+    def test_hedger_waits_for_samples(self):
+        hedger = Hedger(min_samples=3)
+        bc = self.basecamp(hedger=hedger)
+        bc.projects()
+        self.assertEqual(None, hedger.delay())
+        self.assertEqual(0, hedger.hedged)
+        self.assertEqual(1, len(hedger.latencies))
+
+def test_suite():
+    return unittest.makeSuite(DeadlineTests)
+
+if __name__ == "__main__":
+    unittest.main()
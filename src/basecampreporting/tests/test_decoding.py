@@ -0,0 +1,74 @@
+import datetime
+import unittest
+
+from basecampreporting.etree import ET
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.parser import parse_basecamp_xml
+from basecampreporting.portfolio import Portfolio
+from basecampreporting.project import Project
+from basecampreporting.decoding import DecodePool, decode_records, rebuild_records
+
+class DecodingTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=5, projects=2, messages=6, comments=2,
+                                    time_entries=30, today=datetime.date.today())
+        self.responses = self.gen.responses()
+        self.decoder = DecodePool(processes=2, min_bytes=0)
+
+    def tearDown(self):
+        self.decoder.close()
+
+    def project(self, decoder=None):
+        bc = TestBasecamp('http://FAKE', None, None)
+        bc.load_test_responses(self.responses)
+        return Project('http://FAKE', self.gen.project_id(0), None, None,
+                       basecamp=bc, decoder=decoder)
+
+    def test_rows(self):
+        p = self.project()
+        xml = p.bc.list_time_entries(p.id, datetime.date(1900, 1, 1),
+                                     datetime.date.today())
+        fields, rows = decode_records(xml, 'time-entry')
+        self.assertEqual(30, len(rows))
+        self.assertEqual(1, len(fields))
+        expected = [parse_basecamp_xml(node)
+                    for node in ET.fromstring(xml).findall('time-entry')]
+        self.assertEqual(expected, rebuild_records(fields, rows))
+
+    def test_same_models(self):
+        inline = self.project()
+        pooled = self.project(self.decoder)
+        for name in ('messages', 'comments', 'milestones', 'time_entries',
+                     'todo_items'):
+            self.assertEqual([r.to_dict() for r in getattr(inline, name)],
+                             [r.to_dict() for r in getattr(pooled, name)])
+        self.assertEqual(sorted(inline.todo_lists), sorted(pooled.todo_lists))
+        self.assertTrue(self.decoder.pool is not None)
+
+        # Values decoded elsewhere are interned in the parent.
+        names = [e.person_name for e in pooled.time_entries]
+        same = [e.person_name for e in pooled.time_entries if e.person_name == names[0]]
+        self.assertTrue(len(same) > 1)
+        self.assertTrue(same[0] is same[1])
+
+    def test_small_responses_stay_inline(self):
+        decoder = DecodePool(processes=2)
+        p = self.project(decoder)
+        self.assertTrue(p.milestones)
+        self.assertEqual(None, decoder.pool)
+
+    def test_portfolio(self):
+        bc = TestBasecamp('http://FAKE', None, None)
+        bc.load_test_responses(self.responses)
+        portfolio = Portfolio('http://FAKE', None, None, basecamp=bc, workers=2,
+                              decoder=self.decoder)
+        self.assertEqual(0, portfolio.load(['messages', 'time_entries']))
+        self.assertEqual(2 * 30, len([e for p in portfolio.projects
+                                      for e in p.time_entries]))
+
+def test_suite():
+    return unittest.makeSuite(DecodingTests)
+
+if __name__ == "__main__":
+    unittest.main()
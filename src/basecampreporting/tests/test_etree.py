@@ -0,0 +1,63 @@
+import datetime
+import os
+import unittest
+
+from basecampreporting import etree
+from basecampreporting.etree import ET
+from basecampreporting.mocks import TestProject
+from basecampreporting.generator import AccountGenerator
+
+class EtreeTests(unittest.TestCase):
+    def setUp(self):
+        self.previous = etree.current()
+        self.gen = AccountGenerator(seed=2, projects=1, messages=3, comments=1,
+                                    today=datetime.date.today())
+        self.responses = self.gen.responses()
+
+    def tearDown(self):
+        etree._backend = self.previous
+
+    def project(self):
+        return TestProject('http://FAKE', self.gen.project_id(0), None, None,
+                           self.responses)
+
+    def test_available(self):
+        names = etree.available()
+        self.assertTrue('cElementTree' in names)
+        self.assertTrue('ElementTree' in names)
+        self.assertEqual([n for n in etree.BACKENDS if n in names], names)
+        self.assertRaises(ValueError, etree.load, 'expat')
+
+    def test_select(self):
+        xml = '<?xml version="1.0" encoding="UTF-8"?>\n<todo-list><todo-items>' \
+              '<todo-item><id>1</id></todo-item><todo-item><id>2</id></todo-item>' \
+              '</todo-items><todo-item><id>3</id></todo-item></todo-list>'
+        for name in etree.available():
+            backend = etree.load(name)
+            for document in (xml, unicode(xml)):
+                self.assertEqual(['1', '2'], [node.findtext('id') for node in
+                                              backend.select(document, 'todo-items/todo-item')])
+
+    def test_use_reaches_importers(self):
+        expected = [m.to_dict() for m in self.project().messages]
+        for name in etree.available():
+            backend = etree.use(name)
+            self.assertEqual(name, ET.name)
+            self.assertTrue(etree.current() is backend)
+            p = self.project()
+            self.assertEqual(expected, [m.to_dict() for m in p.messages])
+            self.assertTrue(p.milestones)
+
+    def test_environment(self):
+        os.environ[etree.ENVIRONMENT_VARIABLE] = 'ElementTree'
+        try:
+            self.assertEqual('ElementTree', etree._default().name)
+        finally:
+            del os.environ[etree.ENVIRONMENT_VARIABLE]
+        self.assertEqual(etree.available()[0], etree._default().name)
+
+def test_suite():
+    return unittest.makeSuite(EtreeTests)
+
+if __name__ == "__main__":
+    unittest.main()
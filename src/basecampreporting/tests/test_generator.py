@@ -0,0 +1,64 @@
+import datetime
+import unittest
+from StringIO import StringIO
+
+from basecampreporting.serialization import json
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.project import Project
+from basecampreporting.mocks import TestBasecamp, FixtureServer
+from basecampreporting.generator import AccountGenerator
+
+class GeneratorTests(unittest.TestCase):
+    def setUp(self):
+        self.today = datetime.date.today()
+        self.generator = AccountGenerator(seed=7, projects=2, messages=30,
+                                          time_entries=50, today=self.today)
+        self.project_id = self.generator.project_id(1)
+
+    def project(self, basecamp=TestBasecamp):
+        return Project("http://FAKE.basecamphq.com/", self.project_id,
+                       "FAKE", "FAKE", basecamp=basecamp)
+
+    def test_seeded(self):
+        again = AccountGenerator(seed=7, projects=2, messages=30,
+                                 time_entries=50, today=self.today)
+        self.assertEqual(self.generator.responses(), again.responses())
+
+        other = AccountGenerator(seed=8, projects=2, messages=30,
+                                 time_entries=50, today=self.today)
+        self.assertNotEqual(self.generator.responses(), other.responses())
+
+    def test_write_json(self):
+        out = StringIO()
+        self.generator.write_json(out)
+        self.assertEqual(self.generator.responses(), json.loads(out.getvalue()))
+
+    def test_replay(self):
+        p = self.project()
+        p.bc.load_test_responses(self.generator.responses())
+
+        self.assertEqual(30, len(p.messages))
+        self.assertEqual(50, len(p.time_entries))
+        self.assertEqual(6, len(p.sprints))
+        self.assertEqual(2, len(p.backlogs))
+        self.assertEqual("Sprint 3", p.current_sprint.name)
+        self.assertEqual(4, len(p.upcoming_milestones))
+        self.assertTrue(p.messages[0].posted_on > p.messages[-1].posted_on)
+
+    def test_fixture_server(self):
+        server = FixtureServer(self.generator.responses())
+        server.start()
+        try:
+            p = self.project(basecamp=Basecamp)
+            p.bc = Basecamp(server.url, "FAKE", "FAKE")
+            self.assertEqual(30, len(p.messages))
+            self.assertEqual(8, len(p.todo_lists))
+            self.assertEqual(self.project_id, p.time_entries[0].project_id)
+        finally:
+            server.stop()
+
+def test_suite():
+    return unittest.makeSuite(GeneratorTests)
+
+if __name__ == "__main__":
+    unittest.main()
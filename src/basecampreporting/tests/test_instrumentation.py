@@ -0,0 +1,66 @@
+import os
+import unittest
+
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.mocks import TestProject, FixtureServer
+from basecampreporting.instrumentation import Histogram, request_shape
+
+class InstrumentationTests(unittest.TestCase):
+    def setUp(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        self.fixtures_path = os.path.join(base_path, ".", "fixtures", "project.recorded.json")
+        self.project = TestProject("http://FAKE.basecamphq.com/", 2849305,
+                                   "FAKE", "FAKE", self.fixtures_path)
+
+    def test_off_by_default(self):
+        self.assertEqual(None, self.project.stats)
+        self.assertEqual([], self.project.bc.listeners)
+
+    def test_replayed_requests(self):
+        stats = self.project.instrument()
+        self.project.comments
+        self.assertEqual(3, stats.requests)
+        self.assertEqual(3, stats.cache_hits)
+        self.assertEqual(2, stats.endpoints[('POST', '/msg/comments/:id')].requests)
+        self.assertEqual(1, stats.endpoints[('POST', '/projects/:id/msg/archive')].requests)
+
+        self.project.uninstrument()
+        self.project.milestones
+        self.assertEqual(3, stats.requests)
+
+    def test_network_requests(self):
+        server = FixtureServer(self.project.bc.load_test_fixtures(self.fixtures_path))
+        server.start()
+        try:
+            bc = Basecamp(server.url, "FAKE", "FAKE")
+            events = []
+            bc.add_listener(events.append)
+            bc.list_milestones(2849305)
+            self.assertRaises(Exception, bc.person, 1)
+        finally:
+            server.stop()
+        self.assertEqual([200, 404], [e.status for e in events])
+        self.assertEqual('POST', events[0].method)
+        self.assertTrue(events[0].bytes > 0)
+        self.assertTrue(events[0].ttfb <= events[0].latency)
+        self.assertTrue(events[1].error is not None)
+
+    def test_histogram(self):
+        h = Histogram()
+        for value in [0.002] * 90 + [0.3] * 9 + [4.0]:
+            h.add(value)
+        self.assertEqual(0.0025, h.percentile(0.5))
+        self.assertEqual(0.5, h.percentile(0.95))
+        self.assertEqual(4.0, h.percentile(1.0))
+
+    def test_request_shape(self):
+        self.assertEqual('/time_entries/report.xml',
+                         request_shape('/time_entries/report.xml?from=19000101'))
+        self.assertEqual('/projects/:id/milestones/list',
+                         request_shape('/projects/2849305/milestones/list'))
+
+def test_suite():
+    return unittest.makeSuite(InstrumentationTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import datetime
+import threading
+import unittest
+from itertools import islice
+
+from basecampreporting.mocks import TestProject
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.instrumentation import RequestStats
+from basecampreporting.paging import iter_pages, full_page
+
+class PagingTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=6, projects=1, messages=40, comments=2,
+                                    time_entries=120, today=datetime.date.today())
+        self.responses = self.gen.responses()
+        self.p = TestProject('http://FAKE', self.gen.project_id(0), None, None,
+                             self.responses)
+        self.stats = self.p.instrument()
+
+    def pages(self, count, size=3):
+        fetched = []
+        lock = threading.Lock()
+        def fetch(page):
+            lock.acquire()
+            fetched.append(page)
+            lock.release()
+            records = range((page - 1) * size, min(page * size, count))
+            return full_page(records, size)
+        return fetched, fetch
+
+    def test_iter_pages(self):
+        fetched, fetch = self.pages(7)
+        self.assertEqual(range(7), list(iter_pages(fetch)))
+        self.assertEqual([1, 2, 3], fetched)
+
+        fetched, fetch = self.pages(6)
+        self.assertEqual(range(6), list(iter_pages(fetch, prefetch=False)))
+        self.assertEqual([1, 2, 3], fetched)
+
+    def test_early_exit(self):
+        fetched, fetch = self.pages(30)
+        self.assertEqual([0, 1], list(islice(iter_pages(fetch), 2)))
+        # The second page was fetched ahead; nothing after it.
+        self.assertEqual([1, 2], sorted(fetched))
+
+        fetched, fetch = self.pages(30)
+        self.assertEqual([0, 1], list(islice(iter_pages(fetch, lookahead=1), 2)))
+        self.assertEqual([1], fetched)
+
+    def test_errors(self):
+        def fetch(page):
+            if page == 2: raise ValueError(page)
+            return range(3), True
+        pages = iter_pages(fetch)
+        self.assertEqual(range(3), list(islice(pages, 3)))
+        self.assertRaises(ValueError, pages.next)
+
+    def test_time_entries(self):
+        latest = list(islice(self.p.iter_time_entries(), 20))
+        self.assertEqual(20, len(latest))
+        self.assertEqual(2, self.stats.requests)
+
+        ids = [e.id for e in self.p.iter_time_entries()]
+        self.assertEqual(sorted(ids), sorted([e.id for e in self.p.time_entries]))
+        self.assertEqual(120, len(set(ids)))
+
+        # Once loaded, the cached entries come newest first too.
+        self.assertTrue(self.p.cache['time_entries'])
+        dates = [e.date for e in self.p.iter_time_entries()]
+        self.assertEqual(120, len(dates))
+        self.assertEqual(sorted(dates, reverse=True), dates)
+
+    def test_messages(self):
+        latest = list(islice(self.p.iter_messages(), 20))
+        self.assertEqual(1, self.stats.requests)
+        self.assertEqual(None, self.p.cache['messages'] or None)
+
+        everything = list(self.p.iter_messages())
+        self.assertEqual([m.id for m in self.p.messages], [m.id for m in everything])
+        self.assertEqual([m.id for m in latest], [m.id for m in everything[:20]])
+        requests = self.stats.requests
+        self.assertEqual(40, len(list(self.p.iter_messages())))
+        self.assertEqual(requests, self.stats.requests)
+
+    def test_comments(self):
+        self.p.messages
+        first = list(islice(self.p.iter_comments(), 2))
+        self.assertEqual(1 + 2, self.stats.requests)
+        self.assertEqual(set([self.gen.message_id(0, 0)]), set([c.post_id for c in first]))
+        self.assertEqual(40 * 2, len(list(self.p.iter_comments())))
+
+def test_suite():
+    return unittest.makeSuite(PagingTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,7 @@ import unittest
 import os
 import pprint
 
-from basecampreporting.parser import parse_basecamp_xml
+from basecampreporting.parser import parse_basecamp_xml, Interner
 
 class ParserTests(unittest.TestCase):
     def setUp(self):
@@ -58,6 +58,29 @@ class ParserTests(unittest.TestCase):
         actual = self.parse(self.fixture('message.xml'))
         self.assertEqual(expected, actual)
             
+    def test_interning(self):
+        interner = Interner()
+        first = self.parse(self.fixture('project.xml'), interner)
+        second = self.parse(self.fixture('project.xml'), interner)
+        self.assertEqual(first, second)
+        self.assertTrue(first['status'] is second['status'])
+        self.assertTrue(first['company']['name'] is second['company']['name'])
+        self.assertTrue(first['created_on'] is second['created_on'])
+        # Datetimes are nearly all distinct and are left alone.
+        self.assertFalse(first['last_changed_on'] is second['last_changed_on'])
+        stats = interner.stats()
+        self.assertTrue(stats['hits'] >= 4)
+        self.assertTrue(stats['bytes_saved'] > 0)
+
+    def test_interner_bounded(self):
+        interner = Interner(max_values=10)
+        kept = interner(u'kept')
+        for n in range(100):
+            interner(u'value %s' % n)
+            self.assertTrue(interner(u'kept') is kept)
+            self.assertTrue(interner.stats()['values'] <= 20)
+        self.assertFalse((unicode, u'value 0') in interner.previous)
+
 def test_suite():
     return unittest.makeSuite(ParserTests)
         
@@ -0,0 +1,70 @@
+import datetime
+import unittest
+
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.instrumentation import RequestStats
+from basecampreporting.project import Project
+
+class PlannerTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=2, projects=1, milestones=30, sprints=8,
+                                    today=datetime.date.today())
+        self.bc = TestBasecamp('http://FAKE', None, None)
+        self.bc.load_test_responses(self.gen.responses())
+        self.stats = RequestStats()
+        self.bc.add_listener(self.stats)
+
+    def project(self):
+        return Project('http://FAKE', self.gen.project_id(0), None, None, basecamp=self.bc)
+
+    def test_late_milestones_cold(self):
+        full = self.project()
+        expected = [m.id for m in full.milestones if m.is_late]
+        full_bytes = self.stats.bytes_received
+        self.stats.reset()
+
+        p = self.project()
+        self.assertEqual(expected, [m.id for m in p.late_milestones])
+        self.assertTrue(0 < self.stats.bytes_received < full_bytes / 2)
+        self.assertFalse(p.cache['milestones'])
+
+        # With the full list cached no narrow request is made.
+        self.stats.reset()
+        self.assertEqual(expected, [m.id for m in full.late_milestones])
+        self.assertEqual(0, self.stats.requests)
+
+    def test_sprints_cold(self):
+        full = self.project()
+        expected = (full.current_sprint.name, [s.name for s in full.upcoming_sprints],
+                    full.backlogged_count)
+        full.todo_lists
+        self.stats.reset()
+
+        p = self.project()
+        self.assertEqual(expected, (p.current_sprint.name, [s.name for s in p.upcoming_sprints],
+                                    p.backlogged_count))
+        self.assertEqual(1, self.stats.requests)
+        self.assertFalse(p.cache['todo_lists'])
+
+        p.todo_lists
+        p.clear_cache('todo_lists')
+        self.assertEqual(None, p.cache['uncompleted_todo_lists'])
+
+    def test_messages_in_category(self):
+        full = self.project()
+        category = full.messages[0].category['id']
+        expected = [m.id for m in full.messages if m.category['id'] == category]
+        self.stats.reset()
+
+        p = self.project()
+        self.assertEqual(expected, [m.id for m in p.messages_in_category(category)])
+        self.assertEqual(expected, [m.id for m in p.messages_in_category(category)])
+        self.assertEqual(1, self.stats.requests)
+        self.assertEqual(expected, [m.id for m in full.messages_in_category(category)])
+
+def test_suite():
+    return unittest.makeSuite(PlannerTests)
+
+if __name__ == "__main__":
+    unittest.main()
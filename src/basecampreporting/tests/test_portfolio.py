@@ -0,0 +1,88 @@
+import datetime
+import unittest
+
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.instrumentation import RequestStats
+from basecampreporting.portfolio import Portfolio
+
+class PortfolioTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=11, projects=4, messages=4, comments=1,
+                                    time_entries=20, today=datetime.date.today())
+        self.bc = TestBasecamp('http://FAKE', None, None)
+        self.bc.load_test_responses(self.gen.responses())
+        self.portfolio = Portfolio('http://FAKE', None, None, basecamp=self.bc,
+                                   workers=3)
+
+    def test_projects_share_client(self):
+        projects = self.portfolio.projects
+        self.assertEqual(self.gen.project_ids(), [p.id for p in projects])
+        for p in projects:
+            self.assertTrue(p.bc is self.bc)
+            self.assertTrue(p.cache['persons'] is self.portfolio.people_cache)
+            self.assertTrue(p.interner is self.portfolio.interner)
+            self.assertTrue(p.name)
+
+        statuses = set(p.status for p in projects)
+        only = Portfolio('http://FAKE', None, None, basecamp=self.bc,
+                         statuses=[statuses.pop()])
+        self.assertTrue(0 < len(only.projects) <= len(projects))
+
+    def test_load(self):
+        stats = RequestStats()
+        self.bc.add_listener(stats)
+        self.assertEqual(0, self.portfolio.load(['milestones', 'todo_lists']))
+        # One listing plus two collections per project, and no project info.
+        self.assertEqual(1 + 2 * 4, stats.requests)
+        for p in self.portfolio.projects:
+            self.assertTrue(p.cache['milestones'])
+
+    def test_aggregates(self):
+        late = self.portfolio.late_milestones
+        expected = sum([len(p.late_milestones) for p in self.portfolio.projects])
+        self.assertEqual(expected, len(late))
+        deadlines = [m.deadline for p, m in late]
+        self.assertEqual(sorted(deadlines), deadlines)
+
+        totals = self.portfolio.backlog_totals
+        self.assertEqual(sum([p.backlogged_count for p in self.portfolio.projects]),
+                         totals[None])
+
+        hours = self.portfolio.time_by_person
+        entries = [e for p in self.portfolio.projects for e in p.time_entries]
+        self.assertEqual(4 * 20, len(entries))
+        self.assertAlmostEqual(sum([e.hours for e in entries]), sum(hours.values()))
+
+    def test_errors(self):
+        failed_id = self.gen.project_id(1)
+        bad = self.portfolio.project(failed_id)
+        def boom():
+            raise ValueError("unavailable")
+        bad._load_milestones = boom
+        self.assertEqual(1, self.portfolio.load(['milestones']))
+        self.assertTrue((failed_id, 'milestones') in self.portfolio.errors)
+        self.assertEqual(3, len(self.portfolio.loaded('milestones')))
+
+    def test_errors_by_collection(self):
+        failed_id = self.gen.project_id(1)
+        bad = self.portfolio.project(failed_id)
+        def boom():
+            raise ValueError("unavailable")
+        bad._load_milestones = boom
+        self.assertEqual(1, self.portfolio.load(['milestones']))
+
+        # Loading another collection neither clears the failure nor hides
+        # the project from aggregates over that collection.
+        self.assertEqual(0, self.portfolio.load(['time_entries']))
+        self.assertTrue((failed_id, 'milestones') in self.portfolio.errors)
+        self.assertEqual(4, len(self.portfolio.loaded('time_entries')))
+        self.assertEqual(3, len(self.portfolio.loaded('milestones')))
+        late = self.portfolio.late_milestones
+        self.assertFalse([p for p, m in late if p.id == failed_id])
+
+def test_suite():
+    return unittest.makeSuite(PortfolioTests)
+
+if __name__ == "__main__":
+    unittest.main()
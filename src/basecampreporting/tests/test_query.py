@@ -0,0 +1,77 @@
+import datetime
+import unittest
+
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.project import Project
+from basecampreporting.query import Query, RecordIndex
+
+class Record(object):
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+class QueryTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=4, projects=1, messages=200, comments=0,
+                                    time_entries=300, today=datetime.date.today())
+        self.bc = TestBasecamp('http://FAKE', None, None)
+        self.bc.load_test_responses(self.gen.responses())
+        self.p = Project('http://FAKE', self.gen.project_id(0), None, None, basecamp=self.bc)
+
+    def test_where(self):
+        author = self.p.messages[0].author_id
+        category = self.p.messages[0].category['id']
+        expected = [m for m in self.p.messages
+                    if m.author_id == author and m.category['id'] == category]
+        found = self.p.query('messages').where({'category.id': category}, author_id=author).all()
+        self.assertEqual(expected, found)
+
+        people = [e.person_id for e in self.p.time_entries[:3]]
+        expected = [e for e in self.p.time_entries if e.person_id in people]
+        self.assertEqual(expected, self.p.query('time_entries').where(person_id=people).all())
+        self.assertEqual([], self.p.query('time_entries').where(person_id=-1).all())
+
+    def test_between_order_limit(self):
+        since = self.p.messages[50].posted_on
+        query = self.p.query('messages').between('posted_on', low=since)
+        expected = [m for m in self.p.messages if m.posted_on >= since]
+        self.assertEqual(len(expected), len(query))
+
+        newest = sorted(self.p.messages, key=lambda m: m.posted_on, reverse=True)[:5]
+        self.assertEqual(newest, self.p.query('messages').order_by('posted_on', descending=True).limit(5).all())
+
+        author = self.p.messages[0].author_id
+        mine = [m for m in self.p.messages if m.author_id == author]
+        mine.sort(key=lambda m: m.posted_on)
+        self.assertEqual(mine[:2], self.p.query('messages').where(author_id=author)
+                         .order_by('posted_on').limit(2).all())
+
+        hours = self.p.query('time_entries').filter(lambda e: e.hours > 4) \
+                      .order_by('date').all()
+        self.assertEqual(sorted([e.date for e in self.p.time_entries if e.hours > 4]),
+                         [e.date for e in hours])
+
+    def test_missing_values_last(self):
+        records = [Record(n=1, day=3), Record(n=2, day=None), Record(n=3, day=1)]
+        query = Query(RecordIndex(records))
+        self.assertEqual([3, 1, 2], [r.n for r in query.order_by('day')])
+        self.assertEqual([1, 3, 2], [r.n for r in query.order_by('day', descending=True)])
+        self.assertEqual([3], [r.n for r in query.between('day', high=2)])
+        self.assertEqual(records[0], query.where(n=[1, 2]).first())
+
+    def test_indexes_follow_cache(self):
+        query = self.p.query('messages')
+        query.where(author_id=1).all()
+        index = self.p.indexes['messages']
+        self.assertTrue('author_id' in index.hashes)
+        self.assertTrue(self.p.query('messages').index is index)
+
+        self.p.clear_cache('messages')
+        self.assertFalse(self.p.query('messages').index is index)
+        self.assertEqual(len(self.p.messages), len(self.p.query('messages')))
+
+def test_suite():
+    return unittest.makeSuite(QueryTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import threading
+import time
+import unittest
+import urllib2
+
+from basecampreporting.serialization import json
+from basecampreporting.mocks import TestProject
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.refresher import Refresher, SnapshotServer
+
+class RefresherTests(unittest.TestCase):
+    def setUp(self):
+        self.generator = AccountGenerator(seed=9, projects=3, messages=4)
+        responses = self.generator.responses()
+        self.fetches = []
+
+        def factory(project_id):
+            self.fetches.append(project_id)
+            return TestProject("http://FAKE.basecamphq.com/", project_id,
+                               "FAKE", "FAKE", responses)
+
+        self.refresher = Refresher(self.generator.project_ids(), factory,
+                                   interval=60, jitter=0.001, workers=2, max_age=60)
+        self.server = SnapshotServer(self.refresher)
+
+    def tearDown(self):
+        self.refresher.stop()
+        self.server.server_close()
+
+    def fetch(self, path, headers=()):
+        thread = threading.Thread(target=self.server.handle_request)
+        thread.start()
+        req = urllib2.Request(self.server.url + path, headers=dict(headers))
+        try:
+            response = urllib2.urlopen(req)
+            result = response.code, response.info(), response.read()
+        except urllib2.HTTPError, e:
+            result = e.code, e.info(), e.read()
+        thread.join()
+        return result
+
+    def wait_for_snapshots(self):
+        for i in range(200):
+            if len(self.refresher.snapshots) == 3: return
+            time.sleep(0.01)
+        self.fail("snapshots never arrived")
+
+    def test_not_loaded_yet(self):
+        code, headers, body = self.fetch('/projects/%s.json' % self.generator.project_id(0))
+        self.assertEqual(503, code)
+        self.assertEqual('1', headers['Retry-After'])
+
+    def test_serves_snapshots(self):
+        self.refresher.start()
+        self.wait_for_snapshots()
+        project_id = self.generator.project_id(1)
+        code, headers, body = self.fetch('/projects/%s.json' % project_id)
+        self.assertEqual(200, code)
+        self.assertEqual(self.refresher.get(project_id).etag, headers['ETag'])
+        self.assertEqual(4, len(json.loads(body)['messages']))
+
+        code, headers, body = self.fetch('/projects/%s.json' % project_id,
+                                         [('If-None-Match', headers['ETag'])])
+        self.assertEqual(304, code)
+
+        code, headers, body = self.fetch('/projects')
+        self.assertEqual(self.generator.project_ids(), [p['id'] for p in json.loads(body)])
+
+    def test_stale_while_revalidate(self):
+        self.refresher.start()
+        self.wait_for_snapshots()
+        project_id = self.generator.project_id(2)
+        self.refresher.max_age = 0
+        stale = self.refresher.get(project_id)
+        code, headers, body = self.fetch('/projects/%s.json' % project_id)
+        self.assertEqual(200, code)
+        self.assertTrue('Stale' in headers['Warning'])
+        self.assertEqual(stale.json, body)
+        for i in range(200):
+            if self.refresher.get(project_id) is not stale: break
+            time.sleep(0.01)
+        self.assertTrue(self.refresher.get(project_id) is not stale)
+        self.assertEqual(2, self.fetches.count(project_id))
+
+def test_suite():
+    return unittest.makeSuite(RefresherTests)
+
+if __name__ == "__main__":
+    unittest.main()
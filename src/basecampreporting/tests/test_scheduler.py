@@ -0,0 +1,88 @@
+import threading
+import time
+import unittest
+import urllib2
+from StringIO import StringIO
+
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.mocks import FixtureServer
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.scheduler import RequestScheduler, RetryPolicy, TokenBucket, \
+    READ, WRITE, request_kind
+
+class SchedulerTests(unittest.TestCase):
+    def http_error(self, code, headers=None):
+        hdrs = headers and dict(headers) or {}
+        return urllib2.HTTPError('http://FAKE', code, 'error', hdrs, StringIO(''))
+
+    def test_request_kind(self):
+        self.assertEqual(READ, request_kind('/projects/1/msg/archive'))
+        self.assertEqual(WRITE, request_kind('/todos/complete_item/1'))
+        self.assertEqual(WRITE, request_kind('/projects/1/milestones/create'))
+
+    def test_retry_policy(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.should_retry(self.http_error(503), WRITE))
+        self.assertTrue(policy.should_retry(self.http_error(500), READ))
+        self.assertFalse(policy.should_retry(self.http_error(500), WRITE))
+        self.assertFalse(policy.should_retry(self.http_error(404), READ))
+        self.assertTrue(policy.should_retry(urllib2.URLError('timed out'), READ))
+        self.assertFalse(policy.should_retry(urllib2.URLError('timed out'), WRITE))
+        self.assertEqual(7.0, policy.retry_after(self.http_error(503, [('Retry-After', '7')])))
+        self.assertTrue(7.0 <= policy.delay(0, 7.0) <= 7.5)
+        self.assertTrue(0 <= policy.delay(3) <= 4.0)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        started = time.time()
+        for i in range(11):
+            bucket.take()
+        self.assertTrue(time.time() - started >= 0.09)
+
+        bucket = TokenBucket()
+        for i in range(5):
+            bucket.take()
+        bucket.throttled(0.05)
+        self.assertTrue(bucket.rate > 0)
+        started = time.time()
+        bucket.take()
+        self.assertTrue(time.time() - started >= 0.04)
+
+    def test_in_flight_cap(self):
+        scheduler = RequestScheduler(max_in_flight=2)
+        lock = threading.Lock()
+        state = dict(current=0, peak=0)
+        def work():
+            lock.acquire(); state['current'] += 1; state['peak'] = max(state['peak'], state['current']); lock.release()
+            time.sleep(0.01)
+            lock.acquire(); state['current'] -= 1; lock.release()
+        threads = [threading.Thread(target=scheduler.call, args=('acct', i % 3 and READ or WRITE, work))
+                   for i in range(9)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(2, state['peak'])
+
+    def test_retries_throttled_requests(self):
+        generator = AccountGenerator(messages=3)
+        server = FixtureServer(generator.responses())
+        server.start()
+        try:
+            retry = RetryPolicy(base_delay=0.01)
+            bc = Basecamp(server.url, "FAKE", "FAKE", scheduler=RequestScheduler(retry=retry))
+            events = []
+            bc.add_listener(events.append)
+            server.inject(503, [('Retry-After', '0')], count=2)
+            self.assertTrue(bc.message_archive(generator.project_id(0)))
+            self.assertEqual(2, events[0].retries)
+            self.assertEqual(3, server.requests)
+
+            server.inject(500)
+            self.assertRaises(urllib2.HTTPError, bc.complete_todo_item, 1)
+        finally:
+            server.stop()
+
+def test_suite():
+    return unittest.makeSuite(SchedulerTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import threading
+import time
+import unittest
+
+from basecampreporting.basecamp import Basecamp
+from basecampreporting.project import Project
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.singleflight import SingleFlight
+
+class SingleFlightTests(unittest.TestCase):
+    def slow_basecamp(self, responses=None):
+        bc = Basecamp('http://FAKE', None, None)
+        bc.sent = []
+        def send(path, data=None, event=None):
+            bc.sent.append(path)
+            time.sleep(0.05)
+            if responses is None: return '<ok/>'
+            return responses['GET'].get(path) or responses['POST'][path].values()[0]
+        bc._send = send
+        return bc
+
+    def run_threads(self, target, count=5):
+        results = []
+        def run():
+            results.append(target())
+        threads = [threading.Thread(target=run) for i in range(count)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        return results
+
+    def test_shares_result(self):
+        flights = SingleFlight()
+        calls = []
+        def work():
+            calls.append(1)
+            time.sleep(0.05)
+            return 42
+        results = self.run_threads(lambda: flights.do('key', work))
+        self.assertEqual([42] * 5, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(4, flights.shared)
+        self.assertEqual(0, flights.in_flight())
+
+        # Nothing is remembered once the call is over.
+        flights.do('key', work)
+        self.assertEqual(2, len(calls))
+
+    def test_shares_exception(self):
+        flights = SingleFlight()
+        def work():
+            time.sleep(0.05)
+            raise ValueError("boom")
+        def call():
+            try:
+                flights.do('key', work)
+            except ValueError, e:
+                return str(e)
+        self.assertEqual(["boom"] * 5, self.run_threads(call))
+
+    def test_reads_coalesced_writes_not(self):
+        bc = self.slow_basecamp()
+        self.run_threads(lambda: bc.message_archive(1))
+        self.assertEqual(1, len(bc.sent))
+
+        bc.sent = []
+        self.run_threads(lambda: bc.complete_todo_item(7))
+        self.assertEqual(5, len(bc.sent))
+
+    def test_project_loads_once(self):
+        gen = AccountGenerator(seed=3, projects=1, messages=3, comments=1)
+        bc = self.slow_basecamp(gen.responses())
+        p = Project('http://FAKE', gen.project_id(0), None, None, basecamp=bc)
+        results = self.run_threads(lambda: p.comments)
+        self.assertTrue(results[0])
+        for comments in results:
+            self.assertTrue(comments is results[0])
+        self.assertEqual(len(set(bc.sent)), len(bc.sent))
+
+def test_suite():
+    return unittest.makeSuite(SingleFlightTests)
+
+if __name__ == "__main__":
+    unittest.main()
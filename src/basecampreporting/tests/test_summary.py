@@ -0,0 +1,63 @@
+import datetime
+import unittest
+
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.instrumentation import RequestStats
+from basecampreporting.project import Project
+from basecampreporting.summary import ProjectSummary, FIELDS
+from basecampreporting.serialization import json, BasecampObjectEncoder
+
+class SummaryTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=6, projects=3, messages=8, comments=2,
+                                    milestones=15, today=datetime.date.today())
+        self.bc = TestBasecamp('http://FAKE', None, None)
+        self.bc.load_test_responses(self.gen.responses())
+
+    def project(self, index=0):
+        return Project('http://FAKE', self.gen.project_id(index), None, None, basecamp=self.bc)
+
+    def test_matches_properties(self):
+        for index in range(3):
+            p = self.project(index)
+            summary = p.summary
+            self.assertEqual(len(p.late_milestones), summary.late_milestones)
+            self.assertEqual(p.previous_milestones[0].title, summary.previous_milestone['title'])
+            self.assertEqual(p.upcoming_milestones[0].title, summary.next_milestone['title'])
+            self.assertEqual(p.upcoming_milestones[0].deadline, summary.next_milestone['deadline'])
+            self.assertEqual(p.current_sprint.name, summary.current_sprint)
+            self.assertEqual(len(p.upcoming_sprints), summary.upcoming_sprints)
+            self.assertEqual(len(p.backlogs), summary.backlog_count)
+            self.assertEqual(p.backlogged_count, summary.backlogged_count)
+            self.assertEqual(p.last_changed_on, summary.last_changed_on)
+            latest = max([m.posted_on for m in p.messages] + [c.posted_on for c in p.comments])
+            self.assertEqual(latest, summary.last_communique)
+            self.assertTrue(summary.last_author)
+
+    def test_cached_until_collections_change(self):
+        p = self.project()
+        summary = p.summary
+        stats = RequestStats()
+        self.bc.add_listener(stats)
+        self.assertTrue(p.summary is summary)
+        self.assertEqual(0, stats.requests)
+
+        p.clear_cache('milestones')
+        self.assertFalse(p.summary is summary)
+        self.assertEqual(1, stats.requests)
+
+    def test_to_dict(self):
+        summary = self.project().summary
+        values = summary.to_dict()
+        self.assertEqual(sorted(FIELDS), sorted(values.keys()))
+        values['name'] = 'changed'
+        self.assertNotEqual('changed', summary.name)
+        self.assertTrue(json.dumps(values, cls=BasecampObjectEncoder))
+        self.assertEqual(None, ProjectSummary().next_milestone)
+
+def test_suite():
+    return unittest.makeSuite(SummaryTests)
+
+if __name__ == "__main__":
+    unittest.main()
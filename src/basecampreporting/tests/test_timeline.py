@@ -0,0 +1,78 @@
+import datetime
+import unittest
+
+from basecampreporting.mocks import TestBasecamp
+from basecampreporting.generator import AccountGenerator
+from basecampreporting.project import Project
+from basecampreporting.sample import project_status
+from basecampreporting.timeline import Timeline, Event, merge
+
+class TimelineTests(unittest.TestCase):
+    def setUp(self):
+        self.gen = AccountGenerator(seed=9, projects=2, messages=6, comments=2,
+                                    time_entries=15, today=datetime.date.today())
+        self.bc = TestBasecamp('http://FAKE', None, None)
+        self.bc.load_test_responses(self.gen.responses())
+        self.projects = [Project('http://FAKE', project_id, None, None, basecamp=self.bc)
+                         for project_id in self.gen.project_ids()]
+
+    def event(self, day):
+        return Event(datetime.datetime(2009, 1, day), 'test', 1, str(day), None)
+
+    def test_merge(self):
+        consumed = []
+        def stream(days):
+            for day in days:
+                consumed.append(day)
+                yield self.event(day)
+        merged = merge([stream([9, 5, 1]), stream([8, 7]), stream([]), stream([6, 2])])
+        self.assertEqual('9', merged.next().title)
+        # Only the head of each stream has been read.
+        self.assertEqual([9, 8, 6], sorted(consumed, reverse=True))
+        self.assertEqual(['8', '7', '6', '5', '2', '1'], [e.title for e in merged])
+
+    def test_latest_and_since(self):
+        timeline = Timeline(self.projects, ('message', 'comment', 'milestone',
+                                            'todo', 'time_entry'))
+        events = list(timeline)
+        timestamps = [e.timestamp for e in events]
+        self.assertEqual(sorted(timestamps, reverse=True), timestamps)
+        self.assertEqual(set(self.gen.project_ids()), set(e.project_id for e in events))
+        self.assertEqual(set(['message', 'comment', 'milestone', 'todo', 'time_entry']),
+                         set(e.kind for e in events))
+        self.assertEqual(len(self.projects[0].time_entries) + len(self.projects[1].time_entries),
+                         len([e for e in events if e.kind == 'time_entry']))
+
+        rows = lambda events: [(e.timestamp, e.kind, e.item) for e in events]
+        self.assertEqual(rows(events[:5]), rows(timeline.latest(5)))
+        cutoff = events[10].timestamp
+        self.assertEqual(rows([e for e in events if e.timestamp >= cutoff]),
+                         rows(timeline.since(cutoff)))
+        self.assertEqual(events[0].timestamp, timeline.last_activity)
+        self.assertRaises(ValueError, Timeline, self.projects, ('wiki',))
+
+    def test_sorted_once(self):
+        p = self.projects[0]
+        timeline = Timeline([p])
+        self.assertTrue(timeline.latest(1))
+        sorted_entries = p._timeline_events['time_entry'][1]
+        self.assertEqual(len(p.time_entries), len(sorted_entries))
+        self.assertTrue(Timeline([p]).last_activity)
+        self.assertTrue(p._timeline_events['time_entry'][1] is sorted_entries)
+        self.assertFalse('message' in p._timeline_events)
+
+        # A reloaded collection is sorted again.
+        p.clear_cache('time_entries')
+        self.assertEqual(3, len(timeline.latest(3)))
+        self.assertFalse(p._timeline_events['time_entry'][1] is sorted_entries)
+
+    def test_last_communique(self):
+        p = self.projects[0]
+        latest = max([m.posted_on for m in p.messages] + [c.posted_on for c in p.comments])
+        self.assertEqual(latest, project_status(p)['last_communique'])
+
+def test_suite():
+    return unittest.makeSuite(TimelineTests)
+
+if __name__ == "__main__":
+    unittest.main()
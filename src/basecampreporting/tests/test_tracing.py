@@ -0,0 +1,53 @@
+import unittest
+
+from basecampreporting.mocks import TestProject
+from basecampreporting.generator import AccountGenerator
+from basecampreporting import tracing
+from basecampreporting.tracing import Tracer
+
+class TracingTests(unittest.TestCase):
+    def setUp(self):
+        self.generator = AccountGenerator(seed=3, messages=5)
+        self.project = TestProject("http://FAKE.basecamphq.com/",
+                                   self.generator.project_id(0),
+                                   "FAKE", "FAKE", self.generator.responses())
+        self.tracer = Tracer().attach(self.project)
+
+    def test_attribution(self):
+        self.project.comments
+        node = self.tracer.root.children['Project.comments']
+        self.assertEqual(4, node.request_count)
+        self.assertEqual(['Project.messages'],
+                         node.children['Project.messages'].chain[1:])
+        count, paths = node.children['Basecamp.comments'].requests[('POST', '/msg/comments/:id')]
+        self.assertEqual(3, count)
+
+    def test_n_plus_one(self):
+        self.project.to_dict()
+        self.assertEqual([(['BasecampObject.to_dict', 'Project.comments', 'Basecamp.comments'],
+                           'POST', '/msg/comments/:id', 3)],
+                         self.tracer.n_plus_one())
+        self.assertEqual([], self.tracer.duplicates())
+        self.assertTrue('<-- N+1' in self.tracer.report())
+
+    def test_duplicates(self):
+        self.project.milestones
+        self.project.clear_cache()
+        self.project.milestones
+        self.assertEqual([('POST', '/projects/%s/milestones/list' % self.generator.project_id(0), 2)],
+                         self.tracer.duplicates())
+
+    def test_enable_from_environment(self):
+        self.assertEqual(None, tracing.enable_from_environment({}))
+        tracer = tracing.enable_from_environment({'BASECAMPREPORTING_TRACE': '1'})
+        try:
+            self.assertTrue(isinstance(tracer, Tracer))
+            self.assertTrue(tracing.enable() is tracer)
+        finally:
+            tracing.disable()
+
+def test_suite():
+    return unittest.makeSuite(TracingTests)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Activity timeline across content types and projects.
+
+    timeline = Timeline([project])
+    for event in timeline.latest(10):
+        print event.timestamp, event.kind, event.title
+
+    changed = Timeline(portfolio.projects).since(datetime.datetime(2009, 3, 1))
+
+Every source (messages, comments, milestone completions, todo completions,
+time entries) of every project becomes one stream of events sorted newest
+first. The timeline is a lazy k-way merge of those streams through a heap
+holding one event per stream, so reading the latest n events costs about
+n * log(streams) once the sources are loaded, and since() stops at the first
+event older than its cutoff instead of walking the rest. Messages and
+comments already come newest first and are turned into events only as
+they are read. Milestones, todos and time entries are sorted once per
+loaded collection, and that order is kept on the project until the
+collection is replaced.
+
+Only the sources a timeline asks for are loaded. 'todo' needs a request per
+todo list, so it is not among the defaults.
+"""
+
+import datetime
+import heapq
+from itertools import islice
+
+DEFAULT_SOURCES = ('message', 'comment', 'milestone', 'time_entry')
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class Event(object):
+    '''One dated thing that happened in a project.'''
+    __slots__ = ('timestamp', 'kind', 'project_id', 'title', 'item')
+
+    def __init__(self, timestamp, kind, project_id, title, item):
+        self.timestamp = timestamp
+        self.kind = kind
+        self.project_id = project_id
+        self.title = title
+        self.item = item
+
+    def to_dict(self):
+        return dict(timestamp=self.timestamp, kind=self.kind,
+                    project_id=self.project_id, title=self.title)
+
+    def __repr__(self):
+        return '<Event %s %s %r>' % (self.timestamp, self.kind, self.title)
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime.datetime): return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    return None
+
+def _stream(p, kind, items, timestamp, title):
+    '''Yields events for items that are already newest first, one at a
+       time as they are read.'''
+    for item in items:
+        when = _as_datetime(timestamp(item))
+        if when is not None: yield Event(when, kind, p.id, title(item), item)
+
+def _sorted_stream(p, kind, collection, timestamp, title, include=None):
+    '''Yields events for the items of collection newest first. The order
+       is worked out once per loaded collection and kept on the project.'''
+    cached = p._timeline_events.get(kind)
+    if cached is None or cached[0] is not collection:
+        dated = []
+        for item in collection:
+            if include is not None and not include(item): continue
+            when = _as_datetime(timestamp(item))
+            if when is not None: dated.append((when, item))
+        dated.sort(key=lambda pair: pair[0], reverse=True)
+        cached = p._timeline_events[kind] = (collection, dated)
+    for when, item in cached[1]:
+        yield Event(when, kind, p.id, title(item), item)
+
+def message_events(p):
+    # The archive lists messages newest first.
+    return _stream(p, 'message', p.messages,
+                   lambda m: getattr(m, 'posted_on', None),
+                   lambda m: getattr(m, 'title', None))
+
+def comment_events(p):
+    # Project.comments sorts them newest first.
+    return _stream(p, 'comment', p.comments,
+                   lambda c: getattr(c, 'posted_on', None),
+                   lambda c: getattr(c, 'body', None))
+
+def milestone_events(p):
+    return _sorted_stream(p, 'milestone', p.milestones,
+                          lambda m: getattr(m, 'completed_on', None),
+                          lambda m: m.title, lambda m: m.completed)
+
+def todo_events(p):
+    return _sorted_stream(p, 'todo', p.todo_items,
+                          lambda i: getattr(i, 'completed_on', None),
+                          lambda i: getattr(i, 'content', None),
+                          lambda i: getattr(i, 'completed', False))
+
+def time_entry_events(p):
+    return _sorted_stream(p, 'time_entry', p.time_entries,
+                          lambda e: getattr(e, 'date', None),
+                          lambda e: getattr(e, 'description', None))
+
+SOURCES = {
+    'message': message_events,
+    'comment': comment_events,
+    'milestone': milestone_events,
+    'todo': todo_events,
+    'time_entry': time_entry_events,
+}
+
+
+def _key(timestamp):
+    # Heaps pop the smallest entry first; negating the age puts the newest
+    # event on top.
+    delta = timestamp - EPOCH
+    return -(delta.days * 86400 + delta.seconds + delta.microseconds / 1e6)
+
+def merge(streams):
+    '''Merges streams of events that are each sorted newest first into one
+       stream sorted newest first, lazily.'''
+    heap = []
+    for order, stream in enumerate(streams):
+        stream = iter(stream)
+        for event in stream:
+            heap.append((_key(event.timestamp), order, event, stream))
+            break
+    heapq.heapify(heap)
+    while heap:
+        key, order, event, stream = heap[0]
+        yield event
+        for following in stream:
+            heapq.heapreplace(heap, (_key(following.timestamp), order, following, stream))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+class Timeline(object):
+    '''Events from one or more projects, newest first.'''
+    def __init__(self, projects, sources=DEFAULT_SOURCES):
+        for source in sources:
+            if source not in SOURCES:
+                raise ValueError("unknown timeline source %r" % source)
+        self.projects = list(projects)
+        self.sources = sources
+
+    def __iter__(self):
+        return merge([SOURCES[source](p) for p in self.projects
+                      for source in self.sources])
+
+    def latest(self, n):
+        return list(islice(self, n))
+
+    def since(self, timestamp):
+        '''Events at or after timestamp, newest first.'''
+        timestamp = _as_datetime(timestamp)
+        events = []
+        for event in self:
+            if event.timestamp < timestamp: break
+            events.append(event)
+        return events
+
+    @property
+    def last_activity(self):
+        '''Timestamp of the most recent event, or None.'''
+        for event in self:
+            return event.timestamp
+        return None
@@ -0,0 +1,225 @@
+"""Attributes Basecamp requests to the public properties and methods that
+caused them, and flags N+1 request patterns.
+
+A Tracer is an instrumentation listener. For every request it walks the
+Python stack to find the public Project/BasecampObject properties and the
+Basecamp API methods that led to it, and files the request in a call tree:
+
+    tracer = Tracer()
+    tracer.attach(project)
+    project.to_dict()
+    print tracer.report()
+
+    Project.to_dict: 4 requests, 0.012s
+      Project.comments: 3 requests, 0.009s
+        Project.messages: 1 request, 0.004s
+          Basecamp.message_archive: 1 request, 0.004s
+            POST /projects/:id/msg/archive x1
+        Basecamp.comments: 2 requests, 0.005s
+          POST /msg/comments/:id x2
+
+Requests to the same endpoint with different ids issued from the same call
+site at least `threshold` times are reported as N+1 patterns, and identical
+requests made more than once as duplicates.
+
+Setting BASECAMPREPORTING_TRACE=1 in the environment traces every request
+made by the command line tools (dashboard, refresher, benchmark and sample)
+and prints the report to stderr on exit; see enable_from_environment().
+"""
+
+import atexit
+import os
+import sys
+import threading
+
+from basecampreporting import instrumentation
+from basecampreporting.instrumentation import request_shape
+
+DEFAULT_THRESHOLD = 3
+
+
+class CallNode(object):
+    '''A public property or method in the call tree. requests maps the
+       (method, shape) of requests made directly beneath it to
+       [count, set of distinct paths].'''
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = {}
+        self.requests = {}
+        self.request_count = 0
+        self.latency = 0.0
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = CallNode(name, self)
+        return node
+
+    @property
+    def chain(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        names.reverse()
+        return names
+
+    def walk(self):
+        yield self
+        for name in sorted(self.children):
+            for node in self.children[name].walk():
+                yield node
+
+
+class Tracer(object):
+    '''Instrumentation listener that builds a call tree of requests.'''
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.root = CallNode('<root>')
+        self.seen = {}
+
+    def attach(self, target):
+        '''Traces requests made by a Project (or anything with a .bc) or a
+           Basecamp instance.'''
+        getattr(target, 'bc', target).add_listener(self)
+        return self
+
+    def detach(self, target):
+        getattr(target, 'bc', target).remove_listener(self)
+
+    def __call__(self, event):
+        chain = self.call_chain(sys._getframe(1))
+        self.lock.acquire()
+        try:
+            node = self.root
+            for name in chain:
+                node.request_count += 1
+                node.latency += event.latency or 0.0
+                node = node.child(name)
+            node.request_count += 1
+            node.latency += event.latency or 0.0
+            group = node.requests.get((event.method, request_shape(event.path)))
+            if group is None:
+                group = node.requests[(event.method, request_shape(event.path))] = [0, set()]
+            group[0] += 1
+            group[1].add(event.path)
+
+            identity = (event.method, event.path, event.request_bytes)
+            self.seen[identity] = self.seen.get(identity, 0) + 1
+        finally:
+            self.lock.release()
+
+    def call_chain(self, frame):
+        '''Names of the public Basecamp, Project and model methods on the
+           stack, outermost first.'''
+        from basecampreporting.basecamp import Basecamp
+        from basecampreporting.project import BasecampObject
+
+        chain = []
+        while frame is not None:
+            code = frame.f_code
+            name = code.co_name
+            if not name.startswith('_') and not name.startswith('<'):
+                obj = frame.f_locals.get('self')
+                if isinstance(obj, (Basecamp, BasecampObject)):
+                    chain.append('%s.%s' % (self.defining_class(obj, name), name))
+            frame = frame.f_back
+        chain.reverse()
+        return chain
+
+    def defining_class(self, obj, name):
+        for klass in type(obj).__mro__:
+            if name in klass.__dict__:
+                return klass.__name__
+        return type(obj).__name__
+
+    # ---------------------------------------------------------------- #
+    # Reporting
+
+    def n_plus_one(self):
+        '''(call chain, method, shape, request count) for each endpoint hit
+           with at least `threshold` different ids from one call site.'''
+        found = []
+        for node in self.root.walk():
+            for (method, shape), (count, paths) in node.requests.items():
+                if len(paths) >= self.threshold:
+                    found.append((node.chain, method, shape, count))
+        return found
+
+    def duplicates(self):
+        '''(method, path, times) for identical requests made more than once.'''
+        return sorted([(method, path, count) for (method, path, size), count
+                       in self.seen.items() if count > 1])
+
+    def report(self):
+        n_plus_one = self.n_plus_one()
+        duplicates = self.duplicates()
+        flagged = set([(tuple(chain), method, shape)
+                       for chain, method, shape, count in n_plus_one])
+        lines = ["Request trace: %s requests, %s suspected N+1 patterns, "
+                 "%s duplicated requests" % (self.root.request_count,
+                 len(n_plus_one), len(duplicates)), ""]
+
+        def describe(node, depth):
+            indent = '  ' * depth
+            plural = node.request_count != 1 and 's' or ''
+            lines.append("%s%s: %s request%s, %.3fs" % (indent, node.name,
+                         node.request_count, plural, node.latency))
+            for (method, shape), (count, paths) in sorted(node.requests.items()):
+                marker = ''
+                if (tuple(node.chain), method, shape) in flagged:
+                    marker = '  <-- N+1'
+                lines.append("%s  %s %s x%s%s" % (indent, method, shape, count, marker))
+            for name in sorted(node.children):
+                describe(node.children[name], depth + 1)
+
+        for (method, shape), (count, paths) in sorted(self.root.requests.items()):
+            lines.append("(no public caller) %s %s x%s" % (method, shape, count))
+        for name in sorted(self.root.children):
+            describe(self.root.children[name], 0)
+
+        if n_plus_one:
+            lines.extend(["", "Suspected N+1 patterns:"])
+            for chain, method, shape, count in n_plus_one:
+                lines.append("  %s -> %s %s x%s" % (' > '.join(chain), method, shape, count))
+        if duplicates:
+            lines.extend(["", "Duplicated requests:"])
+            for method, path, count in duplicates:
+                lines.append("  %s %s x%s" % (method, path, count))
+        return '\n'.join(lines)
+
+    def dump(self, out=None):
+        out = out or sys.stderr
+        out.write(self.report() + '\n')
+
+
+_global_tracer = None
+
+def enable(threshold=DEFAULT_THRESHOLD, out=None):
+    '''Traces every request in the process and dumps the report at exit.'''
+    global _global_tracer
+    if _global_tracer is None:
+        _global_tracer = Tracer(threshold)
+        instrumentation.add_listener(_global_tracer)
+        atexit.register(lambda: _global_tracer and _global_tracer.dump(out))
+    return _global_tracer
+
+def enable_from_environment(environ=None):
+    '''Enables tracing when BASECAMPREPORTING_TRACE is set. Called by the
+       command line entry points; importing the library traces nothing.'''
+    if environ is None: environ = os.environ
+    if environ.get('BASECAMPREPORTING_TRACE'):
+        return enable()
+    return None
+
+def disable():
+    global _global_tracer
+    if _global_tracer is not None:
+        instrumentation.remove_listener(_global_tracer)
+        _global_tracer = None
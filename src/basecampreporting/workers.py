@@ -0,0 +1,62 @@
+"""Bounded thread pools for fanning Basecamp work out over many projects.
+
+Basecamp calls spend nearly all of their time waiting on the network, so a
+handful of threads sharing one ConnectionPool is enough to overlap hundreds
+of requests.
+"""
+
+import sys
+import threading
+import Queue
+
+
+def map_unordered(func, items, workers=8):
+    '''Calls func(item) for every item on at most `workers` threads, yielding
+       (item, result, exc_info) as each call finishes. exc_info is None on
+       success, otherwise the sys.exc_info() of the failure (and result is
+       None). Closing the generator early stops handing out new items.'''
+    items = list(items)
+    if not items:
+        return
+    pending = Queue.Queue()
+    for item in items:
+        pending.put(item)
+    done = Queue.Queue()
+    stopped = threading.Event()
+
+    def work():
+        while not stopped.isSet():
+            try:
+                item = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                done.put((item, func(item), None))
+            except Exception:
+                done.put((item, None, sys.exc_info()))
+
+    threads = []
+    for i in xrange(min(workers, len(items))):
+        thread = threading.Thread(target=work)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+
+    try:
+        for i in xrange(len(items)):
+            yield done.get()
+    finally:
+        stopped.set()
+    # Every item has finished, so the workers are only checking for more.
+    for thread in threads:
+        thread.join()
+
+def map_ordered(func, items, workers=8):
+    '''Like map_unordered, but returns a list of (item, result, exc_info) in
+       the order of items.'''
+    items = list(items)
+    finished = {}
+    call = lambda pair: func(pair[1])
+    for item, result, exc_info in map_unordered(call, enumerate(items), workers):
+        finished[item[0]] = (item[1], result, exc_info)
+    return [finished[i] for i in xrange(len(items))]